@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+import logging
+from app.models.analysis import FleetSavingsJob, StackAnalysisRequest, StackAnalysisResponse
+from app.services.analysis_service import AnalysisService
+from app.services.aws_service import AWSCredentials
+from app.services.savings_service import FleetSavingsService
+
+router = APIRouter(tags=["analysis"])
+logger = logging.getLogger(__name__)
+
+@router.post("/stack", response_model=StackAnalysisResponse)
+async def analyze_stack(request: StackAnalysisRequest) -> StackAnalysisResponse:
+    """
+    Get the cost, risk and combined ranking of a stack of instances in every region.
+    """
+    try:
+        return await AnalysisService.analyze_stack(request)
+    except Exception as e:
+        logger.exception(f"Error analyzing stack: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error analyzing stack: {str(e)}")
+
+@router.post("/fleet-savings", response_model=FleetSavingsJob, status_code=202)
+async def start_fleet_savings(credentials: AWSCredentials, request: Request, response: Response) -> FleetSavingsJob:
+    """
+    Start projecting the monthly savings and interruption risk of moving the
+    running instances in the given regions to spot. Poll the returned job
+    (its URL is in the Location header) until its status is done or failed.
+    """
+    try:
+        job = await FleetSavingsService.submit(credentials)
+    except Exception as e:
+        logger.exception(f"Error starting fleet savings job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error starting fleet savings job: {str(e)}")
+    response.headers["Location"] = str(request.url_for("get_fleet_savings", job_id=job.job_id))
+    return job
+
+@router.get("/fleet-savings/{job_id}", response_model=FleetSavingsJob)
+async def get_fleet_savings(job_id: str) -> FleetSavingsJob:
+    """
+    Get the status of a fleet savings job, and its result once it is done.
+    """
+    job = await FleetSavingsService.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fleet savings job {job_id} not found")
+    return job
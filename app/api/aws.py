@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List, Dict
 import logging
 from app.services.aws_service import AWSService, AWSCredentials, EC2RegionSummary, EC2Instance
@@ -18,6 +19,16 @@ async def get_ec2_instances(credentials: AWSCredentials) -> Dict[str, List[EC2In
         logger.error(f"Error fetching EC2 instances: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching EC2 instances: {str(e)}")
 
+@router.post("/ec2-instances/stream")
+async def stream_ec2_instances(credentials: AWSCredentials) -> StreamingResponse:
+    """
+    Stream EC2 instances from specified regions as NDJSON while they are paginated.
+    """
+    return StreamingResponse(
+        AWSService.stream_ec2_instances(credentials),
+        media_type="application/x-ndjson"
+    )
+
 @router.post("/ec2-summary")
 async def get_ec2_summary(credentials: AWSCredentials) -> List[EC2RegionSummary]:
     """
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Query
+import logging
+from typing import List, Literal, Optional
+from app.models.history import HistorySnapshot, TrendResponse
+from app.services.history_service import HistoryService
+from app.services.pricing_service import PricingService
+
+router = APIRouter(tags=["history"])
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = timedelta(days=30)
+
+def as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+@router.get("/trend", response_model=TrendResponse)
+async def get_trend(
+    region: str,
+    instance_type: str,
+    os: Literal["Linux", "Windows"] = "Linux",
+    start: Optional[datetime] = Query(None, description="Start of the window, defaults to 30 days before end"),
+    end: Optional[datetime] = Query(None, description="End of the window, defaults to now"),
+) -> TrendResponse:
+    """
+    Get how the spot savings, interruption rating and on-demand price of an
+    instance type in a region changed over a time window.
+    """
+    # Times without a timezone are taken as UTC
+    end = as_utc(end) if end else datetime.now(timezone.utc)
+    start = as_utc(start) if start else end - DEFAULT_WINDOW
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+
+    try:
+        return await asyncio.to_thread(
+            HistoryService.get_trend, PricingService.resolve_region(region), os, instance_type, start, end
+        )
+    except Exception as e:
+        logger.exception(f"Error getting trend: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting trend: {str(e)}")
+
+@router.get("/snapshots", response_model=List[HistorySnapshot])
+async def get_snapshots(limit: int = Query(100, ge=1, le=1000)):
+    """List the most recently recorded refreshes and how many values each changed."""
+    try:
+        return await asyncio.to_thread(HistoryService.snapshots, limit)
+    except Exception as e:
+        logger.exception(f"Error listing snapshots: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error listing snapshots: {str(e)}")
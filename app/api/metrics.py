@@ -0,0 +1,88 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import logging
+import time
+from app.services.cache_service import CacheService
+from app.services.metrics import REQUEST_DURATION, MetricsService, sampled
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def cache_tier_metrics():
+    """Hit and miss counters of the CacheService tiers, read when metrics are scraped."""
+    stats = CacheService.stats()
+    counters = (
+        ("hits", "Cache tier reads that found a fresh entry"),
+        ("misses", "Cache tier reads that found nothing usable"),
+        ("evictions", "Entries evicted from a cache tier"),
+    )
+    for counter, help in counters:
+        yield (
+            f"spotwizard_cache_tier_{counter}", "counter", help,
+            [(f"spotwizard_cache_tier_{counter}_total", {"tier": tier}, values.get(counter, 0)) for tier, values in stats.items()],
+        )
+
+    ratios = []
+    for tier, values in stats.items():
+        lookups = values.get("hits", 0) + values.get("misses", 0)
+        if lookups:
+            ratios.append(("spotwizard_cache_tier_hit_ratio", {"tier": tier}, values["hits"] / lookups))
+    yield "spotwizard_cache_tier_hit_ratio", "gauge", "Share of cache tier reads that were hits since startup", ratios
+
+
+def route_template(scope) -> str:
+    """The path template of the route that served a request, e.g. /api/jobs/{job_id}."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        # Unmatched paths and static files would otherwise add a series per URL
+        return "unmatched"
+    # Routes of an included router may only know their path below the router's prefix
+    try:
+        concrete = route.path_format.format(**scope.get("path_params", {}))
+    except (AttributeError, KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    return path[:-len(concrete)] + template if concrete and path.endswith(concrete) else template
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the latency of every HTTP request by route template, so
+    /api/pricing?region=... is one series however many regions are asked for.
+    Streaming responses are timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_DURATION.observe(elapsed, method=scope["method"], route=route_template(scope), status=str(status))
+            if sampled(logger):
+                logger.debug(f"{scope['method']} {scope['path']} {status} in {elapsed * 1000:.1f}ms")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics in the Prometheus text format."""
+    return PlainTextResponse(MetricsService.render(), media_type=PROMETHEUS_CONTENT_TYPE)
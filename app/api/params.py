@@ -0,0 +1,8 @@
+from typing import List, Optional
+
+
+def split_list(values: Optional[List[str]]) -> Optional[List[str]]:
+    """Accept both repeated (?os=Linux&os=Windows) and comma separated (?os=Linux,Windows) values."""
+    if not values:
+        return None
+    return [item.strip() for value in values for item in value.split(",") if item.strip()]
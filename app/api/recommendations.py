@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+import logging
+from typing import Literal
+from app.models.recommendation import RecommendationResponse
+from app.services.recommendation_service import RecommendationService
+
+router = APIRouter(tags=["recommendations"])
+logger = logging.getLogger(__name__)
+
+@router.get("/recommendations", response_model=RecommendationResponse)
+async def get_recommendations(
+    instance_type: str,
+    region: str,
+    os: Literal["Linux", "Windows"] = "Linux",
+    k: int = Query(5, ge=1, le=RecommendationService.MAX_RESULTS),
+    lower_risk: bool = True,
+) -> RecommendationResponse:
+    """
+    Get the instance types closest in spec to an instance type that have spot
+    capacity in the region, by default only those less likely to be interrupted.
+    """
+    try:
+        return await RecommendationService.recommend(instance_type, region, os, k, lower_risk)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error getting recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting recommendations: {str(e)}")
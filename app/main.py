@@ -1,23 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import httpx
-import asyncio
 import logging
+import os
 import sys
-from .models.spot import SpotData, InstanceSpotData, RegionSpotData
+from .models.spot import SpotData
+from .services.bundle_service import BundleService
 from .services.cache_service import CacheService
+from .services.data_plane import DataPlane
+from .services.pricing_service import PricingService
+from .services.refresh_service import RefreshService
+from .services.metrics import MetricsService
+from .services.savings_service import FleetSavingsService
+from .services.spot_service import SpotDataUnavailable, SpotService
 from .api.pricing import router as pricing_router
 from .api.aws import router as aws_router
-from .scripts.init_data import init_data
-from fastapi.responses import StreamingResponse, FileResponse
-import json
-from typing import AsyncGenerator
+from .api.analysis import router as analysis_router
+from .api.recommendations import router as recommendations_router
+from .api.history import router as history_router
+from .api.metrics import RequestMetricsMiddleware, cache_tier_metrics, router as metrics_router
+from .api.params import split_list
+from .scripts.init_data import init_data, pricing_data_age, PRICING_MAX_AGE
+from typing import List, Optional
 
-# Configure logging
+# Configure logging; hot paths only log a sample of their events at DEBUG (see LOG_SAMPLE_RATE)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     stream=sys.stdout,
     force=True  # Override any existing configuration
@@ -34,18 +43,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
+MetricsService.add_collector(cache_tier_metrics)
 
 # Define API routes first
-@app.get("/api/spot-data")
-async def get_spot_data():
+@app.get("/api/spot-data", response_model=SpotData)
+async def get_spot_data(
+    request: Request,
+    regions: Optional[List[str]] = Query(None, description="Only include these regions"),
+    os: Optional[List[str]] = Query(None, description="Only include these operating systems"),
+    families: Optional[List[str]] = Query(None, description="Only include these instance families, e.g. m5"),
+    min_cores: Optional[int] = Query(None, description="Only include instance types with at least this many cores"),
+    min_ram_gb: Optional[float] = Query(None, description="Only include instance types with at least this much RAM"),
+):
     try:
-        data = await fetch_spot_data()
-        
-        # Validate the data against our model
-        validated_data = SpotData(**data)
-        
-        # Return the validated data
-        return validated_data
+        # The snapshot is validated, serialized and compressed once per data change
+        snapshot = await SpotService.get_snapshot()
+        filters = {
+            "regions": split_list(regions),
+            "os": split_list(os),
+            "families": split_list(families),
+            "min_cores": min_cores,
+            "min_ram_gb": min_ram_gb,
+        }
+        if any(value is not None for value in filters.values()):
+            return (await snapshot.query(**filters)).respond(request)
+        return snapshot.body.respond(request)
+    except SpotDataUnavailable as e:
+        logger.error(f"Failed to fetch spot data: {e}")
+        raise HTTPException(status_code=503, detail=f"Failed to fetch spot data: {str(e)}")
     except ValueError as e:
         logger.error(f"Data validation error: {e}")
         raise HTTPException(status_code=500, detail=f"Invalid data format: {str(e)}")
@@ -55,11 +81,21 @@ async def get_spot_data():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "data": await RefreshService.status(),
+        "bundle": BundleService.status(),
+        "data_plane": DataPlane.status(),
+        "cache": CacheService.stats(),
+    }
 
 # Include routers
 app.include_router(pricing_router, prefix="/api")
 app.include_router(aws_router, prefix="/api/aws")
+app.include_router(analysis_router, prefix="/api/analysis")
+app.include_router(recommendations_router, prefix="/api")
+app.include_router(history_router, prefix="/api/history")
+app.include_router(metrics_router)
 
 # Mount static files last, after all API routes
 static_path = Path("/app/static")
@@ -67,51 +103,47 @@ if static_path.exists():
     # Mount static files at root
     app.mount("/", StaticFiles(directory=str(static_path), html=True), name="static")
 
+async def refresh_pricing_data():
+    if not await init_data():
+        raise RuntimeError("Failed to download EC2 pricing data")
+
+RefreshService.register(
+    SpotService.REFRESH_JOB,
+    SpotService.refresh,
+    SpotService.data_age,
+    max_age=CacheService.get_ttl(SpotService.CACHE_FILE).total_seconds(),
+)
+RefreshService.register(
+    "pricing",
+    refresh_pricing_data,
+    pricing_data_age,
+    max_age=PRICING_MAX_AGE.total_seconds(),
+)
+
+def start_refreshing():
+    RefreshService.start()
+    if DataPlane.ENABLED:
+        # Publish the cached data for the followers without waiting for a request or refresh
+        SpotService.preload()
+        PricingService.lead()
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize data on application startup."""
-    logger.info("Starting data initialization...")
-    await init_data()
-    logger.info("Data initialization complete")
-
-async def fetch_spot_data() -> dict:
-    try:
-        # Try to get cached data first
-        cached_data = CacheService.get_cached_data("spot_advisor_data.json")
-        if cached_data:
-            return cached_data
+    """Start refreshing data in the background, serving whatever is on disk meanwhile."""
+    if BundleService.load():
+        # All data comes from the prebuilt bundle; replacing the file swaps in new data
+        BundleService.start()
+    elif DataPlane.ENABLED:
+        # Only the leader worker refreshes; followers map the pricing it publishes
+        PricingService.follow()
+        DataPlane.watch(DataPlane.PRICING_FILE, PricingService.follow)
+        DataPlane.start(on_elected=start_refreshing)
+    else:
+        start_refreshing()
 
-        # If no cached data, fetch from AWS with proper timeout and chunk handling
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            logger.info("Fetching spot data from AWS...")
-            response = await client.get(
-                "https://spot-bid-advisor.s3.amazonaws.com/spot-advisor-data.json",
-                headers={"Accept-Encoding": "gzip"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Transform the data to match our model structure
-            transformed_data = {
-                "instance_types": data.get("instance_types", {}),
-                "ranges": data.get("ranges", []),
-                "spot_advisor": {}
-            }
-            
-            # Transform spot_advisor data to match our model
-            for region, region_data in data.get("spot_advisor", {}).items():
-                transformed_data["spot_advisor"][region] = {}
-                for os_type in ["Linux", "Windows"]:
-                    if os_type in region_data:
-                        transformed_data["spot_advisor"][region][os_type] = region_data[os_type]
-            
-            # Cache the transformed data
-            CacheService.save_cached_data("spot_advisor_data.json", transformed_data)
-            
-            return transformed_data
-    except httpx.HTTPError as e:
-        logger.error(f"Failed to fetch spot data: {e}")
-        raise HTTPException(status_code=503, detail=f"Failed to fetch spot data: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}") 
\ No newline at end of file
+@app.on_event("shutdown")
+async def shutdown_event():
+    await RefreshService.stop()
+    await BundleService.stop()
+    await FleetSavingsService.stop()
+    await DataPlane.stop()
@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class StackItem(BaseModel):
+    instance_type: str
+    quantity: int = Field(1, ge=0)
+    os: Literal["Linux", "Windows"] = "Linux"
+
+
+class StackAnalysisRequest(BaseModel):
+    items: List[StackItem]
+    regions: Optional[List[str]] = None  # Defaults to every region with spot data
+
+
+class RegionStackAnalysis(BaseModel):
+    region: str
+    on_demand: float  # Hourly cost of the stack on on-demand instances
+    spot: float  # Hourly cost of the stack on spot where available
+    savings: float
+    risk_score: Optional[float] = None  # Mean interruption rating (0-4) of the instances with spot data
+    combined_score: Optional[float] = None  # Normalized savings minus normalized risk, None if missing_pricing
+    rank: Optional[int] = None  # 1 is the best combined score; regions with missing_pricing aren't ranked
+    spot_coverage: float  # Share of the stack's instances with spot data in the region
+    missing_pricing: List[str] = []  # Instance types without an on-demand price in the region
+
+
+class StackAnalysisResponse(BaseModel):
+    regions: List[RegionStackAnalysis]
+    unavailable_regions: List[str] = []  # Requested regions without pricing data
+    unknown_instance_types: List[str] = []
+    currency: str = "USD"
+    unit: str = "Hrs"
+
+
+class FleetSavingsItem(BaseModel):
+    instance_type: str
+    os: Literal["Linux", "Windows"]
+    count: int  # Running and pending instances
+    on_demand: Optional[float] = None  # Monthly on-demand cost, None without an on-demand price
+    spot: Optional[float] = None  # Projected monthly cost on spot, the on-demand cost without spot data
+    savings: float = 0.0  # Projected monthly savings
+    savings_percent: Optional[int] = None  # Spot advisor savings over on-demand
+    interruption_rating: Optional[int] = None  # Spot advisor rating, 0 (lowest) to 4
+    interruption_label: Optional[str] = None  # e.g. "<5%"
+
+
+class RegionFleetSavings(BaseModel):
+    region: str
+    instances: int
+    on_demand: float  # Monthly on-demand cost of the priced instances
+    spot: float
+    savings: float
+    risk_score: Optional[float] = None  # Mean interruption rating (0-4) per instance with spot data
+    spot_coverage: float  # Share of the region's instances with spot data
+    items: List[FleetSavingsItem]  # Largest savings first
+
+
+class FleetSavingsResult(BaseModel):
+    regions: List[RegionFleetSavings]  # Largest savings first
+    instances: int
+    on_demand: float
+    spot: float
+    savings: float
+    failed_regions: List[str] = []  # Requested regions whose inventory couldn't be fetched
+    unpriced_instance_types: List[str] = []  # Instance types without an on-demand price where they run
+    hours_per_month: int = 730
+    currency: str = "USD"
+
+
+class FleetSavingsJob(BaseModel):
+    job_id: str
+    status: Literal["pending", "running", "done", "failed"]
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[FleetSavingsResult] = None
+    error: Optional[str] = None
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class HistorySnapshot(BaseModel):
+    dataset: str  # "spot" or "pricing"
+    recorded_at: datetime
+    changes: int  # Values that changed or were dropped since the previous snapshot
+
+
+class SpotHistoryPoint(BaseModel):
+    recorded_at: datetime
+    savings: Optional[int] = None  # None when the instance type was dropped from the spot data
+    interruption_rating: Optional[int] = None
+
+
+class PriceHistoryPoint(BaseModel):
+    recorded_at: datetime
+    price: Optional[str] = None  # None when the instance type was dropped from the pricing data
+
+
+class TrendResponse(BaseModel):
+    region: str
+    os: str
+    instance_type: str
+    start: datetime
+    end: datetime
+    # Only changes are stored; the first point is the value in effect at the start of the window
+    spot: List[SpotHistoryPoint]
+    pricing: List[PriceHistoryPoint]
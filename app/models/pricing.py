@@ -0,0 +1,17 @@
+from typing import Optional, Dict, List
+from pydantic import BaseModel
+
+
+class EC2PricingRate(BaseModel):
+    price: str
+    unit: str = "Hrs"
+    description: Optional[str] = None
+
+
+class PricingResponse(BaseModel):
+    regions: Dict[str, Dict[str, EC2PricingRate]]
+
+
+class PricingBatchResponse(BaseModel):
+    regions: Dict[str, Dict[str, Dict[str, EC2PricingRate]]]  # region -> OS -> instance_type -> rate
+    unavailable: Dict[str, List[str]] = {}  # region -> OSes without pricing data
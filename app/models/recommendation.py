@@ -0,0 +1,24 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+
+
+class InstanceAlternative(BaseModel):
+    instance_type: str
+    cores: int
+    ram_gb: float
+    emr: bool
+    distance: float  # Spec distance from the requested instance type, 0 is an identical spec
+    savings: Optional[int] = None  # Spot savings over on-demand (%) in the region
+    interruption_rating: Optional[int] = None  # 0-4, lower is less likely to be interrupted
+    interruption: Optional[str] = None  # Interruption frequency label, e.g. "<5%"
+    on_demand: Optional[float] = None  # Hourly on-demand price in the region
+    spot: Optional[float] = None  # Hourly price after the spot savings
+
+
+class RecommendationResponse(BaseModel):
+    region: str
+    os: Literal["Linux", "Windows"]
+    requested: InstanceAlternative
+    alternatives: List[InstanceAlternative]  # Nearest spec first
+    currency: str = "USD"
+    unit: str = "Hrs"
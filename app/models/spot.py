@@ -1,4 +1,5 @@
 from typing import Dict, List, Optional, Annotated
+import numpy as np
 from pydantic import BaseModel, TypeAdapter
 
 
@@ -31,4 +32,156 @@ RegionSpotData = TypeAdapter(Dict[str, InstanceSpotData])
 class SpotData(BaseModel):
     instance_types: Dict[str, InstanceType]
     ranges: List[Range]
-    spot_advisor: Dict[str, Dict[str, Dict[str, SpotMetrics]]]  # region -> OS -> instance_type -> metrics 
\ No newline at end of file
+    spot_advisor: Dict[str, Dict[str, Dict[str, SpotMetrics]]]  # region -> OS -> instance_type -> metrics 
+
+
+class SpotTable:
+    """
+    Dense, array-backed form of SpotData.
+
+    Regions and instance types are interned to integer IDs and the advisor
+    metrics are kept as (region, OS, instance type) uint8 matrices for the
+    savings score and interruption rating, with MISSING where AWS has no data.
+    The nested-dict JSON shape is only materialized at the API boundary.
+    """
+
+    OPERATING_SYSTEMS = ("Linux", "Windows")
+    MISSING = 255
+
+    def __init__(
+        self,
+        instance_types: List[str],
+        cores: np.ndarray,
+        ram_gb: np.ndarray,
+        emr: np.ndarray,
+        n_described: int,
+        ranges: List[Range],
+        regions: List[str],
+        present: np.ndarray,
+        s: np.ndarray,
+        r: np.ndarray,
+    ):
+        self.instance_types = instance_types
+        self.type_ids = {instance_type: i for i, instance_type in enumerate(instance_types)}
+        # Only the first n_described instance types have specs in instance_types
+        self.n_described = n_described
+        self.cores = cores
+        self.ram_gb = ram_gb
+        self.emr = emr
+        self.ranges = ranges
+        self.regions = regions
+        self.region_ids = {region: i for i, region in enumerate(regions)}
+        self.present = present  # (region, OS) -> whether the region lists the OS at all
+        self.s = s
+        self.r = r
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpotTable":
+        """Validate the advisor JSON structure and pack it into arrays."""
+        described = TypeAdapter(Dict[str, InstanceType]).validate_python(data.get("instance_types", {}))
+        ranges = TypeAdapter(List[Range]).validate_python(data.get("ranges", []))
+        spot_advisor = data.get("spot_advisor", {})
+        if not isinstance(spot_advisor, dict):
+            raise ValueError("spot_advisor must be an object")
+
+        instance_types = list(described)
+        type_ids = {instance_type: i for i, instance_type in enumerate(instance_types)}
+        for region_data in spot_advisor.values():
+            for os_data in (region_data or {}).values():
+                for instance_type in os_data or {}:
+                    if instance_type not in type_ids:
+                        type_ids[instance_type] = len(instance_types)
+                        instance_types.append(instance_type)
+
+        regions = list(spot_advisor)
+        shape = (len(regions), len(cls.OPERATING_SYSTEMS), len(instance_types))
+        s = np.full(shape, cls.MISSING, dtype=np.uint8)
+        r = np.full(shape, cls.MISSING, dtype=np.uint8)
+        present = np.zeros(shape[:2], dtype=bool)
+
+        for region_id, region in enumerate(regions):
+            region_data = spot_advisor[region]
+            if not isinstance(region_data, dict) or "Linux" not in region_data:
+                raise ValueError(f"Spot data for region {region} has no Linux metrics")
+            for os_id, os_name in enumerate(cls.OPERATING_SYSTEMS):
+                os_data = region_data.get(os_name)
+                if os_data is None:
+                    continue
+                present[region_id, os_id] = True
+                for instance_type, metrics in os_data.items():
+                    try:
+                        score, rating = metrics["s"], metrics["r"]
+                        if not (isinstance(score, int) and isinstance(rating, int)):
+                            raise TypeError
+                        if not (0 <= score < cls.MISSING and 0 <= rating < cls.MISSING):
+                            raise ValueError
+                    except (KeyError, TypeError, ValueError):
+                        raise ValueError(f"Invalid spot metrics for {region}/{os_name}/{instance_type}: {metrics}")
+                    type_id = type_ids[instance_type]
+                    s[region_id, os_id, type_id] = score
+                    r[region_id, os_id, type_id] = rating
+
+        return cls(
+            instance_types=instance_types,
+            cores=np.array([spec.cores for spec in described.values()], dtype=np.int32),
+            ram_gb=np.array([spec.ram_gb for spec in described.values()], dtype=np.float64),
+            emr=np.array([spec.emr for spec in described.values()], dtype=bool),
+            n_described=len(described),
+            ranges=ranges,
+            regions=regions,
+            present=present,
+            s=s,
+            r=r,
+        )
+
+    def metrics(self, region: str, os: str, instance_type: str) -> Optional[SpotMetrics]:
+        region_id = self.region_ids.get(region)
+        type_id = self.type_ids.get(instance_type)
+        if region_id is None or type_id is None or os not in self.OPERATING_SYSTEMS:
+            return None
+        os_id = self.OPERATING_SYSTEMS.index(os)
+        score = self.s[region_id, os_id, type_id]
+        if score == self.MISSING:
+            return None
+        return SpotMetrics(s=int(score), r=int(self.r[region_id, os_id, type_id]))
+
+    def to_dict(
+        self,
+        regions: Optional[List[str]] = None,
+        os: Optional[List[str]] = None,
+        type_mask: Optional[np.ndarray] = None,
+    ) -> dict:
+        """Materialize (a slice of) the data in the SpotData JSON shape."""
+        described = np.arange(self.n_described)
+        if type_mask is not None:
+            described = described[type_mask[:self.n_described]]
+        instance_types = {
+            self.instance_types[i]: {"emr": bool(self.emr[i]), "cores": int(self.cores[i]), "ram_gb": float(self.ram_gb[i])}
+            for i in described.tolist()
+        }
+
+        spot_advisor = {}
+        for region in (regions if regions is not None else self.regions):
+            region_id = self.region_ids.get(region)
+            if region_id is None:
+                continue
+            spot_advisor[region] = {}
+            for os_id, os_name in enumerate(self.OPERATING_SYSTEMS):
+                if (os is not None and os_name not in os) or not self.present[region_id, os_id]:
+                    continue
+                scores = self.s[region_id, os_id]
+                available = scores != self.MISSING
+                if type_mask is not None:
+                    available &= type_mask
+                type_ids = np.nonzero(available)[0]
+                ratings = self.r[region_id, os_id, type_ids].tolist()
+                spot_advisor[region][os_name] = {
+                    self.instance_types[type_id]: {"s": score, "r": rating}
+                    for type_id, score, rating in zip(type_ids.tolist(), scores[type_ids].tolist(), ratings)
+                }
+
+        return {
+            "instance_types": instance_types,
+            "ranges": [item.model_dump() for item in self.ranges],
+            "spot_advisor": spot_advisor,
+        }
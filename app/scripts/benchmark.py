@@ -0,0 +1,347 @@
+"""
+Offline benchmark of the data path and API endpoints.
+
+Builds synthetic spot advisor and pricing data of realistic size in a
+temporary directory, stubs out AWS, and drives the app in-process:
+
+  spot_table_build       validating and encoding the advisor data
+  spot_data_cold         /api/spot-data right after the in-memory snapshot is dropped
+  spot_data_warm         /api/spot-data served from the snapshot
+  spot_data_filtered     /api/spot-data with region/family filters
+  pricing_cold           /api/pricing right after the loaded shards are dropped
+  pricing_warm           /api/pricing from loaded shards
+  pricing_batch          /api/pricing/batch for every region and OS
+  get_region_pricing     PricingService.get_region_pricing on loaded shards
+  ec2_summary_cold       /api/aws/ec2-summary with the EC2 inventory cache dropped, against a stubbed EC2 API
+  ec2_summary            /api/aws/ec2-summary served from the EC2 inventory cache
+  fleet_savings_cold     an /api/analysis/fleet-savings job, submitted and polled, with the inventory cache dropped
+  fleet_savings          the same job with the fleet in the EC2 inventory cache
+
+Each scenario reports p50/p99 latency, throughput and the process peak RSS.
+Use --json to get machine-readable output to diff between versions.
+
+Usage: python -m app.scripts.benchmark [--requests N] [--cold N] [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
+
+import httpx
+
+from app.scripts.download_pricing import OPERATING_SYSTEMS, REGIONS
+from app.services.aws_service import AWSService
+from app.services.cache_service import CacheService, DiskCache, MemoryCache, dumps
+from app.services.data_plane import DataPlane
+from app.services.history_service import HistoryService
+from app.services.pricing_service import REGION_NAMES, PricingService, write_shard
+from app.services.savings_service import FleetSavingsService
+from app.services.spot_service import SpotService, build_snapshot
+
+FAMILIES = [
+    "m5", "m5a", "m5d", "m5n", "m6a", "m6g", "m6i", "m6id", "m7g", "m7i", "c5", "c5a", "c5d", "c5n", "c6a",
+    "c6g", "c6gn", "c6i", "c7g", "c7i", "r5", "r5a", "r5b", "r5d", "r5n", "r6a", "r6g", "r6i", "r7g", "r7i",
+    "t3", "t3a", "t4g", "i3", "i3en", "i4i", "d3", "g4dn", "g5", "p3", "x2idn", "x2iedn", "z1d", "inf1",
+    "im4gn", "is4gen", "hpc6a", "u-6tb1", "a1", "h1", "m4", "c4", "r4", "t2", "x1e", "g4ad", "p4d", "trn1",
+    "vt1", "dl1",
+]
+SIZES = [
+    ("nano", 1, 0.5), ("micro", 1, 1), ("small", 1, 2), ("medium", 1, 4), ("large", 2, 8), ("xlarge", 4, 16), ("2xlarge", 8, 32), ("4xlarge", 16, 64),
+    ("8xlarge", 32, 128), ("12xlarge", 48, 192), ("16xlarge", 64, 256), ("24xlarge", 96, 384),
+    ("metal", 96, 384), ("32xlarge", 128, 512), ("48xlarge", 192, 768),
+]
+
+
+def make_spot_data(rng: random.Random, n_types: int) -> Dict[str, Any]:
+    """Advisor data shaped like the AWS feed: every region lists Linux, most list Windows."""
+    instance_types = {}
+    for family in FAMILIES:
+        ram_factor = rng.choice([0.5, 1, 2])
+        for size, cores, ram in SIZES:
+            if len(instance_types) < n_types:
+                instance_types[f"{family}.{size}"] = {
+                    "emr": rng.random() < 0.6, "cores": cores, "ram_gb": float(ram * ram_factor),
+                }
+    spot_advisor = {}
+    for region in REGION_NAMES:
+        spot_advisor[region] = {}
+        for os_name, share in (("Linux", 0.95), ("Windows", 0.7)):
+            spot_advisor[region][os_name] = {
+                instance_type: {"s": rng.randint(0, 90), "r": rng.randint(0, 4)}
+                for instance_type in instance_types
+                if rng.random() < share
+            }
+    return {
+        "instance_types": instance_types,
+        "ranges": [
+            {"index": 0, "label": "<5%", "dots": 0, "max": 5},
+            {"index": 1, "label": "5-10%", "dots": 1, "max": 11},
+            {"index": 2, "label": "10-15%", "dots": 2, "max": 16},
+            {"index": 3, "label": "15-20%", "dots": 3, "max": 22},
+            {"index": 4, "label": ">20%", "dots": 4, "max": 100},
+        ],
+        "spot_advisor": spot_advisor,
+    }
+
+
+def write_pricing_shards(rng: random.Random, data_dir: Path, instance_types: List[str]) -> None:
+    for region in REGIONS:
+        for os_name in OPERATING_SYSTEMS:
+            multiplier = 1.0 if os_name == "Linux" else 1.8
+            prices = {
+                instance_type: f"{rng.uniform(0.005, 30) * multiplier:.4f}"
+                for instance_type in instance_types
+                if rng.random() < 0.95
+            }
+            write_shard(data_dir, region, os_name, prices)
+
+
+class StubPaginator:
+    """describe_instances pages of synthetic instances, like botocore's paginator."""
+
+    def __init__(self, instances: List[dict], page_size: int):
+        self.instances = instances
+        self.page_size = page_size
+
+    def paginate(self, **kwargs) -> Iterator[dict]:
+        page_size = kwargs.get("PaginationConfig", {}).get("PageSize", self.page_size)
+        for start in range(0, len(self.instances), page_size):
+            yield {"Reservations": [{"Instances": self.instances[start:start + page_size]}]}
+
+
+class StubEC2Client:
+    def __init__(self, instances: List[dict]):
+        self.instances = instances
+
+    def get_paginator(self, operation: str) -> StubPaginator:
+        assert operation == "describe_instances"
+        return StubPaginator(self.instances, AWSService.PAGE_SIZE)
+
+
+def make_instances(rng: random.Random, region: str, count: int, instance_types: List[str]) -> List[dict]:
+    return [
+        {
+            "InstanceId": f"i-{region.replace('-', '')}{i:08x}",
+            "InstanceType": rng.choice(instance_types),
+            "State": {"Name": rng.choice(["running", "running", "running", "stopped"])},
+            "PrivateIpAddress": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "Platform": "windows" if rng.random() < 0.1 else None,
+        }
+        for i in range(count)
+    ]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def summarize(durations: List[float], wall: float) -> Dict[str, Any]:
+    ordered = sorted(durations)
+    percentiles = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "throughput_per_s": round(len(ordered) / wall, 1) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_scenario(
+    iterations: int,
+    call: Callable[[int], Awaitable[Any]],
+    before: Callable[[], None] = lambda: None,
+) -> Dict[str, Any]:
+    """Time call(i) iterations times; before() runs untimed ahead of each call (e.g. to drop caches)."""
+    durations = []
+    wall = 0.0
+    for i in range(iterations):
+        before()
+        started = time.perf_counter()
+        await call(i)
+        elapsed = time.perf_counter() - started
+        durations.append(elapsed)
+        wall += elapsed
+    return summarize(durations, wall)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args: argparse.Namespace, work_dir: Path) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+
+    # Keep everything in the temporary directory and never touch the network
+    CacheService.CACHE_DIR = work_dir
+    CacheService.configure([MemoryCache(), DiskCache(work_dir)])
+    PricingService.DATA_DIR = work_dir / "pricing"
+    HistoryService.DB_PATH = work_dir / "history.sqlite3"
+    FleetSavingsService.JOB_DIR = work_dir / "jobs"
+    DataPlane.ENABLED = False
+    SpotService.MEMORY_TTL = float("inf")
+
+    async def offline_refresh():
+        raise RuntimeError("The benchmark runs offline, spot data must come from the fixture")
+    SpotService.refresh = offline_refresh
+
+    spot_data = make_spot_data(rng, args.instance_types)
+    instance_types = list(spot_data["instance_types"])
+    CacheService.save_cached_data(SpotService.CACHE_FILE, spot_data)
+    write_pricing_shards(rng, PricingService.DATA_DIR, instance_types)
+
+    instances = {
+        region: make_instances(rng, region, args.instances, instance_types)
+        for region in list(REGIONS)[:args.ec2_regions]
+    }
+    AWSService._create_client = classmethod(lambda cls, credentials, region: StubEC2Client(instances[region]))
+
+    # Imported late so the app picks up the settings above
+    from app.main import app
+
+    fixture = {
+        "instance_types": len(instance_types),
+        "spot_regions": len(spot_data["spot_advisor"]),
+        "spot_payload_mb": round(len(dumps(spot_data)) / 2 ** 20, 2),
+        "pricing_shards": len(REGIONS) * len(OPERATING_SYSTEMS),
+        "ec2_regions": len(instances),
+        "ec2_instances_per_region": args.instances,
+    }
+
+    headers = {"Accept-Encoding": "br, gzip"}
+    regions = list(REGIONS)
+    credentials = {"access_key": "bench", "secret_key": "bench", "regions": list(instances)}
+    scenarios: Dict[str, Dict[str, Any]] = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def get(url: str, **params) -> None:
+            response = await client.get(url, params=params, headers=headers)
+            response.raise_for_status()
+
+        def drop_snapshot():
+            SpotService._snapshot = None
+
+        def drop_shards():
+            PricingService._shards = {}
+            PricingService._batches.clear()
+
+        build_timings = []
+        for _ in range(args.cold):
+            started = time.perf_counter()
+            await asyncio.to_thread(build_snapshot, spot_data, None)
+            build_timings.append(time.perf_counter() - started)
+        scenarios["spot_table_build"] = summarize(build_timings, sum(build_timings))
+
+        scenarios["spot_data_cold"] = await run_scenario(args.cold, lambda i: get("/api/spot-data"), drop_snapshot)
+        scenarios["spot_data_warm"] = await run_scenario(args.requests, lambda i: get("/api/spot-data"))
+        scenarios["spot_data_filtered"] = await run_scenario(
+            args.requests,
+            lambda i: get("/api/spot-data", regions=regions[i % len(regions)], families=FAMILIES[i % len(FAMILIES)]),
+        )
+
+        scenarios["pricing_cold"] = await run_scenario(
+            args.cold, lambda i: get("/api/pricing", region=regions[i % len(regions)], os="Linux"), drop_shards
+        )
+        scenarios["pricing_warm"] = await run_scenario(
+            args.requests,
+            lambda i: get("/api/pricing", region=regions[i % len(regions)], os=OPERATING_SYSTEMS[i % 2]),
+        )
+        scenarios["pricing_batch"] = await run_scenario(
+            args.requests, lambda i: get("/api/pricing/batch", regions=",".join(regions))
+        )
+
+        async def region_pricing(i: int) -> None:
+            PricingService.get_region_pricing(regions[i % len(regions)], OPERATING_SYSTEMS[i % 2])
+        scenarios["get_region_pricing"] = await run_scenario(args.requests * 10, region_pricing)
+
+        async def ec2_summary(i: int) -> None:
+            response = await client.post("/api/aws/ec2-summary", json=credentials)
+            response.raise_for_status()
+
+        def drop_inventories():
+            AWSService._inventories.clear()
+
+        scenarios["ec2_summary_cold"] = await run_scenario(max(args.requests // 10, 5), ec2_summary, drop_inventories)
+        scenarios["ec2_summary"] = await run_scenario(args.requests, ec2_summary)
+
+        async def fleet_savings(i: int) -> None:
+            # Submit a job and poll it until it is done, the way the UI does
+            response = await client.post("/api/analysis/fleet-savings", json=credentials)
+            response.raise_for_status()
+            url = response.headers["Location"]
+            while response.json()["status"] in ("pending", "running"):
+                await asyncio.sleep(0.001)
+                response = await client.get(url)
+                response.raise_for_status()
+            if response.json()["status"] != "done":
+                raise RuntimeError(f"Fleet savings job failed: {response.json()['error']}")
+
+        scenarios["fleet_savings_cold"] = await run_scenario(max(args.requests // 10, 5), fleet_savings, drop_inventories)
+        scenarios["fleet_savings"] = await run_scenario(max(args.requests // 10, 5), fleet_savings)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "fixture": fixture,
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per warm scenario")
+    parser.add_argument("--cold", type=int, default=5, help="Requests per cold scenario")
+    parser.add_argument("--instance-types", type=int, default=900, help="Instance types in the advisor fixture")
+    parser.add_argument("--instances", type=int, default=2000, help="Stubbed EC2 instances per region")
+    parser.add_argument("--ec2-regions", type=int, default=4, help="Regions in the EC2 summary request")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic fixtures")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    # Request logging would dominate the timings
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = asyncio.run(run(args, Path(tmp_dir)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    fixture = results["fixture"]
+    print(
+        f"Fixture: {fixture['instance_types']} instance types x {fixture['spot_regions']} regions "
+        f"({fixture['spot_payload_mb']} MB), {fixture['pricing_shards']} pricing shards, "
+        f"{fixture['ec2_regions']} x {fixture['ec2_instances_per_region']} EC2 instances"
+    )
+    print(f"{'scenario':<20} {'count':>6} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak RSS MB':>12}")
+    for name, result in results["scenarios"].items():
+        print(
+            f"{name:<20} {result['count']:>6} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+            f"{result['throughput_per_s'] or 0:>9.1f} {result['peak_rss_mb']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compare peak memory of buffered vs streaming ingestion of a raw pricing payload.
+
+Usage: python -m app.scripts.benchmark_ingest [--entries N] [--json]
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+from app.services.pricing_service import parse_pricing_file
+
+LOCATION = "US East (N. Virginia)"
+
+
+def write_synthetic_payload(path: Path, entries: int) -> None:
+    """Write a meteredUnitMap-shaped file with realistic per-entry attributes."""
+    families = ["m5", "m6i", "c5", "c6g", "r5", "r6i", "t3", "i4i", "g5", "x2idn"]
+    sizes = ["large", "xlarge", "2xlarge", "4xlarge", "8xlarge", "12xlarge", "16xlarge", "24xlarge"]
+    with open(path, 'w') as f:
+        f.write('{"manifest":{"serviceId":"ec2","currencyCode":"USD","source":"ec2"},"sets":{},"regions":{')
+        f.write(json.dumps(LOCATION) + ':{')
+        for i in range(entries):
+            instance_type = f"{families[i % len(families)]}.{sizes[(i // len(families)) % len(sizes)]}"
+            entry = {
+                "rateCode": f"RATE{i:08d}.JRTCKXETXF.6YS6EN2CT7",
+                "price": f"{0.01 * (i % 500 + 1):.10f}",
+                "Location": LOCATION,
+                "Instance Family": "General purpose",
+                "vCPU": str(2 ** (i % 7)),
+                "Memory": f"{2 ** (i % 9)} GiB",
+                "Storage": "EBS only",
+                "Network Performance": "Up to 10 Gigabit",
+                "Operating System": "Linux",
+                "Pre Installed S/W": "NA",
+                "License Model": "No License required",
+                "Tenancy": "Shared",
+                "Instance Type": f"{instance_type}-{i}",
+            }
+            if i:
+                f.write(',')
+            f.write(json.dumps(f"{instance_type}-{i} Linux Shared") + ':' + json.dumps(entry))
+        f.write('}}}')
+
+
+def buffered_ingest(path: Path) -> Dict[str, str]:
+    """The previous approach: materialize the document, then extract prices."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    prices = {}
+    for instances in data.get('regions', {}).values():
+        for instance_info in instances.values():
+            if instance_info.get('Instance Type'):
+                prices[instance_info['Instance Type']] = instance_info['price']
+    return prices
+
+
+def measure(ingest: Callable[[Path], Dict[str, str]], path: Path) -> Dict[str, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    prices = ingest(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"entries": len(prices), "seconds": round(elapsed, 4), "peak_mb": round(peak / 2 ** 20, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50000, help="Entries in the synthetic payload")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "index.json"
+        write_synthetic_payload(path, args.entries)
+        results = {
+            "payload_mb": round(path.stat().st_size / 2 ** 20, 2),
+            "buffered": measure(buffered_ingest, path),
+            "streaming": measure(parse_pricing_file, path),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Payload: {args.entries} entries, {results['payload_mb']} MB")
+    for name in ("buffered", "streaming"):
+        result = results[name]
+        print(f"{name:>10}: peak {result['peak_mb']:>8.2f} MB, {result['seconds']:.3f}s, {result['entries']} prices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Build a data bundle: the spot advisor data and EC2 pricing normalized,
+validated and indexed into one versioned, checksummed file that the app maps
+at startup instead of fetching anything (see BundleService).
+
+The spot advisor feed and the pricing files are downloaded from AWS unless
+local copies are given:
+
+  --spot FILE           a spot advisor JSON file (the raw AWS feed or the app's cache file)
+  --pricing-dir DIR     raw meteredUnitMap files laid out as DIR/<region>/<OS>.json
+  --shards-dir DIR      normalized pricing shards, e.g. app/data/pricing
+
+Usage: python -m app.scripts.build_bundle [--spot FILE] [--pricing-dir DIR | --shards-dir DIR]
+                                          [--output PATH] [--version LABEL]
+       python -m app.scripts.build_bundle --verify PATH
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from app.scripts.download_pricing import OPERATING_SYSTEMS, REGIONS, download_all_pricing_data
+from app.services.bundle_service import BundleService, DataBundle, PricingData, build_bundle
+from app.services.cache_service import read_file
+from app.services.pricing_service import parse_pricing_file
+from app.services.spot_service import SPOT_ADVISOR_URL, fetch_spot_data, normalize_spot_data
+
+logger = logging.getLogger(__name__)
+
+
+def read_pricing_dir(directory: Path, raw: bool) -> PricingData:
+    """Prices from DIR/<region>/<OS>.json files, raw meteredUnitMaps or normalized shards."""
+    pricing = {}
+    for path in sorted(directory.glob("*/*.json")):
+        region_code, os_name = path.parent.name, path.stem
+        if os_name not in OPERATING_SYSTEMS:
+            continue
+        pricing[(region_code, os_name)] = parse_pricing_file(path) if raw else read_file(path).get("prices", {})
+    return pricing
+
+
+async def download_pricing(allow_missing: bool) -> PricingData:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        statuses = await download_all_pricing_data(data_dir=Path(tmp_dir), incremental=False)
+        failed = [f"{region}/{os_name}" for region, oses in statuses.items() for os_name, status in oses.items() if status == "failed"]
+        if failed and not allow_missing:
+            raise RuntimeError(f"Failed to download pricing for {', '.join(failed)}")
+        return read_pricing_dir(Path(tmp_dir) / "pricing", raw=False)
+
+
+async def build(args: argparse.Namespace) -> Dict:
+    if args.spot:
+        spot_data = normalize_spot_data(read_file(args.spot))
+        spot_source = str(args.spot)
+    else:
+        spot_data = await fetch_spot_data()
+        spot_source = SPOT_ADVISOR_URL
+
+    if args.pricing_dir:
+        pricing = read_pricing_dir(args.pricing_dir, raw=True)
+        pricing_source = str(args.pricing_dir)
+    elif args.shards_dir:
+        pricing = read_pricing_dir(args.shards_dir, raw=False)
+        pricing_source = str(args.shards_dir)
+    else:
+        pricing = await download_pricing(args.allow_missing)
+        pricing_source = "aws"
+
+    missing = [
+        f"{region}/{os_name}" for region in REGIONS for os_name in OPERATING_SYSTEMS
+        if (region, os_name) not in pricing
+    ]
+    if missing:
+        logger.warning(f"No pricing for {len(missing)} region/OS pairs: {', '.join(missing)}")
+
+    return build_bundle(
+        args.output,
+        spot_data,
+        pricing,
+        version=args.version,
+        sources={"spot": spot_source, "pricing": pricing_source},
+    )
+
+
+def verify(path: Path) -> int:
+    try:
+        started = time.perf_counter()
+        bundle = DataBundle(path)
+        elapsed = time.perf_counter() - started
+    except Exception as e:
+        print(f"Invalid bundle {path}: {str(e)}")
+        return 1
+    info = bundle.info
+    print(f"Bundle {bundle.version} created {info['created_at']}, sha256 {bundle.checksum}")
+    print(
+        f"{info['instance_types']} instance types in {info['regions']} regions, "
+        f"{len(bundle.pricing_keys)} pricing shards; verified and mapped in {elapsed * 1000:.1f}ms"
+    )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spot", type=Path, help="Spot advisor JSON file instead of downloading it")
+    pricing = parser.add_mutually_exclusive_group()
+    pricing.add_argument("--pricing-dir", type=Path, help="Raw pricing files as DIR/<region>/<OS>.json")
+    pricing.add_argument("--shards-dir", type=Path, help="Normalized pricing shards as DIR/<region>/<OS>.json")
+    parser.add_argument("--allow-missing", action="store_true", help="Build even if some pricing downloads fail")
+    parser.add_argument("--output", type=Path, default=BundleService.PATH, help=f"Bundle to write (default {BundleService.PATH})")
+    parser.add_argument("--version", help="Version label (default: the build time, YYYYMMDDHHMMSS)")
+    parser.add_argument("--verify", type=Path, metavar="PATH", help="Check an existing bundle and print its details")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.verify:
+        sys.exit(verify(args.verify))
+
+    try:
+        asyncio.run(build(args))
+    except Exception as e:
+        logger.error(f"Failed to build the data bundle: {str(e)}")
+        sys.exit(1)
+    sys.exit(verify(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 import asyncio
-import httpx
 import json
+import os
+import random
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from pathlib import Path
 import logging
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, NamedTuple
+from app.services.cache_service import atomic_write
+from app.services.metrics import track_fetch
+from app.services.pricing_service import MeteredUnitMapParser, shard_path, write_shard
+
+if TYPE_CHECKING:
+    # Imported when downloading; the app imports this module at startup for the manifest helpers
+    import httpx
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define the regions and operating systems we want to fetch
@@ -32,48 +41,240 @@ REGIONS = {
 
 OPERATING_SYSTEMS = ['Linux', 'Windows']
 
+PRICING_BASE_URL = os.getenv(
+    "PRICING_BASE_URL",
+    "https://b0.p.awsstatic.com/pricing/2.0/meteredUnitMaps/ec2/USD/current/ec2-ondemand-without-sec-sel",
+)
+
+# Download tuning, overridable from the environment
+DOWNLOAD_CONCURRENCY = int(os.getenv("PRICING_DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_RETRIES = int(os.getenv("PRICING_DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_TIMEOUT = float(os.getenv("PRICING_DOWNLOAD_TIMEOUT", "30"))
+RETRY_BACKOFF = 0.5  # Base delay in seconds, doubled on every attempt
+
+# ETag / Last-Modified of every downloaded file, used for conditional refreshes
+MANIFEST_FILENAME = "pricing_manifest.json"
+
 def format_region_name(region: str) -> str:
     """Format region name to match AWS pricing API format."""
     return region.replace(" ", "%20").replace("(", "%28").replace(")", "%29")
 
-async def download_pricing_data(region_code: str, region_name: str, os_name: str) -> Optional[Dict[str, Any]]:
-    """Download pricing data for a specific region and OS."""
-    formatted_region = format_region_name(region_name)
-    url = f"https://b0.p.awsstatic.com/pricing/2.0/meteredUnitMaps/ec2/USD/current/ec2-ondemand-without-sec-sel/{formatted_region}/{os_name}/index.json"
-    
+def pricing_url(region_name: str, os_name: str, base_url: Optional[str] = None) -> str:
+    """Build the meteredUnitMap URL for a region and OS."""
+    return f"{base_url or PRICING_BASE_URL}/{format_region_name(region_name)}/{os_name}/index.json"
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package."""
     try:
-        async with httpx.AsyncClient() as client:
-            logger.info(f"Downloading pricing data for {region_code} ({os_name})")
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.json()
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def create_client(concurrency: int = DOWNLOAD_CONCURRENCY) -> "httpx.AsyncClient":
+    """Create the pooled client shared by all pricing downloads."""
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=http2_available(),
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=httpx.Timeout(DOWNLOAD_TIMEOUT),
+    )
+
+def _is_retryable(error: Exception) -> bool:
+    import httpx
+
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+class PricingDownload(NamedTuple):
+    """Result of a (conditional) pricing file request."""
+    prices: Optional[Dict[str, str]]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+
+def manifest_key(region_code: str, os_name: str) -> str:
+    return f"{region_code}/{os_name}"
+
+def load_manifest(data_dir: Path) -> Dict[str, Any]:
+    """Load the per-file validator manifest, or an empty one."""
+    manifest_file = data_dir / MANIFEST_FILENAME
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        manifest.setdefault("files", {})
+        return manifest
+    except FileNotFoundError:
+        return {"files": {}}
     except Exception as e:
-        logger.error(f"Failed to download pricing data for {region_code} ({os_name}): {str(e)}")
-        return None
-
-async def download_all_pricing_data():
-    """Download pricing data for all regions and operating systems."""
-    # Create the data directory if it doesn't exist
-    data_dir = Path(__file__).parent.parent / "data"
-    data_dir.mkdir(exist_ok=True)
-    
-    pricing_data = {}
-    
-    # Download data for each region and OS combination
-    for region_code, region_name in REGIONS.items():
-        pricing_data[region_code] = {}
-        for os_name in OPERATING_SYSTEMS:
-            data = await download_pricing_data(region_code, region_name, os_name)
-            if data:
-                pricing_data[region_code][os_name] = data
-    
-    # Save the combined data
-    output_file = data_dir / "ec2_pricing.json"
-    with open(output_file, 'w') as f:
-        json.dump(pricing_data, f)
-    
-    logger.info(f"Pricing data saved to {output_file}")
-    return pricing_data
+        logger.error(f"Error reading pricing manifest {manifest_file}: {str(e)}")
+        return {"files": {}}
+
+def save_manifest(data_dir: Path, manifest: Dict[str, Any]) -> None:
+    atomic_write(data_dir / MANIFEST_FILENAME, json.dumps(manifest, indent=2).encode())
+
+async def download_pricing_data(
+    region_code: str,
+    region_name: str,
+    os_name: str,
+    client: Optional["httpx.AsyncClient"] = None,
+    base_url: Optional[str] = None,
+    retries: int = DOWNLOAD_RETRIES,
+    validators: Optional[Dict[str, str]] = None,
+) -> Optional[PricingDownload]:
+    """
+    Download pricing data for a specific region and OS, retrying transient failures.
+
+    The payload is stream-parsed down to instance type -> hourly price.
+
+    When validators (etag / last_modified) from a previous download are given, a
+    conditional request is sent and a 304 is reported as not_modified.
+    """
+    if client is None:
+        async with create_client(1) as own_client:
+            return await download_pricing_data(
+                region_code, region_name, os_name, own_client, base_url, retries, validators
+            )
+
+    url = pricing_url(region_name, os_name, base_url)
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    for attempt in range(retries + 1):
+        try:
+            logger.info(f"Downloading pricing data for {region_code} ({os_name})")
+            with track_fetch("pricing", f"{region_code}/{os_name}") as fetch:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304:
+                        fetch["outcome"] = "not_modified"
+                        logger.info(f"Pricing data for {region_code} ({os_name}) not modified")
+                        return PricingDownload(
+                            prices=None,
+                            etag=response.headers.get("ETag", validators.get("etag") if validators else None),
+                            last_modified=response.headers.get(
+                                "Last-Modified", validators.get("last_modified") if validators else None
+                            ),
+                            not_modified=True,
+                        )
+                    response.raise_for_status()
+
+                    # Parse the payload as it arrives instead of buffering the whole document
+                    parser = MeteredUnitMapParser()
+                    async for chunk in response.aiter_bytes():
+                        parser.feed(chunk)
+                    return PricingDownload(
+                        prices=parser.close(),
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+        except Exception as e:
+            if attempt < retries and _is_retryable(e):
+                delay = _backoff_delay(attempt)
+                logger.warning(
+                    f"Retrying pricing download for {region_code} ({os_name}) in {delay:.2f}s "
+                    f"(attempt {attempt + 1}/{retries}): {str(e)}"
+                )
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"Failed to download pricing data for {region_code} ({os_name}): {str(e)}")
+            return None
+
+async def download_all_pricing_data(
+    concurrency: Optional[int] = None,
+    base_url: Optional[str] = None,
+    data_dir: Optional[Path] = None,
+    incremental: bool = True,
+    client: Optional["httpx.AsyncClient"] = None,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Download pricing data for all regions and operating systems.
+
+    Every file is normalized into its own shard (data/pricing/<region>/<os>.json)
+    as soon as it arrives. With incremental refreshes, files that already have a
+    shard are requested conditionally and only the ones AWS reports as changed
+    are rewritten. Returns the refresh status of every region and OS.
+
+    A client can be passed in (e.g. one on an httpx.MockTransport); by default
+    a pooled client is created for the run.
+    """
+    concurrency = concurrency or DOWNLOAD_CONCURRENCY
+
+    # Create the data directories if they don't exist
+    data_dir = data_dir or Path(__file__).parent.parent / "data"
+    shards_dir = data_dir / "pricing"
+    shards_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = load_manifest(data_dir) if incremental else {"files": {}}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    # A client that was passed in stays open for the caller
+    async with (nullcontext(client) if client is not None else create_client(concurrency)) as client:
+        async def fetch(region_code: str, region_name: str, os_name: str):
+            key = manifest_key(region_code, os_name)
+            # Validators are only trusted while the shard they describe still exists
+            validators = None
+            if shard_path(shards_dir, region_code, os_name).exists():
+                validators = manifest["files"].get(key)
+
+            async with semaphore:
+                fetch_started = time.perf_counter()
+                result = await download_pricing_data(
+                    region_code, region_name, os_name, client, base_url, validators=validators
+                )
+
+            if result is None:
+                status = "failed"
+            elif result.not_modified:
+                status = "not modified"
+            else:
+                status = "updated"
+                # The shard is fsynced, keep that off the event loop
+                await asyncio.to_thread(write_shard, shards_dir, region_code, os_name, result.prices)
+            if result is not None:
+                manifest["files"][key] = {"etag": result.etag, "last_modified": result.last_modified}
+            return region_code, os_name, status, time.perf_counter() - fetch_started
+
+        # Download every region and OS combination concurrently
+        results = await asyncio.gather(*(
+            fetch(region_code, region_name, os_name)
+            for region_code, region_name in REGIONS.items()
+            for os_name in OPERATING_SYSTEMS
+        ))
+
+    statuses: Dict[str, Dict[str, str]] = {region_code: {} for region_code in REGIONS}
+    timings: Dict[str, Dict[str, str]] = {region_code: {} for region_code in REGIONS}
+    for region_code, os_name, status, elapsed in results:
+        statuses[region_code][os_name] = status
+        timings[region_code][os_name] = f"{elapsed:.2f}s ({status})"
+
+    for region_code, os_timings in timings.items():
+        details = ", ".join(f"{os_name} {timing}" for os_name, timing in os_timings.items())
+        logger.info(f"Pricing download for {region_code}: {details}")
+    changed = sum(1 for _, _, status, _ in results if status == "updated")
+    logger.info(
+        f"Checked {len(results)} pricing files in {time.perf_counter() - started:.2f}s "
+        f"(concurrency {concurrency}), {changed} changed, pricing shards in {shards_dir}"
+    )
+
+    # A run where every download failed didn't check anything, so it must not delay the next one
+    if any(status != "failed" for _, _, status, _ in results):
+        manifest["checked_at"] = datetime.now(timezone.utc).isoformat()
+    await asyncio.to_thread(save_manifest, data_dir, manifest)
+    return statuses
 
 if __name__ == "__main__":
-    asyncio.run(download_all_pricing_data()) 
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(download_all_pricing_data())
@@ -1,50 +1,72 @@
 import asyncio
 import logging
-import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from .download_pricing import download_all_pricing_data
+from typing import Optional
+from .download_pricing import download_all_pricing_data, load_manifest
+from app.services.history_service import HistoryService
+from app.services.pricing_service import PricingService
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def init_data():
+DATA_DIR = Path(__file__).parent.parent / "data"
+PRICING_MAX_AGE = timedelta(hours=24)
+
+def pricing_data_age() -> Optional[float]:
+    """Seconds since the pricing data was last checked, None if there is none."""
+    manifest = load_manifest(DATA_DIR)
+    if not PricingService.has_data() or not manifest.get("checked_at"):
+        return None
+    # Use the time of the last check, shards are not rewritten when nothing changed
+    last_checked = datetime.fromisoformat(manifest["checked_at"])
+    return (datetime.now(timezone.utc) - last_checked).total_seconds()
+
+async def init_data() -> bool:
     """Initialize all required data files."""
     logger.info("Starting data initialization...")
     
     # Create data directory if it doesn't exist
-    data_dir = Path(__file__).parent.parent / "data"
-    data_dir.mkdir(exist_ok=True)
+    DATA_DIR.mkdir(exist_ok=True)
     
-    # Check if pricing data file exists and when it was last modified
-    pricing_file = data_dir / "ec2_pricing.json"
+    # Check if pricing shards exist and when they were last checked
     should_download = True
+    age = pricing_data_age()
+    success = True
     
-    if pricing_file.exists():
-        # Get the file's last modification time
-        file_mod_time = datetime.fromtimestamp(pricing_file.stat().st_mtime)
-        current_time = datetime.now()
-        
-        # If file is less than 24 hours old, don't download
-        if current_time - file_mod_time < timedelta(hours=24):
-            logger.info("EC2 pricing data is less than 24 hours old. Skipping download.")
+    if age is not None:
+        # If data was checked less than 24 hours ago, don't download
+        if age < PRICING_MAX_AGE.total_seconds():
+            logger.info("EC2 pricing data was checked less than 24 hours ago. Skipping download.")
             should_download = False
         else:
-            logger.info("EC2 pricing data is more than 24 hours old. Downloading fresh data.")
+            logger.info("EC2 pricing data was checked more than 24 hours ago. Refreshing changed files.")
     else:
-        logger.info("EC2 pricing data file not found. Downloading data.")
+        logger.info("EC2 pricing data not found. Downloading data.")
     
     # Download pricing data if needed
     if should_download:
         logger.info("Downloading EC2 pricing data...")
-        pricing_data = await download_all_pricing_data()
-        if pricing_data:
+        statuses = await download_all_pricing_data()
+        success = any(status != "failed" for region in statuses.values() for status in region.values())
+        if success:
             logger.info("Successfully downloaded EC2 pricing data")
         else:
             logger.error("Failed to download EC2 pricing data")
     
+    # Drop loaded pricing shards that changed, they are reloaded on their next request
+    PricingService.refresh()
+    # Followers in other workers map the shards instead of reading them
+    await PricingService.publish()
+
+    if should_download and success:
+        try:
+            await asyncio.to_thread(HistoryService.record_pricing, PricingService.DATA_DIR)
+        except Exception as e:
+            logger.error(f"Failed to record pricing history: {str(e)}")
+    
     logger.info("Data initialization complete")
+    return success
 
 if __name__ == "__main__":
-    asyncio.run(init_data()) 
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(init_data())
@@ -0,0 +1,183 @@
+"""
+Import-time and startup benchmark.
+
+Builds a synthetic data bundle in a temporary directory, then starts the app
+in fresh interpreters, timing each phase:
+
+  import         importing app.main
+  startup        the startup handlers, i.e. loading the bundle
+  first_request  the first /api/spot-data and /api/pricing responses
+  ready          the sum of the above
+
+and lists the heavy modules (boto3, botocore, httpx) that were loaded by the
+time the app was ready; they should only be imported when first used.
+
+Exits with status 1 if the median time to ready exceeds --max-ready-ms or a
+heavy module was loaded, so it can guard against regressions in CI.
+
+Usage: python -m app.scripts.startup_benchmark [--runs N] [--max-ready-ms MS] [--importtime] [--json]
+"""
+# Only the standard library is imported up front: the child processes time
+# their own imports of the app
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+HEAVY_MODULES = ("boto3", "botocore", "httpx")
+PHASES = ("import", "startup", "first_request", "ready")
+
+
+def build_fixture(path: Path, seed: int, n_types: int) -> None:
+    """Write a bundle of realistic size: synthetic spot data and pricing for every region."""
+    from app.scripts.benchmark import make_spot_data
+    from app.scripts.download_pricing import OPERATING_SYSTEMS, REGIONS
+    from app.services.bundle_service import build_bundle
+
+    rng = random.Random(seed)
+    spot_data = make_spot_data(rng, n_types)
+    pricing = {
+        (region, os_name): {
+            instance_type: f"{rng.uniform(0.005, 30):.4f}"
+            for instance_type in spot_data["instance_types"]
+            if rng.random() < 0.95
+        }
+        for region in REGIONS
+        for os_name in OPERATING_SYSTEMS
+    }
+    build_bundle(path, spot_data, pricing, version="startup-benchmark")
+
+
+def child() -> None:
+    """Start the app in this (fresh) interpreter and print the phase timings as JSON."""
+    started = time.perf_counter()
+    import asyncio
+
+    import app.main
+    imported = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    async def start() -> Dict[str, float]:
+        async with app.main.app.router.lifespan_context(app.main.app):
+            up = time.perf_counter()
+            heavy.extend(name for name in HEAVY_MODULES if name in sys.modules and name not in heavy)
+
+            # The benchmark's own client, imported outside the timed phases
+            import httpx
+            transport = httpx.ASGITransport(app=app.main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+                requested = time.perf_counter()
+                for url in ("/api/spot-data", "/api/pricing?region=us-east-1&os=Linux"):
+                    response = await client.get(url, headers={"Accept-Encoding": "br, gzip"})
+                    response.raise_for_status()
+                served = time.perf_counter()
+        return {"startup": up - imported, "first_request": served - requested}
+
+    timings = asyncio.run(start())
+    print(json.dumps({
+        "import": imported - started,
+        **timings,
+        "ready": imported - started + timings["startup"] + timings["first_request"],
+        "heavy_modules": heavy,
+        "bundle": app.main.BundleService.status() is not None,
+    }))
+
+
+def run_child(env: Dict[str, str], cwd: Path) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, "-m", "app.scripts.startup_benchmark", "--child"],
+        env=env, cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"App startup failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(env: Dict[str, str], cwd: Path, top: int) -> List[Dict[str, Any]]:
+    """The slowest modules to import (cumulative) from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, cwd=cwd, capture_output=True, text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        modules.append({"module": parts[2].strip(), "cumulative_ms": round(int(parts[1]) / 1000, 1)})
+    modules.sort(key=lambda module: -module["cumulative_ms"])
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="App starts to time")
+    parser.add_argument("--max-ready-ms", type=float, default=1000, help="Fail if the median time to ready exceeds this")
+    parser.add_argument("--instance-types", type=int, default=900, help="Instance types in the bundle fixture")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic fixture")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    root = Path(__file__).resolve().parent.parent.parent
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = Path(tmp_dir)
+        build_fixture(work_dir / "data.bundle", args.seed, args.instance_types)
+        # Everything the app could write goes to the temporary directory
+        env = {
+            **os.environ,
+            "DATA_BUNDLE": str(work_dir / "data.bundle"),
+            "DATA_PLANE_LOCK_FILE": str(work_dir / ".data_plane.lock"),
+            "FLEET_SAVINGS_JOB_DIR": str(work_dir / "jobs"),
+            "SHARED_DATA_PLANE": "0",
+            "LOG_LEVEL": "WARNING",
+        }
+        runs = [run_child(env, root) for _ in range(args.runs)]
+        profile = import_profile(env, root, 15) if args.importtime else []
+
+    if not all(run["bundle"] for run in runs):
+        print("The app didn't load the bundle fixture")
+        sys.exit(1)
+    results = {
+        phase: {
+            "median_ms": round(statistics.median(run[phase] for run in runs) * 1000, 1),
+            "min_ms": round(min(run[phase] for run in runs) * 1000, 1),
+        }
+        for phase in PHASES
+    }
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "phases": results, "heavy_modules": heavy, "slowest_imports": profile}, indent=2))
+    else:
+        print(f"{'phase':<14} {'median ms':>10} {'min ms':>10}")
+        for phase, result in results.items():
+            print(f"{phase:<14} {result['median_ms']:>10.1f} {result['min_ms']:>10.1f}")
+        print(f"Heavy modules loaded by startup: {', '.join(heavy) or 'none'}")
+        for module in profile:
+            print(f"  {module['cumulative_ms']:>8.1f} ms  {module['module']}")
+
+    failures = []
+    if results["ready"]["median_ms"] > args.max_ready_ms:
+        failures.append(f"median time to ready {results['ready']['median_ms']}ms exceeds {args.max_ready_ms}ms")
+    if heavy:
+        failures.append(f"{', '.join(heavy)} imported at startup")
+    if failures:
+        print(f"FAILED: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
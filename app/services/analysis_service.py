@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.analysis import RegionStackAnalysis, StackAnalysisRequest, StackAnalysisResponse
+from app.services.pricing_service import PricingService
+from app.services.spot_service import SpotService, SpotSnapshot
+
+logger = logging.getLogger(__name__)
+
+OPERATING_SYSTEMS = ("Linux", "Windows")
+
+
+class AnalysisMatrix:
+    """
+    Region x instance type matrices of on-demand price, spot savings (%) and
+    interruption rating, one set per OS. Missing values are NaN.
+    """
+
+    def __init__(self, snapshot: SpotSnapshot):
+        table = snapshot.data
+        self.interruption_labels: Dict[int, str] = {item.index: item.label for item in table.ranges}
+        self.regions: List[str] = sorted(table.regions)
+        self.row = {region: i for i, region in enumerate(self.regions)}
+
+        prices = {
+            (region, os): PricingService.get_region_pricing(region, os) or {}
+            for region in self.regions
+            for os in OPERATING_SYSTEMS
+        }
+        instance_types = set(table.instance_types)
+        for rates in prices.values():
+            instance_types.update(rates)
+        self.instance_types: List[str] = sorted(instance_types)
+        self.column = {instance_type: i for i, instance_type in enumerate(self.instance_types)}
+
+        shape = (len(self.regions), len(self.instance_types))
+        self.price = {os: np.full(shape, np.nan) for os in OPERATING_SYSTEMS}
+        self.savings = {os: np.full(shape, np.nan) for os in OPERATING_SYSTEMS}
+        self.risk = {os: np.full(shape, np.nan) for os in OPERATING_SYSTEMS}
+        self.has_pricing = {os: np.zeros(len(self.regions), dtype=bool) for os in OPERATING_SYSTEMS}
+
+        for (region, os), rates in prices.items():
+            row = self.row[region]
+            self.has_pricing[os][row] = bool(rates)
+            for instance_type, rate in rates.items():
+                self.price[os][row, self.column[instance_type]] = float(rate.price)
+
+        # Scatter the advisor's (region, OS, type) matrices into this matrix's row/column order
+        rows = np.array([self.row[region] for region in table.regions], dtype=int)
+        columns = np.array([self.column[instance_type] for instance_type in table.instance_types], dtype=int)
+        for os_id, os in enumerate(table.OPERATING_SYSTEMS):
+            region_ids, type_ids = np.nonzero(table.s[:, os_id, :] != table.MISSING)
+            self.savings[os][rows[region_ids], columns[type_ids]] = table.s[region_ids, os_id, type_ids]
+            self.risk[os][rows[region_ids], columns[type_ids]] = table.r[region_ids, os_id, type_ids]
+
+
+class AnalysisService:
+    _matrix: Optional[AnalysisMatrix] = None
+    _matrix_key: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    async def get_matrix(cls) -> AnalysisMatrix:
+        """The matrix for the current spot and pricing data, rebuilt when either changes."""
+        snapshot = await SpotService.get_snapshot()
+        key = (id(snapshot), PricingService.generation)
+        if cls._matrix is None or cls._matrix_key != key:
+            cls._matrix = await asyncio.to_thread(AnalysisMatrix, snapshot)
+            cls._matrix_key = key
+            logger.info(
+                f"Built analysis matrix for {len(cls._matrix.regions)} regions x "
+                f"{len(cls._matrix.instance_types)} instance types"
+            )
+        return cls._matrix
+
+    @classmethod
+    async def analyze_stack(cls, request: StackAnalysisRequest) -> StackAnalysisResponse:
+        matrix = await cls.get_matrix()
+        return analyze_stack(matrix, request)
+
+
+def analyze_stack(matrix: AnalysisMatrix, request: StackAnalysisRequest) -> StackAnalysisResponse:
+    """Cost, risk and combined ranking of a stack in every region, computed column-wise."""
+    # Quantities per OS over the instance type columns used by the stack
+    quantities: Dict[str, Dict[int, int]] = {os: {} for os in OPERATING_SYSTEMS}
+    unknown = []
+    for item in request.items:
+        column = matrix.column.get(item.instance_type)
+        if column is None:
+            unknown.append(item.instance_type)
+            continue
+        quantities[item.os][column] = quantities[item.os].get(column, 0) + item.quantity
+
+    if request.regions:
+        rows = [matrix.row[region] for region in dict.fromkeys(request.regions) if region in matrix.row]
+        unavailable = [region for region in request.regions if region not in matrix.row]
+    else:
+        rows = list(range(len(matrix.regions)))
+        unavailable = []
+    rows = np.array(rows, dtype=int)
+
+    n_regions = len(rows)
+    on_demand = np.zeros(n_regions)
+    spot = np.zeros(n_regions)
+    risk_sum = np.zeros(n_regions)
+    covered = np.zeros(n_regions)
+    total = 0
+    has_pricing = np.ones(n_regions, dtype=bool)
+    missing_pricing: List[List[str]] = [[] for _ in range(n_regions)]
+
+    for os in OPERATING_SYSTEMS:
+        if not quantities[os]:
+            continue
+        columns = np.fromiter(quantities[os].keys(), dtype=int)
+        qty = np.fromiter(quantities[os].values(), dtype=float)
+        total += qty.sum()
+        has_pricing &= matrix.has_pricing[os][rows]
+
+        price = matrix.price[os][np.ix_(rows, columns)]
+        savings = matrix.savings[os][np.ix_(rows, columns)]
+        risk = matrix.risk[os][np.ix_(rows, columns)]
+
+        item_on_demand = np.nan_to_num(price) * qty
+        has_spot = ~np.isnan(savings)
+        item_spot = np.where(has_spot, item_on_demand * (1 - np.nan_to_num(savings) / 100), item_on_demand)
+
+        on_demand += item_on_demand.sum(axis=1)
+        spot += item_spot.sum(axis=1)
+        risk_sum += np.nansum(risk * qty, axis=1)
+        covered += (has_spot * qty).sum(axis=1)
+
+        for i, j in zip(*np.nonzero(np.isnan(price))):
+            missing_pricing[i].append(matrix.instance_types[columns[j]])
+
+    # Regions without any on-demand prices for the stack's OSes can't be costed
+    unavailable += [matrix.regions[row] for row in rows[~has_pricing]]
+    keep = np.nonzero(has_pricing)[0]
+
+    savings_total = on_demand - spot
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Per instance, so an item's weight in the score is its quantity
+        risk_score = np.where(covered > 0, risk_sum / covered, np.nan)
+
+    # Combined score as shown in the UI: normalized savings minus normalized risk.
+    # Regions missing prices for some items would look cheaper than they are,
+    # so only fully priced regions are scored and ranked.
+    combined = np.full(n_regions, np.nan)
+    complete = np.array([not missing for missing in missing_pricing], dtype=bool)
+    scored = keep[complete[keep] & ~np.isnan(risk_score[keep])]
+    if len(scored):
+        max_savings = savings_total[scored].max()
+        max_risk = risk_score[scored].max()
+        savings_part = savings_total[scored] / max_savings * 100 if max_savings > 0 else 0
+        risk_part = risk_score[scored] / max_risk * 100 if max_risk > 0 else 0
+        combined[scored] = savings_part - risk_part
+
+    ranks = np.full(n_regions, 0)
+    order = scored[np.argsort(-combined[scored], kind="stable")]
+    ranks[order] = np.arange(1, len(order) + 1)
+
+    regions = [
+        RegionStackAnalysis(
+            region=matrix.regions[rows[i]],
+            on_demand=float(on_demand[i]),
+            spot=float(spot[i]),
+            savings=float(savings_total[i]),
+            risk_score=None if np.isnan(risk_score[i]) else float(risk_score[i]),
+            combined_score=None if np.isnan(combined[i]) else float(combined[i]),
+            rank=int(ranks[i]) or None,
+            spot_coverage=float(covered[i] / total) if total else 0.0,
+            missing_pricing=missing_pricing[i],
+        )
+        for i in keep
+    ]
+    # Ranked regions first, best combined score first
+    regions.sort(key=lambda r: (r.rank is None, r.rank or 0, -r.savings))
+
+    return StackAnalysisResponse(
+        regions=regions,
+        unavailable_regions=unavailable,
+        unknown_instance_types=list(dict.fromkeys(unknown)),
+    )
@@ -1,11 +1,35 @@
-import boto3
-from botocore.exceptions import ClientError
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import logging
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 from pydantic import BaseModel
+from app.services.metrics import CACHE_LOOKUPS, UPSTREAM_FETCH_DURATION, sampled, track_fetch
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Everything except terminated, filtered server side
+LIVE_INSTANCE_STATES = ["pending", "running", "shutting-down", "stopping", "stopped"]
+# States an instance only passes through; incremental refreshes follow these
+TRANSITIONAL_STATES = ["pending", "shutting-down", "stopping"]
+# Values per DescribeInstances filter
+MAX_FILTER_VALUES = 200
+# States in which an instance's compute is billed
+BILLED_INSTANCE_STATES = ("pending", "running")
+
+InventoryKey = Tuple[str, str]  # credential scope, region
+
 class EC2Instance(BaseModel):
     instance_id: str
     instance_type: str
@@ -24,76 +48,415 @@ class AWSCredentials(BaseModel):
     secret_key: str
     regions: List[str]
 
+@dataclass
+class RegionInventory:
+    """The instances of one region as last described for one set of credentials."""
+    instances: Dict[str, dict]  # instance id -> EC2Instance fields
+    full_refresh_at: float  # time.monotonic() of the last full describe
+    refreshed_at: float  # time.monotonic() of the last refresh, full or incremental
+    refreshed_wall: float  # time.time() of the last refresh, to find instances launched since
+
+    @cached_property
+    def counts(self) -> Dict[str, int]:
+        """Instance counts by type; inventories are replaced rather than modified, so this is computed once."""
+        counts: Dict[str, int] = {}
+        for record in self.instances.values():
+            counts[record["instance_type"]] = counts.get(record["instance_type"], 0) + 1
+        return counts
+
+    @cached_property
+    def billed_counts(self) -> Dict[Tuple[str, str], int]:
+        """Counts of billed (pending or running) instances by (platform, instance type)."""
+        counts: Dict[Tuple[str, str], int] = {}
+        for record in self.instances.values():
+            if record["state"] in BILLED_INSTANCE_STATES:
+                key = (record["platform"], record["instance_type"])
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+class RegionCancelled(Exception):
+    """The caller gave up on a region, raised by the worker at the next page."""
+
+
+def is_aws_error(error: Exception) -> bool:
+    """Whether error was raised by botocore, without importing it if no client was ever created."""
+    exceptions = sys.modules.get("botocore.exceptions")
+    return exceptions is not None and isinstance(error, (exceptions.ClientError, exceptions.BotoCoreError))
+
+
+def launch_time_prefixes(since: float, until: float) -> List[str]:
+    """launch-time filter values (hour wildcards) matching every launch between two times."""
+    hour = datetime.fromtimestamp(since, tz=timezone.utc).replace(minute=0, second=0, microsecond=0)
+    end = datetime.fromtimestamp(until, tz=timezone.utc)
+    prefixes = []
+    while hour <= end:
+        prefixes.append(hour.strftime("%Y-%m-%dT%H*"))
+        hour += timedelta(hours=1)
+    return prefixes
+
+
 class AWSService:
+    # Regions are described in parallel on a bounded pool so boto3's blocking
+    # calls never run on the event loop
+    MAX_WORKERS = int(os.getenv("EC2_MAX_WORKERS", "8"))
+    REGION_TIMEOUT = float(os.getenv("EC2_REGION_TIMEOUT", "60"))
+    PAGE_SIZE = 1000
+    STREAM_QUEUE_PAGES = 8
+    # Streams have their own pool: their workers wait on slow consumers and
+    # mustn't hold up cached lookups
+    STREAM_MAX_WORKERS = int(os.getenv("EC2_STREAM_MAX_WORKERS", "8"))
+    # Point at a local endpoint (e.g. a moto server) for testing
+    ENDPOINT_URL = os.getenv("AWS_EC2_ENDPOINT_URL") or None
+    # Inventories younger than this are served without calling AWS
+    INVENTORY_TTL = float(os.getenv("EC2_INVENTORY_TTL", "30"))
+    # Older inventories are described in full instead of incrementally
+    INVENTORY_FULL_REFRESH = float(os.getenv("EC2_INVENTORY_FULL_REFRESH", "300"))
+    MAX_INVENTORIES = int(os.getenv("EC2_MAX_INVENTORIES", "64"))
+    MAX_CLIENTS = int(os.getenv("EC2_MAX_CLIENTS", "64"))
+    # Slack for clock skew when looking for instances launched since the last refresh
+    LAUNCH_TIME_MARGIN = 120
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _stream_executor: Optional[ThreadPoolExecutor] = None
+    _clients: "OrderedDict[InventoryKey, Any]" = OrderedDict()
+    _clients_lock = threading.Lock()
+    _inventories: "OrderedDict[InventoryKey, RegionInventory]" = OrderedDict()
+    _refreshing: Dict[InventoryKey, asyncio.Task] = {}
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS, thread_name_prefix="ec2")
+        return cls._executor
+
+    @classmethod
+    def _get_stream_executor(cls) -> ThreadPoolExecutor:
+        if cls._stream_executor is None:
+            cls._stream_executor = ThreadPoolExecutor(max_workers=cls.STREAM_MAX_WORKERS, thread_name_prefix="ec2-stream")
+        return cls._stream_executor
+
     @staticmethod
-    async def get_ec2_instances(credentials: AWSCredentials) -> Dict[str, List[EC2Instance]]:
+    def _scope(credentials: AWSCredentials) -> str:
+        """Identifies a set of credentials without keeping the secret key around as a key."""
+        return hashlib.sha256(f"{credentials.access_key}:{credentials.secret_key}".encode()).hexdigest()
+
+    @classmethod
+    def _get_client(cls, credentials: AWSCredentials, region: str):
+        """A pooled EC2 client; botocore clients are thread safe and keep their connections open."""
+        key = (cls._scope(credentials), region)
+        with cls._clients_lock:
+            client = cls._clients.get(key)
+            if client is not None:
+                cls._clients.move_to_end(key)
+                return client
+        client = cls._create_client(credentials, region)
+        with cls._clients_lock:
+            client = cls._clients.setdefault(key, client)
+            while len(cls._clients) > cls.MAX_CLIENTS:
+                cls._clients.popitem(last=False)
+        return client
+
+    @classmethod
+    def _create_client(cls, credentials: AWSCredentials, region: str):
+        # boto3 takes a good part of the app's import time, so it's only loaded once AWS is called
+        import boto3
+        from botocore.config import Config
+
+        # Create a session with the provided credentials
+        session = boto3.Session(
+            aws_access_key_id=credentials.access_key,
+            aws_secret_access_key=credentials.secret_key,
+            region_name=region
+        )
+        config = Config(
+            connect_timeout=5,
+            read_timeout=cls.REGION_TIMEOUT,
+            retries={"max_attempts": 3, "mode": "standard"},
+        )
+        return session.client('ec2', endpoint_url=cls.ENDPOINT_URL, config=config)
+
+    @classmethod
+    def _iter_instances(
+        cls,
+        credentials: AWSCredentials,
+        region: str,
+        filters: Optional[List[dict]] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Iterator[List[dict]]:
         """
-        Get all EC2 instances from specified regions using provided credentials
+        Blocking, page by page iteration over a region's non-terminated
+        instances matching filters. Raises RegionCancelled once cancelled is
+        set, so abandoned workers stop at the next page instead of finishing.
         """
-        result = {}
-        
-        for region in credentials.regions:
+        ec2_client = cls._get_client(credentials, region)
+        paginator = ec2_client.get_paginator('describe_instances')
+        pages = paginator.paginate(
+            Filters=filters or [{"Name": "instance-state-name", "Values": LIVE_INSTANCE_STATES}],
+            PaginationConfig={"PageSize": cls.PAGE_SIZE},
+        )
+        for page in pages:
+            if cancelled is not None and cancelled.is_set():
+                raise RegionCancelled(region)
+            yield [
+                instance
+                for reservation in page['Reservations']
+                for instance in reservation['Instances']
+                # Skip terminated instances
+                if instance['State']['Name'] != 'terminated'
+            ]
+
+    @staticmethod
+    def _instance_record(instance: dict, region: str) -> dict:
+        """The EC2Instance fields of a raw describe_instances entry."""
+        return {
+            "instance_id": instance['InstanceId'],
+            "instance_type": instance['InstanceType'],
+            "region": region,
+            "state": instance['State']['Name'],
+            "private_ip": instance.get('PrivateIpAddress'),
+            "public_ip": instance.get('PublicIpAddress'),
+            "platform": "Windows" if instance.get('Platform') == 'windows' else "Linux",
+        }
+
+    @classmethod
+    def _describe(
+        cls,
+        credentials: AWSCredentials,
+        region: str,
+        filters: Optional[List[dict]] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> Dict[str, dict]:
+        """Blocking describe of a region's instances matching filters, as instance id -> record."""
+        return {
+            instance['InstanceId']: cls._instance_record(instance, region)
+            for page in cls._iter_instances(credentials, region, filters, cancelled)
+            for instance in page
+        }
+
+    @classmethod
+    def _refresh_region(
+        cls,
+        credentials: AWSCredentials,
+        region: str,
+        previous: Optional[RegionInventory],
+        cancelled: Optional[threading.Event] = None,
+    ) -> RegionInventory:
+        """
+        Blocking refresh of a region's inventory, run on the worker pool.
+
+        A recent inventory is brought up to date from what can have changed
+        since: instances in a transitional state, instances launched since the
+        last refresh, and instances that were transitional and have settled.
+        Changes that complete entirely between two refreshes (e.g. an instance
+        stopped or terminated in less than INVENTORY_TTL) are picked up by the
+        next full describe, at most INVENTORY_FULL_REFRESH seconds later.
+        """
+        now, now_wall = time.monotonic(), time.time()
+        if previous is None or now - previous.full_refresh_at >= cls.INVENTORY_FULL_REFRESH:
+            return RegionInventory(cls._describe(credentials, region, cancelled=cancelled), now, now, now_wall)
+
+        live = {"Name": "instance-state-name", "Values": LIVE_INSTANCE_STATES}
+        changed = cls._describe(
+            credentials, region, [{"Name": "instance-state-name", "Values": TRANSITIONAL_STATES}], cancelled
+        )
+        launched = launch_time_prefixes(previous.refreshed_wall - cls.LAUNCH_TIME_MARGIN, now_wall)
+        changed.update(cls._describe(credentials, region, [live, {"Name": "launch-time", "Values": launched}], cancelled))
+
+        instances = dict(previous.instances)
+        settled = [
+            instance_id for instance_id, record in previous.instances.items()
+            if record["state"] in TRANSITIONAL_STATES and instance_id not in changed
+        ]
+        for start in range(0, len(settled), MAX_FILTER_VALUES):
+            chunk = settled[start:start + MAX_FILTER_VALUES]
+            found = cls._describe(credentials, region, [live, {"Name": "instance-id", "Values": chunk}], cancelled)
+            for instance_id in chunk:
+                if instance_id in found:
+                    instances[instance_id] = found[instance_id]
+                else:
+                    # Terminated
+                    instances.pop(instance_id, None)
+        instances.update(changed)
+        return RegionInventory(instances, previous.full_refresh_at, now, now_wall)
+
+    @classmethod
+    async def _run_in_region(
+        cls, fn: Callable[[AWSCredentials, str, threading.Event], T], credentials: AWSCredentials, region: str
+    ) -> Optional[T]:
+        """
+        Run a blocking region call with a timeout; failures are logged and
+        isolated to the region. fn is passed an event that is set when the call
+        is abandoned, so the worker can stop rather than keep the pool busy.
+        """
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+        with track_fetch("ec2", region) as fetch:
             try:
-                # Create a session with the provided credentials
-                session = boto3.Session(
-                    aws_access_key_id=credentials.access_key,
-                    aws_secret_access_key=credentials.secret_key,
-                    region_name=region
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(cls._get_executor(), fn, credentials, region, cancelled),
+                    timeout=cls.REGION_TIMEOUT,
                 )
-                
-                # Create EC2 client
-                ec2_client = session.client('ec2')
-                
-                # Get EC2 instances
-                response = ec2_client.describe_instances()
-                
-                instances = []
-                for reservation in response['Reservations']:
-                    for instance in reservation['Instances']:
-                        # Skip terminated instances
-                        if instance['State']['Name'] == 'terminated':
-                            continue
-                            
-                        platform = "Windows" if instance.get('Platform') == 'windows' else "Linux"
-                        
-                        instances.append(EC2Instance(
-                            instance_id=instance['InstanceId'],
-                            instance_type=instance['InstanceType'],
-                            region=region,
-                            state=instance['State']['Name'],
-                            private_ip=instance.get('PrivateIpAddress'),
-                            public_ip=instance.get('PublicIpAddress'),
-                            platform=platform
-                        ))
-                
-                result[region] = instances
-                logger.info(f"Retrieved {len(instances)} instances from region {region}")
-                
-            except ClientError as e:
-                logger.error(f"Error fetching instances from region {region}: {str(e)}")
-                # Continue to other regions even if one fails
-        
+            except asyncio.TimeoutError:
+                cancelled.set()
+                fetch["outcome"] = "timeout"
+                logger.error(f"Timed out fetching instances from region {region} after {cls.REGION_TIMEOUT}s")
+                return None
+            except Exception as e:
+                fetch["outcome"] = "error"
+                if is_aws_error(e):
+                    logger.error(f"Error fetching instances from region {region}: {str(e)}")
+                else:
+                    logger.exception(f"Unexpected error fetching instances from region {region}: {str(e)}")
+                return None
+
+        if sampled(logger):
+            logger.debug(f"Fetched instances from region {region}")
         return result
-    
-    @staticmethod
-    async def get_ec2_summary(credentials: AWSCredentials) -> List[EC2RegionSummary]:
+
+    @classmethod
+    async def _get_inventory(cls, credentials: AWSCredentials, region: str) -> Optional[RegionInventory]:
+        """A region's inventory for the credentials, refreshed if it is older than INVENTORY_TTL."""
+        key = (cls._scope(credentials), region)
+        inventory = cls._inventories.get(key)
+        if inventory is not None and time.monotonic() - inventory.refreshed_at < cls.INVENTORY_TTL:
+            CACHE_LOOKUPS.inc(cache="ec2_inventory", result="hit")
+            cls._inventories.move_to_end(key)
+            return inventory
+        CACHE_LOOKUPS.inc(cache="ec2_inventory", result="miss")
+
+        # Concurrent requests for the same credentials and region share one refresh
+        task = cls._refreshing.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(cls._refresh_inventory(key, credentials, region, inventory))
+            cls._refreshing[key] = task
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _refresh_inventory(
+        cls, key: InventoryKey, credentials: AWSCredentials, region: str, previous: Optional[RegionInventory]
+    ) -> Optional[RegionInventory]:
+        try:
+            inventory = await cls._run_in_region(
+                lambda credentials, region, cancelled: cls._refresh_region(credentials, region, previous, cancelled),
+                credentials,
+                region,
+            )
+        finally:
+            cls._refreshing.pop(key, None)
+        if inventory is not None:
+            cls._inventories[key] = inventory
+            cls._inventories.move_to_end(key)
+            while len(cls._inventories) > cls.MAX_INVENTORIES:
+                cls._inventories.popitem(last=False)
+        return inventory
+
+    @classmethod
+    async def _inventories_by_region(cls, credentials: AWSCredentials) -> Dict[str, RegionInventory]:
+        """Inventories of every requested region, fetched concurrently, skipping failed regions."""
+        regions = list(dict.fromkeys(credentials.regions))
+        inventories = await asyncio.gather(*(cls._get_inventory(credentials, region) for region in regions))
+        return {region: inventory for region, inventory in zip(regions, inventories) if inventory is not None}
+
+    @classmethod
+    async def get_ec2_instances(cls, credentials: AWSCredentials) -> Dict[str, List[EC2Instance]]:
         """
-        Get summary of EC2 instances by region and instance type
+        Get all EC2 instances from specified regions using provided credentials.
+
+        Regions are served from the inventory cache and refreshed concurrently
+        when stale; a region that fails or times out is left out of the result
+        instead of failing the whole request.
+        """
+        inventories = await cls._inventories_by_region(credentials)
+        return {
+            region: [EC2Instance.model_construct(**record) for record in inventory.instances.values()]
+            for region, inventory in inventories.items()
+        }
+
+    @classmethod
+    async def get_ec2_summary(cls, credentials: AWSCredentials) -> List[EC2RegionSummary]:
+        """Get summary of EC2 instances by region and instance type, counted from the inventory cache."""
+        inventories = await cls._inventories_by_region(credentials)
+        return [
+            EC2RegionSummary(region=region, instance_types=inventory.counts)
+            for region, inventory in inventories.items()
+        ]
+
+    @classmethod
+    async def get_billed_fleet(cls, credentials: AWSCredentials) -> Dict[str, Dict[Tuple[str, str], int]]:
+        """Billed instance counts by region and (platform, instance type), from the inventory cache."""
+        inventories = await cls._inventories_by_region(credentials)
+        return {region: inventory.billed_counts for region, inventory in inventories.items()}
+
+    @classmethod
+    async def stream_ec2_instances(cls, credentials: AWSCredentials) -> AsyncIterator[bytes]:
+        """
+        Stream instances as NDJSON while regions are being paginated.
+
+        Every instance is a line with the EC2Instance fields. Each region ends
+        with a {"region", "done", "count"} line, or {"region", "error"} if it
+        failed. Pages are handed over through a bounded queue, so at most a few
+        pages per region are held in memory however large the fleet is.
         """
-        instances_by_region = await AWSService.get_ec2_instances(credentials)
-        
-        result = []
-        for region, instances in instances_by_region.items():
-            instance_type_count = {}
-            
-            for instance in instances:
-                if instance.instance_type not in instance_type_count:
-                    instance_type_count[instance.instance_type] = 0
-                instance_type_count[instance.instance_type] += 1
-            
-            result.append(EC2RegionSummary(
-                region=region,
-                instance_types=instance_type_count
-            ))
-        
-        return result 
\ No newline at end of file
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=cls.STREAM_QUEUE_PAGES)
+        cancelled = threading.Event()
+        regions = list(dict.fromkeys(credentials.regions))
+
+        def put(chunk: Optional[bytes]) -> bool:
+            # Block the worker until the consumer catches up (or goes away)
+            future = asyncio.run_coroutine_threadsafe(queue.put(chunk), loop)
+            while True:
+                try:
+                    future.result(timeout=1)
+                    return True
+                except FutureTimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        return False
+
+        def produce(region: str) -> None:
+            count = 0
+            started = time.perf_counter()
+            try:
+                for page in cls._iter_instances(credentials, region, cancelled=cancelled):
+                    lines = [json.dumps(cls._instance_record(instance, region)) + "\n" for instance in page]
+                    count += len(lines)
+                    if not put("".join(lines).encode()):
+                        UPSTREAM_FETCH_DURATION.observe(
+                            time.perf_counter() - started, source="ec2", target=region, outcome="cancelled"
+                        )
+                        return
+                status = {"region": region, "done": True, "count": count}
+                outcome = "success"
+                if sampled(logger):
+                    logger.debug(f"Streamed {count} instances from region {region}")
+            except RegionCancelled:
+                UPSTREAM_FETCH_DURATION.observe(
+                    time.perf_counter() - started, source="ec2", target=region, outcome="cancelled"
+                )
+                return
+            except Exception as e:
+                logger.error(f"Error streaming instances from region {region}: {str(e)}")
+                status = {"region": region, "error": str(e)}
+                outcome = "error"
+            # Includes the time spent waiting on a slow consumer
+            UPSTREAM_FETCH_DURATION.observe(time.perf_counter() - started, source="ec2", target=region, outcome=outcome)
+            if put((json.dumps(status) + "\n").encode()):
+                put(None)
+
+        executor = cls._get_stream_executor()
+        for region in regions:
+            loop.run_in_executor(executor, produce, region)
+
+        try:
+            remaining = len(regions)
+            while remaining:
+                chunk = await queue.get()
+                if chunk is None:
+                    remaining -= 1
+                    continue
+                yield chunk
+        finally:
+            # Release workers still waiting on the queue if the client went away
+            cancelled.set()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.cache_service import dumps
+from app.services.data_plane import SharedDataFile, write_shared_file
+from app.services.metrics import DATA_LOAD_DURATION
+from app.services.pricing_service import PricingService, PricingShard, pricing_blob_name, read_pricing_blob
+from app.services.spot_service import SpotService, SpotSnapshot, build_snapshot, map_snapshot, snapshot_layout
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Bumped when the layout of a bundle changes incompatibly
+BUNDLE_FORMAT = 1
+
+PricingData = Dict[Tuple[str, str], Dict[str, str]]  # (region code, OS) -> instance type -> price
+
+
+def validate_prices(region_code: str, os: str, prices: Dict[str, str]) -> None:
+    if not prices:
+        raise ValueError(f"No prices for {region_code} ({os})")
+    for instance_type, price in prices.items():
+        try:
+            valid = float(price) >= 0
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError(f"Invalid price {price!r} for {instance_type} in {region_code} ({os})")
+    # Builds the rate models the API serves, so anything they reject fails the build
+    PricingShard(region_code, os, prices)
+
+
+def build_bundle(
+    path: Path,
+    spot_data: dict,
+    pricing: PricingData,
+    version: Optional[str] = None,
+    sources: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Validate normalized spot advisor data and pricing, and write them to path
+    as one bundle: the spot snapshot in the layout the data plane publishes,
+    plus a pre-encoded blob per pricing shard. Returns the bundle metadata.
+    """
+    if not pricing:
+        raise ValueError("A bundle needs pricing for at least one region")
+    snapshot = build_snapshot(spot_data, None)
+    for (region_code, os_name), prices in pricing.items():
+        validate_prices(region_code, os_name, prices)
+
+    created_at = datetime.now(timezone.utc)
+    arrays, blobs, meta = snapshot_layout(snapshot)
+    for (region_code, os_name), prices in sorted(pricing.items()):
+        blobs[pricing_blob_name(region_code, os_name)] = dumps(prices)
+    meta["bundle"] = {
+        "format": BUNDLE_FORMAT,
+        "version": version or created_at.strftime("%Y%m%d%H%M%S"),
+        "created_at": created_at.isoformat(),
+        "sources": sources or {},
+        "pricing": sorted(f"{region_code}/{os_name}" for region_code, os_name in pricing),
+        "instance_types": len(snapshot.data.instance_types),
+        "regions": len(snapshot.data.regions),
+    }
+    write_shared_file(path, arrays, blobs, meta)
+    return meta["bundle"]
+
+
+class DataBundle:
+    """
+    A bundle written by build_bundle, memory-mapped and verified against its
+    checksum. The spot snapshot and pricing blobs are views into the mapping.
+    """
+
+    def __init__(self, path: Path, verify: bool = True):
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        self._file = SharedDataFile(path)
+        info = self._file.meta.get("bundle")
+        if info is None:
+            raise ValueError(f"{path} is not a data bundle")
+        if info.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path} has bundle format {info.get('format')}, expected {BUNDLE_FORMAT}")
+        if verify:
+            self._file.verify()
+        self.info: Dict[str, Any] = info
+        self.pricing_keys: List[Tuple[str, str]] = [tuple(key.split("/", 1)) for key in info["pricing"]]
+
+    @property
+    def version(self) -> str:
+        return self.info["version"]
+
+    @property
+    def checksum(self) -> Optional[str]:
+        return self._file.checksum
+
+    def spot_snapshot(self) -> SpotSnapshot:
+        return map_snapshot(self._file, self.mtime)
+
+    def pricing(self, region_code: str, os: str) -> Optional[Dict[str, str]]:
+        return read_pricing_blob(self._file, region_code, os)
+
+
+class BundleService:
+    """
+    Serves the spot and pricing data from a prebuilt bundle (see
+    app/scripts/build_bundle.py) instead of fetching it at runtime.
+
+    When a bundle exists at PATH it is loaded at startup and the background
+    refreshes are not started. Replacing the file swaps in the new data: it is
+    checked every CHECK_INTERVAL seconds, and a new bundle that fails to load
+    leaves the current one in place. Every worker maps the same file, so no
+    leader election is needed.
+    """
+    PATH = Path(os.getenv("DATA_BUNDLE", str(DATA_DIR / "data.bundle")))
+    CHECK_INTERVAL = float(os.getenv("DATA_BUNDLE_CHECK_INTERVAL", "30"))
+
+    _bundle: Optional[DataBundle] = None
+    # mtime of a bundle that failed to load, so it is reported once rather than on every check
+    _rejected: Optional[float] = None
+    _watcher: Optional[asyncio.Task] = None
+
+    @classmethod
+    def active(cls) -> bool:
+        return cls._bundle is not None
+
+    @classmethod
+    def load(cls) -> bool:
+        """Load the bundle at PATH if there is one. Returns whether a bundle is in use."""
+        try:
+            mtime = cls.PATH.stat().st_mtime
+        except FileNotFoundError:
+            return cls.active()
+        if (cls._bundle is not None and cls._bundle.mtime == mtime) or cls._rejected == mtime:
+            return cls.active()
+
+        started = time.perf_counter()
+        try:
+            with DATA_LOAD_DURATION.time(dataset="bundle"):
+                bundle = DataBundle(cls.PATH)
+                SpotService.use_bundle(bundle)
+                PricingService.use_bundle(bundle)
+        except Exception as e:
+            cls._rejected = mtime
+            logger.error(f"Failed to load data bundle {cls.PATH}: {str(e)}")
+            return cls.active()
+
+        cls._bundle = bundle
+        logger.info(
+            f"Loaded data bundle {bundle.version} ({len(bundle.pricing_keys)} pricing shards) "
+            f"from {cls.PATH} in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return True
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._watcher is None or cls._watcher.done():
+            cls._watcher = asyncio.create_task(cls._watch())
+
+    @classmethod
+    async def _watch(cls) -> None:
+        while True:
+            await asyncio.sleep(cls.CHECK_INTERVAL)
+            await asyncio.to_thread(cls.load)
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._watcher is not None and not cls._watcher.done():
+            cls._watcher.cancel()
+            await asyncio.gather(cls._watcher, return_exceptions=True)
+        cls._watcher = None
+
+    @classmethod
+    def status(cls) -> Optional[Dict[str, Any]]:
+        bundle = cls._bundle
+        if bundle is None:
+            return None
+        return {
+            "version": bundle.version,
+            "created_at": bundle.info["created_at"],
+            "sha256": bundle.checksum,
+            "path": str(bundle.path),
+        }
@@ -1,14 +1,350 @@
 import json
+import mmap
+from abc import ABC, abstractmethod
 import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 import logging
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json module is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is only needed with CACHE_FORMAT=msgpack
+    msgpack = None
+
+try:
+    import redis
+except ImportError:  # redis is only needed with CACHE_REDIS_URL
+    redis = None
+
 logger = logging.getLogger(__name__)
 
+MSGPACK_SUFFIX = ".msgpack"
+
+
+def dumps(data: Any, format: str = "json") -> bytes:
+    """Serialize data as JSON (with orjson when installed) or msgpack."""
+    if format == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("CACHE_FORMAT=msgpack requires the msgpack package")
+        return msgpack.packb(data, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def loads(buffer: memoryview, format: str = "json") -> Any:
+    if format == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("Reading msgpack files requires the msgpack package")
+        return msgpack.unpackb(buffer, raw=False)
+    if orjson is not None:
+        return orjson.loads(buffer)
+    return json.loads(bytes(buffer))
+
+
+def read_file(path: Path) -> Any:
+    """
+    Load a JSON or msgpack (by suffix) file through a read-only memory map,
+    so it is parsed straight from the page cache without an extra copy.
+    """
+    format = "msgpack" if path.suffix == MSGPACK_SUFFIX else "json"
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as buffer:
+                return loads(buffer, format)
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """
+    Write a file so readers only ever see the old or the new contents: the data
+    goes to a temporary file in the same directory, is fsynced, then renamed
+    over the destination.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file private to the owner; keep the permissions a plain open() would give
+        try:
+            mode = path.stat().st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Persist the rename itself
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float  # Unix time the data was originally saved, carried across tiers
+    size: int = 0  # Encoded size in bytes, when known
+    encoded: Optional[bytes] = None  # The encoded data, when a tier read it as bytes anyway
+
+
+class CacheBackend(ABC):
+    """
+    One tier of the cache. Tiers only store and return entries; freshness,
+    and with it what counts as a hit, is decided by CacheService from each
+    entry's stored_at and the key's TTL.
+    """
+    name = "backend"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    def stored_at(self, key: str) -> Optional[float]:
+        """When the entry for key was stored, without loading it."""
+
+    @abstractmethod
+    def set(self, key: str, entry: CacheEntry, encoded: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    def accepts(self, size: int) -> bool:
+        """Whether an entry of this encoded size would be kept, so callers can skip encoding it."""
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class MemoryCache(CacheBackend):
+    """
+    Decoded entries in process memory, evicting the least recently used past
+    either bound. Entries larger than max_bytes on their own are not kept.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 2 ** 10):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def stored_at(self, key: str) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry.stored_at if entry else None
+
+    def accepts(self, size: int) -> bool:
+        # Large datasets are kept by their services in their own form
+        return size <= self.max_bytes
+
+    def set(self, key: str, entry: CacheEntry, encoded: bytes, ttl: float) -> None:
+        with self._lock:
+            self._remove(key)
+            if not self.accepts(entry.size):
+                return
+            # Only the decoded value is kept
+            entry = CacheEntry(value=entry.value, stored_at=entry.stored_at, size=entry.size)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "entries": len(self._entries), "bytes": self._bytes}
+
+
+class DiskCache(CacheBackend):
+    """Files in a local directory, written atomically; the file mtime is the entry's stored_at."""
+    name = "disk"
+
+    def __init__(self, directory: Path, format: str = "json"):
+        super().__init__()
+        self.directory = directory
+        self.format = format
+
+    def path(self, key: str) -> Path:
+        path = self.directory / key
+        if self.format == "msgpack":
+            path = path.with_suffix(MSGPACK_SUFFIX)
+        return path
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        path = self.path(key)
+        try:
+            stat = path.stat()
+            value = read_file(path)
+        except FileNotFoundError:
+            return None
+        return CacheEntry(value=value, stored_at=stat.st_mtime, size=stat.st_size)
+
+    def stored_at(self, key: str) -> Optional[float]:
+        try:
+            return self.path(key).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, entry: CacheEntry, encoded: bytes, ttl: float) -> None:
+        path = self.path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, encoded)
+        # Keep the original save time when the entry came from another tier
+        os.utime(path, (entry.stored_at, entry.stored_at))
+
+    def delete(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class RedisCache(CacheBackend):
+    """
+    A Redis-protocol server shared by several replicas.
+
+    Any client with redis-py's get/set(px=...)/delete methods works, so tests
+    can pass an in-process fake. Entries outlive their TTL by stale_grace so
+    replicas can keep serving stale data while one of them refreshes it.
+    """
+    name = "redis"
+
+    def __init__(self, client: Any, prefix: str = "spotwizard:", format: str = "json", stale_grace: float = 86400):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.format = format
+        self.stale_grace = stale_grace
+
+    def _keys(self, key: str):
+        return f"{self.prefix}{key}", f"{self.prefix}{key}:stored_at"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        data_key, meta_key = self._keys(key)
+        stored_at = self.client.get(meta_key)
+        data = self.client.get(data_key) if stored_at is not None else None
+        if data is None:
+            return None
+        return CacheEntry(
+            value=loads(memoryview(data), self.format), stored_at=float(stored_at), size=len(data), encoded=data
+        )
+
+    def stored_at(self, key: str) -> Optional[float]:
+        stored_at = self.client.get(self._keys(key)[1])
+        return float(stored_at) if stored_at is not None else None
+
+    def set(self, key: str, entry: CacheEntry, encoded: bytes, ttl: float) -> None:
+        data_key, meta_key = self._keys(key)
+        expires_ms = int((ttl + self.stale_grace) * 1000)
+        # Data first, so a reader that sees the new stored_at also finds the data
+        self.client.set(data_key, encoded, px=expires_ms)
+        self.client.set(meta_key, repr(entry.stored_at), px=expires_ms)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(*self._keys(key))
+
+
+def parse_ttls(value: str) -> Dict[str, timedelta]:
+    """Parse CACHE_TTLS, e.g. "spot_advisor_data.json=3600,other.json=600" (seconds)."""
+    ttls = {}
+    for item in value.split(","):
+        key, _, seconds = item.strip().partition("=")
+        if key and seconds:
+            ttls[key.strip()] = timedelta(seconds=float(seconds))
+    return ttls
+
+
 class CacheService:
+    """
+    Tiered cache for fetched datasets: a bounded in-memory LRU, the local disk
+    and, with CACHE_REDIS_URL set, a Redis server shared between replicas.
+
+    Reads return the most recently stored copy across the tiers and backfill
+    the faster tiers with it; writes go through to every tier.
+    """
     CACHE_DIR = Path("app/data")
-    CACHE_DURATION = timedelta(hours=24)
+    CACHE_DURATION = timedelta(hours=24)  # Default TTL for keys without their own
+    TTLS: Dict[str, timedelta] = parse_ttls(os.getenv("CACHE_TTLS", ""))
+    # "json" or "msgpack"; msgpack files are stored next to the JSON ones with a .msgpack suffix
+    CACHE_FORMAT = os.getenv("CACHE_FORMAT", "json")
+    MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "64"))
+    # Encoded size; the spot advisor data is larger and is kept by SpotService as its snapshot
+    MEMORY_MAX_BYTES = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(256 * 2 ** 10)))
+    REDIS_URL = os.getenv("CACHE_REDIS_URL")
+    REDIS_STALE_GRACE = float(os.getenv("CACHE_REDIS_STALE_GRACE", "86400"))
+
+    _tiers: Optional[List[CacheBackend]] = None
+
+    @classmethod
+    def configure(cls, tiers: List[CacheBackend]) -> None:
+        """Replace the cache tiers, fastest first."""
+        cls._tiers = tiers
+
+    @classmethod
+    def tiers(cls) -> List[CacheBackend]:
+        if cls._tiers is None:
+            tiers: List[CacheBackend] = [
+                MemoryCache(cls.MEMORY_MAX_ENTRIES, cls.MEMORY_MAX_BYTES),
+                DiskCache(cls.CACHE_DIR, cls.CACHE_FORMAT),
+            ]
+            if cls.REDIS_URL:
+                if redis is None:
+                    raise RuntimeError("CACHE_REDIS_URL requires the redis package")
+                tiers.append(RedisCache(redis.Redis.from_url(cls.REDIS_URL), format=cls.CACHE_FORMAT, stale_grace=cls.REDIS_STALE_GRACE))
+            cls._tiers = tiers
+        return cls._tiers
 
     @classmethod
     def ensure_cache_dir(cls):
@@ -16,34 +352,105 @@ class CacheService:
         cls.CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
     @classmethod
-    def get_cached_data(cls, filename: str) -> dict | None:
-        """Get cached data if it exists and is not expired."""
-        try:
-            file_path = cls.CACHE_DIR / filename
-            if not file_path.exists():
-                return None
-
-            # Check if file is older than 24 hours
-            file_age = datetime.now() - datetime.fromtimestamp(file_path.stat().st_mtime)
-            if file_age > cls.CACHE_DURATION:
-                logger.info(f"Cache expired for {filename}")
-                return None
-
-            with open(file_path, 'r') as f:
-                logger.info(f"Reading cached data from {filename}")
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error reading cache file {filename}: {e}")
+    def get_ttl(cls, filename: str) -> timedelta:
+        return cls.TTLS.get(filename, cls.CACHE_DURATION)
+
+    @classmethod
+    def set_ttl(cls, filename: str, ttl: timedelta) -> None:
+        cls.TTLS[filename] = ttl
+
+    @classmethod
+    def get_cache_mtime(cls, filename: str) -> float | None:
+        """When the newest copy of a cache entry was stored, or None if there is none."""
+        newest = None
+        for tier in cls.tiers():
+            try:
+                stored_at = tier.stored_at(filename)
+            except Exception as e:
+                logger.error(f"Error checking {tier.name} cache for {filename}: {e}")
+                continue
+            if stored_at is not None and (newest is None or stored_at > newest):
+                newest = stored_at
+        return newest
+
+    @classmethod
+    def get_cache_age(cls, filename: str) -> timedelta | None:
+        """Get the age of a cache entry, or None if it doesn't exist."""
+        mtime = cls.get_cache_mtime(filename)
+        if mtime is None:
+            return None
+        return datetime.now() - datetime.fromtimestamp(mtime)
+
+    @classmethod
+    def is_expired(cls, filename: str) -> bool:
+        age = cls.get_cache_age(filename)
+        return age is None or age > cls.get_ttl(filename)
+
+    @classmethod
+    def get_cached_data(cls, filename: str, allow_stale: bool = False) -> dict | None:
+        """Get cached data if it exists and is not expired (or regardless of age with allow_stale)."""
+        newest = cls.get_cache_mtime(filename)
+        if newest is None:
             return None
 
+        # Check if the entry is older than its TTL
+        if not allow_stale and time.time() - newest > cls.get_ttl(filename).total_seconds():
+            logger.info(f"Cache expired for {filename}")
+            return None
+
+        missed = []
+        for tier in cls.tiers():
+            try:
+                entry = tier.get(filename)
+            except Exception as e:
+                logger.error(f"Error reading {tier.name} cache for {filename}: {e}")
+                entry = None
+            # A faster tier may still hold a copy older than another replica's
+            if entry is None or entry.stored_at < newest:
+                tier.misses += 1
+                missed.append(tier)
+                continue
+            tier.hits += 1
+
+            logger.info(f"Reading cached data for {filename} from the {tier.name} cache")
+            # Backfill the tiers that missed so the next read is served closer,
+            # except those that wouldn't keep an entry this large anyway
+            backfill = [missed_tier for missed_tier in missed if missed_tier.accepts(entry.size)]
+            if backfill:
+                # Bytes a tier returned in the format every tier is written in are reused as is
+                encoded = entry.encoded if getattr(tier, "format", None) == cls.CACHE_FORMAT else None
+                if encoded is None:
+                    try:
+                        encoded = dumps(entry.value, cls.CACHE_FORMAT)
+                    except Exception as e:
+                        logger.error(f"Error serializing cache entry {filename}: {e}")
+                        return entry.value
+                entry.size = len(encoded)
+                cls._write(filename, entry, encoded, backfill)
+            return entry.value
+        return None
+
+    @classmethod
+    def _write(cls, filename: str, entry: CacheEntry, encoded: bytes, tiers: List[CacheBackend]) -> None:
+        ttl = cls.get_ttl(filename).total_seconds()
+        for tier in tiers:
+            try:
+                tier.set(filename, entry, encoded, ttl)
+            except Exception as e:
+                logger.error(f"Error filling {tier.name} cache for {filename}: {e}")
+
     @classmethod
     def save_cached_data(cls, filename: str, data: dict) -> None:
-        """Save data to cache file."""
+        """Save data to every cache tier."""
         try:
-            cls.ensure_cache_dir()
-            file_path = cls.CACHE_DIR / filename
-            with open(file_path, 'w') as f:
-                logger.info(f"Saving data to cache file {filename}")
-                json.dump(data, f)
+            encoded = dumps(data, cls.CACHE_FORMAT)
         except Exception as e:
-            logger.error(f"Error saving cache file {filename}: {e}") 
\ No newline at end of file
+            logger.error(f"Error serializing cache entry {filename}: {e}")
+            return
+        logger.info(f"Saving data to cache entry {filename}")
+        cls._write(filename, CacheEntry(value=data, stored_at=time.time(), size=len(encoded)), encoded, cls.tiers())
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Hit, miss and eviction counters per tier."""
+        return {tier.name: tier.stats() for tier in cls.tiers()}
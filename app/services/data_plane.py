@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from app.services.cache_service import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where the data plane can't be enabled
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+MAGIC = b"SPOTDP01"
+HEADER = struct.Struct("<8sQ")  # magic, length of the JSON directory that follows
+ALIGNMENT = 64
+
+
+def write_shared_file(path: Path, arrays: Dict[str, np.ndarray], blobs: Dict[str, bytes], meta: Dict[str, Any]) -> None:
+    """
+    Write arrays and byte blobs into one file laid out for memory mapping: a
+    JSON directory of offsets followed by the aligned raw data. The directory
+    records the SHA-256 of the data so readers can verify it.
+    """
+    entries: Dict[str, Dict[str, Any]] = {"arrays": {}, "blobs": {}}
+    chunks = []
+    offset = 0
+
+    def add(data: bytes) -> int:
+        nonlocal offset
+        padding = -offset % ALIGNMENT
+        chunks.append(b"\0" * padding)
+        offset += padding
+        start = offset
+        chunks.append(data)
+        offset += len(data)
+        return start
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        entries["arrays"][name] = {"offset": add(array.tobytes()), "dtype": array.dtype.str, "shape": list(array.shape)}
+    for name, blob in blobs.items():
+        entries["blobs"][name] = {"offset": add(blob), "length": len(blob)}
+
+    data = b"".join(chunks)
+    entries["sha256"] = hashlib.sha256(data).hexdigest()
+    directory = json.dumps({"meta": meta, **entries}).encode()
+    data_start = HEADER.size + len(directory)
+    data_start += -data_start % ALIGNMENT
+    header = HEADER.pack(MAGIC, len(directory)) + directory
+    atomic_write(path, header + b"\0" * (data_start - len(header)) + data)
+
+
+class SharedDataFile:
+    """
+    Read-only view of a file written by write_shared_file.
+
+    Arrays and blobs are views into the mapping, so every worker mapping the
+    same file shares one copy in the page cache. A replaced file stays mapped
+    until the last view of it is dropped.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared data file")
+        directory = json.loads(self._mmap[HEADER.size:HEADER.size + length])
+        self.meta: Dict[str, Any] = directory["meta"]
+        self._arrays = directory["arrays"]
+        self._blobs = directory["blobs"]
+        self.checksum: Optional[str] = directory.get("sha256")
+        start = HEADER.size + length
+        self._base = start + (-start % ALIGNMENT)
+
+    def verify(self) -> None:
+        """Raise ValueError if the data doesn't match the checksum it was written with."""
+        if self.checksum is None:
+            raise ValueError("Shared data file has no checksum")
+        with memoryview(self._mmap) as view:
+            actual = hashlib.sha256(view[self._base:]).hexdigest()
+        if actual != self.checksum:
+            raise ValueError(f"Checksum mismatch: expected {self.checksum}, got {actual}")
+
+    def array(self, name: str) -> np.ndarray:
+        entry = self._arrays[name]
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=self._base + entry["offset"])
+        return array.reshape(entry["shape"])
+
+    def blob(self, name: str) -> memoryview:
+        entry = self._blobs[name]
+        start = self._base + entry["offset"]
+        return memoryview(self._mmap)[start:start + entry["length"]]
+
+
+class DataPlane:
+    """
+    Shares refreshed data between uvicorn workers.
+
+    When enabled, the worker holding an exclusive lock on LOCK_FILE is the
+    leader: it runs the background refreshes and publishes the datasets to
+    shared files. The other workers never fetch from AWS; they map what the
+    leader published and keep trying the lock so one of them takes over if
+    the leader exits.
+    """
+    ENABLED = os.getenv("SHARED_DATA_PLANE", "").lower() in ("1", "true", "yes")
+    LOCK_FILE = Path(os.getenv("DATA_PLANE_LOCK_FILE", str(DATA_DIR / ".data_plane.lock")))
+    SPOT_FILE = DATA_DIR / "spot_table.bin"
+    PRICING_FILE = DATA_DIR / "pricing_table.bin"
+    WATCH_INTERVAL = float(os.getenv("DATA_PLANE_WATCH_INTERVAL", "5"))
+    # How long a follower without any data waits for the leader before fetching itself
+    FOLLOWER_WAIT = float(os.getenv("DATA_PLANE_FOLLOWER_WAIT", "60"))
+
+    _lock_fd: Optional[int] = None
+    _watcher: Optional[asyncio.Task] = None
+    _watched: Dict[Path, Optional[float]] = {}
+    _callbacks: Dict[Path, Callable[[], Any]] = {}
+
+    @classmethod
+    def is_leader(cls) -> bool:
+        """Whether this worker refreshes data; always true when the data plane is disabled."""
+        return not cls.ENABLED or cls._lock_fd is not None
+
+    @classmethod
+    def is_follower(cls) -> bool:
+        return cls.ENABLED and cls._lock_fd is None
+
+    @classmethod
+    def try_acquire(cls) -> bool:
+        if cls._lock_fd is not None:
+            return True
+        if fcntl is None:
+            raise RuntimeError("The shared data plane requires fcntl")
+        cls.LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(cls.LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        cls._lock_fd = fd
+        logger.info(f"Worker {os.getpid()} is the data plane leader")
+        return True
+
+    @classmethod
+    def watch(cls, path: Path, on_change: Callable[[], Any]) -> None:
+        """Call on_change in followers whenever the leader rewrites path."""
+        cls._watched[path] = cls._mtime(path)
+        cls._callbacks[path] = on_change
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[float]:
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def start(cls, on_elected: Callable[[], Any]) -> None:
+        """Run on_elected now if this worker becomes leader, otherwise follow until it does."""
+        if cls.try_acquire():
+            on_elected()
+            return
+        logger.info(f"Worker {os.getpid()} is following the data plane leader")
+        if cls._watcher is None or cls._watcher.done():
+            cls._watcher = asyncio.create_task(cls._follow(on_elected))
+
+    @classmethod
+    async def _follow(cls, on_elected: Callable[[], Any]) -> None:
+        while True:
+            await asyncio.sleep(cls.WATCH_INTERVAL)
+            for path, seen in list(cls._watched.items()):
+                mtime = cls._mtime(path)
+                if mtime != seen:
+                    cls._watched[path] = mtime
+                    try:
+                        cls._callbacks[path]()
+                    except Exception as e:
+                        logger.error(f"Error picking up published {path.name}: {str(e)}")
+            if cls.try_acquire():
+                on_elected()
+                return
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._watcher is not None and not cls._watcher.done():
+            cls._watcher.cancel()
+            await asyncio.gather(cls._watcher, return_exceptions=True)
+        cls._watcher = None
+        if cls._lock_fd is not None:
+            # Closing the descriptor releases the lock for the next leader
+            os.close(cls._lock_fd)
+            cls._lock_fd = None
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        return {"enabled": cls.ENABLED, "leader": cls.is_leader(), "pid": os.getpid()}
@@ -0,0 +1,240 @@
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.models.history import HistorySnapshot, PriceHistoryPoint, SpotHistoryPoint, TrendResponse
+from app.models.spot import SpotTable
+from app.services.cache_service import read_file
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str, str]  # region, OS, instance type
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    changes INTEGER NOT NULL
+);
+
+-- Every value is stored once when it first appears and again only when it
+-- changes; NULL values mark an instance type that was dropped.
+CREATE TABLE IF NOT EXISTS spot_history (
+    region TEXT NOT NULL,
+    os TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    s INTEGER,
+    r INTEGER,
+    PRIMARY KEY (region, os, instance_type, recorded_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_history (
+    region TEXT NOT NULL,
+    os TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    price TEXT,
+    PRIMARY KEY (region, os, instance_type, recorded_at)
+) WITHOUT ROWID;
+
+-- The latest values, so a refresh is diffed without scanning the history
+CREATE TABLE IF NOT EXISTS spot_current (
+    region TEXT NOT NULL,
+    os TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    s INTEGER NOT NULL,
+    r INTEGER NOT NULL,
+    PRIMARY KEY (region, os, instance_type)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_current (
+    region TEXT NOT NULL,
+    os TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    price TEXT NOT NULL,
+    PRIMARY KEY (region, os, instance_type)
+) WITHOUT ROWID;
+"""
+
+# dataset -> (history table, current table, value columns)
+DATASETS = {
+    "spot": ("spot_history", "spot_current", ("s", "r")),
+    "pricing": ("price_history", "price_current", ("price",)),
+}
+
+
+def spot_values(table: SpotTable) -> Dict[Key, tuple]:
+    """(region, OS, instance type) -> (savings, rating) for every cell with spot data."""
+    values = {}
+    for os_id, os_name in enumerate(table.OPERATING_SYSTEMS):
+        region_ids, type_ids = np.nonzero(table.s[:, os_id, :] != table.MISSING)
+        scores = table.s[region_ids, os_id, type_ids].tolist()
+        ratings = table.r[region_ids, os_id, type_ids].tolist()
+        for region_id, type_id, score, rating in zip(region_ids.tolist(), type_ids.tolist(), scores, ratings):
+            values[(table.regions[region_id], os_name, table.instance_types[type_id])] = (score, rating)
+    return values
+
+
+def pricing_values(data_dir: Path) -> Tuple[Dict[Key, tuple], Set[Tuple[str, str]]]:
+    """Prices from the pricing shards on disk, and the (region, OS) pairs they cover."""
+    values = {}
+    covered = set()
+    for path in sorted(data_dir.glob("*/*.json")):
+        try:
+            shard = read_file(path)
+        except Exception as e:
+            logger.error(f"Skipping unreadable pricing shard {path}: {str(e)}")
+            continue
+        region, os_name = shard.get("region", path.parent.name), shard.get("os", path.stem)
+        covered.add((region, os_name))
+        for instance_type, price in shard.get("prices", {}).items():
+            values[(region, os_name, instance_type)] = (price,)
+    return values, covered
+
+
+class HistoryService:
+    """
+    Records every spot and pricing refresh in a local SQLite database.
+
+    Only values that changed since the previous refresh are written, so the
+    database grows with the amount of change rather than the number of
+    refreshes, and trend queries are range scans of the primary key.
+    """
+    DB_PATH = Path(os.getenv("HISTORY_DB_PATH", str(Path(__file__).parent.parent / "data" / "history.sqlite3")))
+
+    _initialized: Optional[Path] = None
+
+    @classmethod
+    def connect(cls) -> sqlite3.Connection:
+        cls.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(cls.DB_PATH, timeout=30)
+        if cls._initialized != cls.DB_PATH:
+            # WAL lets trend queries read while a refresh is being recorded
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            cls._initialized = cls.DB_PATH
+        return conn
+
+    @classmethod
+    def record(
+        cls,
+        dataset: str,
+        values: Dict[Key, tuple],
+        scope: Optional[Set[Tuple[str, str]]] = None,
+        recorded_at: Optional[float] = None,
+    ) -> int:
+        """
+        Record a refreshed dataset, writing only what changed. Instance types
+        missing from values are recorded as dropped, limited to the (region, OS)
+        pairs in scope when given. Returns the number of changes written.
+        """
+        history_table, current_table, columns = DATASETS[dataset]
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        column_list = ", ".join(columns)
+        placeholders = ", ".join("?" * (3 + len(columns)))
+
+        conn = cls.connect()
+        try:
+            with conn:
+                previous = {
+                    tuple(row[:3]): tuple(row[3:])
+                    for row in conn.execute(f"SELECT region, os, instance_type, {column_list} FROM {current_table}")
+                }
+                changed = [key + value for key, value in values.items() if previous.get(key) != value]
+                dropped = [
+                    key for key in previous.keys() - values.keys()
+                    if scope is None or key[:2] in scope
+                ]
+
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {history_table} (region, os, instance_type, recorded_at, {column_list}) "
+                    f"VALUES (?, {placeholders})",
+                    [row[:3] + (recorded_at,) + row[3:] for row in changed]
+                    + [key + (recorded_at,) + (None,) * len(columns) for key in dropped],
+                )
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {current_table} (region, os, instance_type, {column_list}) VALUES ({placeholders})",
+                    changed,
+                )
+                conn.executemany(
+                    f"DELETE FROM {current_table} WHERE region = ? AND os = ? AND instance_type = ?",
+                    dropped,
+                )
+                conn.execute(
+                    "INSERT INTO snapshots (dataset, recorded_at, changes) VALUES (?, ?, ?)",
+                    (dataset, recorded_at, len(changed) + len(dropped)),
+                )
+        finally:
+            conn.close()
+
+        logger.info(f"Recorded {dataset} snapshot with {len(changed)} changed and {len(dropped)} dropped values")
+        return len(changed) + len(dropped)
+
+    @classmethod
+    def record_spot(cls, table: SpotTable) -> int:
+        return cls.record("spot", spot_values(table))
+
+    @classmethod
+    def record_pricing(cls, data_dir: Path) -> int:
+        # Shards that failed to download keep their history rather than being recorded as dropped
+        values, covered = pricing_values(data_dir)
+        return cls.record("pricing", values, scope=covered)
+
+    @classmethod
+    def _series(
+        cls, conn: sqlite3.Connection, dataset: str, key: Key, start: float, end: float
+    ) -> Iterable[tuple]:
+        history_table, _, columns = DATASETS[dataset]
+        select = f"SELECT recorded_at, {', '.join(columns)} FROM {history_table} WHERE region = ? AND os = ? AND instance_type = ?"
+        # The value in effect when the window starts, then the changes within it
+        before = conn.execute(f"{select} AND recorded_at < ? ORDER BY recorded_at DESC LIMIT 1", (*key, start)).fetchall()
+        within = conn.execute(f"{select} AND recorded_at BETWEEN ? AND ? ORDER BY recorded_at", (*key, start, end)).fetchall()
+        return before + within
+
+    @classmethod
+    def get_trend(cls, region: str, os: str, instance_type: str, start: datetime, end: datetime) -> TrendResponse:
+        key = (region, os, instance_type)
+        conn = cls.connect()
+        try:
+            spot = cls._series(conn, "spot", key, start.timestamp(), end.timestamp())
+            pricing = cls._series(conn, "pricing", key, start.timestamp(), end.timestamp())
+        finally:
+            conn.close()
+
+        def when(recorded_at: float) -> datetime:
+            return datetime.fromtimestamp(recorded_at, tz=timezone.utc)
+
+        return TrendResponse(
+            region=region,
+            os=os,
+            instance_type=instance_type,
+            start=start,
+            end=end,
+            spot=[
+                SpotHistoryPoint(recorded_at=when(recorded_at), savings=s, interruption_rating=r)
+                for recorded_at, s, r in spot
+            ],
+            pricing=[PriceHistoryPoint(recorded_at=when(recorded_at), price=price) for recorded_at, price in pricing],
+        )
+
+    @classmethod
+    def snapshots(cls, limit: int = 100) -> List[HistorySnapshot]:
+        conn = cls.connect()
+        try:
+            rows = conn.execute(
+                "SELECT dataset, recorded_at, changes FROM snapshots ORDER BY recorded_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            HistorySnapshot(dataset=dataset, recorded_at=datetime.fromtimestamp(recorded_at, tz=timezone.utc), changes=changes)
+            for dataset, recorded_at, changes in rows
+        ]
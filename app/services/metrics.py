@@ -0,0 +1,232 @@
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fraction of hot-path events (requests, cache lookups) logged at DEBUG level
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Upper bounds in seconds, from sub-millisecond cache hits to slow upstream downloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]  # metric name with suffix, labels, value
+
+
+def sampled(log: logging.Logger, level: int = logging.DEBUG) -> bool:
+    """
+    Whether to log a hot-path event. Checked before the message is built, so
+    a disabled level costs one comparison and nothing is formatted.
+    """
+    return log.isEnabledFor(level) and (LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE)
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A named metric with a fixed set of label names, safe to update from worker threads."""
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}_total", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (the last one is +Inf), sum, count
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+# A collector returns (name, type, help, samples) families computed when metrics are scraped
+Collector = Callable[[], Iterable[Tuple[str, str, str, Iterable[Sample]]]]
+
+
+class MetricsService:
+    """
+    Process-wide metrics in the Prometheus text exposition format.
+
+    Metrics are kept per process: with several uvicorn workers each scrape
+    reports the worker that served it, identified by the pid label of
+    spotwizard_process_info.
+
+    Only counters and histograms are needed, so this stays a small registry
+    rather than a prometheus_client dependency; its multiprocess mode would
+    also need a shared PROMETHEUS_MULTIPROC_DIR that the data plane and
+    bundle deployments don't have.
+    """
+    _metrics: Dict[str, Metric] = {}
+    _collectors: List[Collector] = []
+
+    @classmethod
+    def register(cls, metric: Metric) -> Metric:
+        existing = cls._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        cls._metrics[metric.name] = metric
+        return metric
+
+    @classmethod
+    def counter(cls, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return cls.register(Counter(name, help, labelnames))
+
+    @classmethod
+    def histogram(
+        cls, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return cls.register(Histogram(name, help, labelnames, buckets))
+
+    @classmethod
+    def add_collector(cls, collector: Collector) -> None:
+        if collector not in cls._collectors:
+            cls._collectors.append(collector)
+
+    @classmethod
+    def render(cls) -> str:
+        families = [(metric.name, metric.type, metric.help, metric.samples()) for metric in cls._metrics.values()]
+        families.append(("spotwizard_process_info", "gauge", "Worker serving this scrape", [
+            ("spotwizard_process_info", {"pid": str(os.getpid())}, 1),
+        ]))
+        for collector in cls._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {str(e)}")
+
+        lines = []
+        for name, type, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = MetricsService.histogram(
+    "spotwizard_http_request_duration_seconds",
+    "Time to serve an API request, by route template and status code",
+    ("method", "route", "status"),
+)
+DATA_LOAD_DURATION = MetricsService.histogram(
+    "spotwizard_data_load_duration_seconds",
+    "Time to load and parse a dataset into memory",
+    ("dataset",),
+)
+UPSTREAM_FETCH_DURATION = MetricsService.histogram(
+    "spotwizard_upstream_fetch_duration_seconds",
+    "Duration of fetches from AWS by source and outcome",
+    ("source", "target", "outcome"),
+)
+CACHE_LOOKUPS = MetricsService.counter(
+    "spotwizard_cache_lookups",
+    "In-process cache lookups by cache and result (hit or miss)",
+    ("cache", "result"),
+)
+
+
+@contextmanager
+def track_fetch(source: str, target: str = "") -> Iterator[Dict[str, str]]:
+    """
+    Time an upstream fetch. The outcome is "success" unless the block raises
+    ("error") or sets outcome["outcome"] itself, e.g. to "not_modified".
+    """
+    outcome = {"outcome": "success"}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except BaseException:
+        outcome["outcome"] = "error"
+        raise
+    finally:
+        UPSTREAM_FETCH_DURATION.observe(time.perf_counter() - started, source=source, target=target, outcome=outcome["outcome"])
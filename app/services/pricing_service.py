@@ -0,0 +1,405 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import ijson
+
+from app.models.pricing import EC2PricingRate, PricingBatchResponse, PricingResponse
+from app.services.cache_service import atomic_write, dumps, loads, read_file
+from app.services.data_plane import DataPlane, SharedDataFile, write_shared_file
+from app.services.metrics import CACHE_LOOKUPS, DATA_LOAD_DURATION
+from app.services.response_cache import PrecompressedBody
+
+logger = logging.getLogger(__name__)
+
+# Map region codes to the location names used in the AWS pricing files
+REGION_NAMES = {
+    'us-east-1': 'US East (N. Virginia)',
+    'us-east-2': 'US East (Ohio)',
+    'us-west-1': 'US West (N. California)',
+    'us-west-2': 'US West (Oregon)',
+    'ap-south-1': 'Asia Pacific (Mumbai)',
+    'ap-south-2': 'Asia Pacific (Hyderabad)',
+    'ap-northeast-2': 'Asia Pacific (Seoul)',
+    'ap-northeast-3': 'Asia Pacific (Osaka)',
+    'ap-southeast-1': 'Asia Pacific (Singapore)',
+    'ap-southeast-2': 'Asia Pacific (Sydney)',
+    'ap-southeast-3': 'Asia Pacific (Jakarta)',
+    'ap-southeast-4': 'Asia Pacific (Melbourne)',
+    'ap-southeast-7': 'Asia Pacific (Jakarta)',
+    'ap-east-1': 'Asia Pacific (Hong Kong)',
+    'ap-northeast-1': 'Asia Pacific (Tokyo)',
+    'ca-central-1': 'Canada (Central)',
+    'ca-west-1': 'Canada (West)',
+    'eu-central-1': 'EU (Frankfurt)',
+    'eu-central-2': 'EU (Zurich)',
+    'eu-west-1': 'EU (Ireland)',
+    'eu-west-2': 'EU (London)',
+    'eu-west-3': 'EU (Paris)',
+    'eu-north-1': 'EU (Stockholm)',
+    'eu-south-1': 'EU (Milan)',
+    'eu-south-2': 'EU (Spain)',
+    'sa-east-1': 'South America (Sao Paulo)',
+    'af-south-1': 'Africa (Cape Town)',
+    'me-central-1': 'Middle East (UAE)',
+    'me-south-1': 'Middle East (Bahrain)',
+    'il-central-1': 'Israel (Tel Aviv)',
+    'mx-central-1': 'Mexico (Central)'
+}
+
+
+# Reverse lookup so location names are accepted wherever region codes are
+REGION_CODES: Dict[str, str] = {}
+for _code, _location in REGION_NAMES.items():
+    REGION_CODES.setdefault(_location, _code)
+
+
+def shard_path(data_dir: Path, region_code: str, os: str) -> Path:
+    """Location of the normalized pricing shard for a region and OS."""
+    return data_dir / region_code / f"{os}.json"
+
+
+class MeteredUnitMapParser:
+    """
+    Incremental parser for raw meteredUnitMap payloads.
+
+    Bytes are fed as they arrive and only the instance type and price of every
+    entry under "regions" are kept, so memory does not grow with the payload.
+    """
+
+    # Nesting of an entry: root -> "regions" -> location -> entry
+    ENTRY_DEPTH = 4
+
+    def __init__(self):
+        self.prices: Dict[str, str] = {}
+        self._events = ijson.sendable_list()
+        self._coro = ijson.basic_parse_coro(self._events)
+        self._depth = 0
+        self._in_regions = False
+        self._key: Optional[str] = None
+        self._instance_type: Optional[str] = None
+        self._price: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> None:
+        self._coro.send(chunk)
+        self._consume()
+
+    def close(self) -> Dict[str, str]:
+        self._coro.close()
+        self._consume()
+        return self.prices
+
+    def _consume(self) -> None:
+        for event, value in self._events:
+            if event in ('start_map', 'start_array'):
+                self._depth += 1
+            elif event in ('end_map', 'end_array'):
+                if self._depth == self.ENTRY_DEPTH and self._in_regions:
+                    if self._instance_type and self._price is not None:
+                        self.prices[self._instance_type] = self._price
+                    self._instance_type = self._price = None
+                self._depth -= 1
+            elif event == 'map_key':
+                if self._depth == 1:
+                    self._in_regions = value == 'regions'
+                self._key = value
+            elif self._depth == self.ENTRY_DEPTH and self._in_regions:
+                if self._key == 'Instance Type':
+                    self._instance_type = value
+                elif self._key == 'price':
+                    self._price = str(value)
+        del self._events[:]
+
+
+def parse_pricing_file(path: Path, chunk_size: int = 64 * 1024) -> Dict[str, str]:
+    """Stream a raw meteredUnitMap file from disk into instance type -> hourly price."""
+    parser = MeteredUnitMapParser()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            parser.feed(chunk)
+    return parser.close()
+
+
+def write_shard(data_dir: Path, region_code: str, os: str, prices: Dict[str, str]) -> Path:
+    """Write a normalized pricing shard."""
+    path = shard_path(data_dir, region_code, os)
+    # Atomic so a worker loading the shard never sees a partial write
+    atomic_write(path, dumps({"region": region_code, "os": os, "prices": prices}))
+    return path
+
+
+def pricing_blob_name(region_code: str, os: str) -> str:
+    return f"pricing/{region_code}/{os}"
+
+
+def read_pricing_blob(shared: SharedDataFile, region_code: str, os: str) -> Optional[Dict[str, str]]:
+    """The prices of one shard stored in a shared data file, None if it has none."""
+    try:
+        blob = shared.blob(pricing_blob_name(region_code, os))
+    except KeyError:
+        return None
+    return loads(blob)
+
+
+def publish_pricing(data_dir: Path, path: Path) -> int:
+    """
+    Write the normalized prices of every shard in data_dir to one shared data
+    file for other workers, a blob per shard. Returns the number of shards.
+    """
+    blobs = {}
+    keys = []
+    for shard_file in sorted(data_dir.glob("*/*.json")):
+        region_code, os = shard_file.parent.name, shard_file.stem
+        if not PricingService.is_known(region_code, os):
+            continue
+        blobs[pricing_blob_name(region_code, os)] = dumps(read_file(shard_file).get("prices", {}))
+        keys.append(f"{region_code}/{os}")
+    write_shared_file(path, {}, blobs, {"pricing": keys})
+    return len(keys)
+
+
+class SharedPricing:
+    """The pricing shards published by the data plane leader, memory-mapped."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime = path.stat().st_mtime
+        self._file = SharedDataFile(path)
+        self.pricing_keys: List[Tuple[str, str]] = [tuple(key.split("/", 1)) for key in self._file.meta["pricing"]]
+
+    def pricing(self, region_code: str, os: str) -> Optional[Dict[str, str]]:
+        return read_pricing_blob(self._file, region_code, os)
+
+
+class PricingShard:
+    """On-demand rates for one region and OS, with its /api/pricing body pre-serialized."""
+
+    def __init__(self, region_code: str, os: str, prices: Dict[str, str], mtime: float = 0.0):
+        self.region_code = region_code
+        self.os = os
+        self.mtime = mtime
+        self.rates: Dict[str, EC2PricingRate] = {
+            instance_type: EC2PricingRate(
+                price=price,
+                unit="Hrs",
+                description=f"On-demand price for {instance_type}"
+            )
+            for instance_type, price in prices.items()
+        }
+        self._responses: Dict[str, PrecompressedBody] = {}
+
+    def response(self, region: str) -> PrecompressedBody:
+        """The response body keyed by the region name the caller asked for."""
+        body = self._responses.get(region)
+        if body is None:
+            body = PrecompressedBody(PricingResponse(regions={region: self.rates}).model_dump_json().encode())
+            self._responses[region] = body
+        return body
+
+
+class PricingService:
+    DATA_DIR = Path(__file__).parent.parent / "data" / "pricing"
+    OPERATING_SYSTEMS = ("Linux", "Windows")
+    MAX_CACHED_BATCHES = 64
+
+    # Shards are loaded the first time their region is requested
+    _shards: Dict[Tuple[str, str], PricingShard] = {}
+    # Batch response bodies per distinct query, dropped on refresh
+    _batches: "OrderedDict[tuple, PrecompressedBody]" = OrderedDict()
+    # Bumped on every refresh so data derived from the shards can be rebuilt
+    generation = 0
+    # Set when pricing is served from a prebuilt bundle (see BundleService) or,
+    # in data plane followers, from the SharedPricing the leader published,
+    # instead of DATA_DIR
+    _bundle = None
+
+    @staticmethod
+    def resolve_region(region: str) -> str:
+        """Accept both region codes and pricing location names."""
+        return REGION_CODES.get(region, region)
+
+    @classmethod
+    def is_known(cls, region: str, os: Optional[str] = None) -> bool:
+        """Whether a region (code or location name) and OS are ones pricing can exist for."""
+        return cls.resolve_region(region) in REGION_NAMES and (os is None or os in cls.OPERATING_SYSTEMS)
+
+    @classmethod
+    def has_data(cls) -> bool:
+        if cls._bundle is not None:
+            return bool(cls._bundle.pricing_keys)
+        return cls.DATA_DIR.exists() and any(cls.DATA_DIR.iterdir())
+
+    @classmethod
+    def use_bundle(cls, bundle) -> None:
+        """
+        Serve the pricing shards of a loaded DataBundle or SharedPricing until
+        another one replaces it, or those in DATA_DIR again if bundle is None.
+        """
+        cls._bundle = bundle
+        cls._shards = {}
+        cls.generation += 1
+        cls._batches = OrderedDict()
+
+    @classmethod
+    async def publish(cls) -> None:
+        """Publish the shards in DATA_DIR to the other workers if this one is the data plane leader."""
+        if not (DataPlane.ENABLED and DataPlane.is_leader()):
+            return
+        try:
+            count = await asyncio.to_thread(publish_pricing, cls.DATA_DIR, DataPlane.PRICING_FILE)
+            logger.info(f"Published {count} pricing shards to other workers")
+        except Exception as e:
+            logger.error(f"Failed to publish pricing data to other workers: {str(e)}")
+
+    @classmethod
+    def follow(cls) -> None:
+        """Data plane follower: serve the pricing the leader last published, if it published any."""
+        try:
+            with DATA_LOAD_DURATION.time(dataset="pricing_shared"):
+                shared = SharedPricing(DataPlane.PRICING_FILE)
+        except FileNotFoundError:
+            return
+        cls.use_bundle(shared)
+        logger.info(f"Mapped {len(shared.pricing_keys)} pricing shards published by the data plane leader")
+
+    @classmethod
+    def lead(cls) -> None:
+        """Data plane leader: serve the shards in DATA_DIR again and publish them."""
+        if isinstance(cls._bundle, SharedPricing):
+            cls.use_bundle(None)
+        task = asyncio.create_task(cls.publish())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    @classmethod
+    def get_shard(cls, region: str, os: str) -> Optional[PricingShard]:
+        """Get the shard for a region and OS, loading it from disk on first use."""
+        # Both end up in the shard's path, so anything unknown is rejected before touching the disk
+        if not cls.is_known(region, os):
+            return None
+        key = (cls.resolve_region(region), os)
+        shard = cls._shards.get(key)
+        if shard is not None:
+            CACHE_LOOKUPS.inc(cache="pricing_shard", result="hit")
+            return shard
+
+        CACHE_LOOKUPS.inc(cache="pricing_shard", result="miss")
+        if cls._bundle is not None:
+            return cls._load_bundle_shard(key)
+
+        path = shard_path(cls.DATA_DIR, *key)
+        try:
+            with DATA_LOAD_DURATION.time(dataset="pricing_shard"):
+                mtime = path.stat().st_mtime
+                data = read_file(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.exception(f"Error loading pricing shard {path}: {str(e)}")
+            return None
+
+        shard = PricingShard(key[0], os, data.get("prices", {}), mtime)
+        # Copy-on-write so readers never see a partially updated mapping
+        cls._shards = {**cls._shards, key: shard}
+        logger.info(f"Loaded pricing shard for {key[0]} ({os}) with {len(shard.rates)} instance types")
+        return shard
+
+    @classmethod
+    def _load_bundle_shard(cls, key: Tuple[str, str]) -> Optional[PricingShard]:
+        bundle = cls._bundle
+        with DATA_LOAD_DURATION.time(dataset="pricing_shard"):
+            prices = bundle.pricing(*key)
+        if prices is None:
+            return None
+        shard = PricingShard(key[0], key[1], prices, bundle.mtime)
+        cls._shards = {**cls._shards, key: shard}
+        return shard
+
+    @classmethod
+    def refresh(cls) -> int:
+        """Drop loaded shards whose files changed on disk; they reload on next use."""
+        stale = []
+        for key, shard in cls._shards.items():
+            try:
+                if shard_path(cls.DATA_DIR, *key).stat().st_mtime != shard.mtime:
+                    stale.append(key)
+            except FileNotFoundError:
+                stale.append(key)
+        if stale:
+            cls._shards = {key: shard for key, shard in cls._shards.items() if key not in stale}
+            logger.info(f"Invalidated {len(stale)} changed pricing shards")
+        # Shards that were missing before may exist now, so derived data is rebuilt either way
+        cls.generation += 1
+        cls._batches = OrderedDict()
+        return len(stale)
+
+    @classmethod
+    def loaded_shards(cls) -> int:
+        return len(cls._shards)
+
+    @classmethod
+    def get_region_pricing(cls, region: str, os: str) -> Optional[Dict[str, EC2PricingRate]]:
+        """Get the on-demand rates for a region (code or location name) and OS."""
+        shard = cls.get_shard(region, os)
+        return shard.rates if shard else None
+
+    @classmethod
+    def get_pricing_response(cls, region: str, os: str) -> Optional[PrecompressedBody]:
+        """Get the precompressed /api/pricing body for a region and OS."""
+        shard = cls.get_shard(region, os)
+        return shard.response(region) if shard else None
+
+    @classmethod
+    async def get_batch_response(
+        cls,
+        regions: List[str],
+        os: Optional[List[str]] = None,
+        instance_types: Optional[List[str]] = None,
+    ) -> PrecompressedBody:
+        """
+        Get the on-demand rates for several regions and OSes as one body,
+        optionally only for some instance types. Bodies are cached per query
+        until the next refresh; regions, OSes and instance types are listed in
+        sorted order, so the same query in any order shares one body.
+        """
+        key = (
+            tuple(sorted(set(regions))),
+            tuple(sorted(set(os or cls.OPERATING_SYSTEMS))),
+            tuple(sorted(set(instance_types))) if instance_types else None,
+        )
+        body = cls._batches.get(key)
+        if body is not None:
+            CACHE_LOOKUPS.inc(cache="pricing_batch", result="hit")
+            cls._batches.move_to_end(key)
+            return body
+
+        CACHE_LOOKUPS.inc(cache="pricing_batch", result="miss")
+        generation = cls.generation
+        # Loading shards, serializing and compressing take long enough to stall other requests
+        body = await asyncio.to_thread(cls._build_batch, key)
+        # A refresh while building would leave a stale body in the new cache
+        if cls.generation == generation:
+            cls._batches[key] = body
+            if len(cls._batches) > cls.MAX_CACHED_BATCHES:
+                cls._batches.popitem(last=False)
+        return body
+
+    @classmethod
+    def _build_batch(cls, key: Tuple[Tuple[str, ...], Tuple[str, ...], Optional[Tuple[str, ...]]]) -> PrecompressedBody:
+        regions, oses, instance_types = key
+        pricing: Dict[str, Dict[str, Dict[str, EC2PricingRate]]] = {}
+        unavailable: Dict[str, List[str]] = {}
+        for region in regions:
+            for os_name in oses:
+                rates = cls.get_region_pricing(region, os_name)
+                if rates is None:
+                    unavailable.setdefault(region, []).append(os_name)
+                    continue
+                if instance_types:
+                    rates = {instance_type: rates[instance_type] for instance_type in instance_types if instance_type in rates}
+                pricing.setdefault(region, {})[os_name] = rates
+
+        # The rates are already validated, so skip validating them again
+        response = PricingBatchResponse.model_construct(regions=pricing, unavailable=unavailable)
+        return PrecompressedBody(response.model_dump_json().encode())
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.recommendation import InstanceAlternative, RecommendationResponse
+from app.models.spot import SpotTable
+from app.services.analysis_service import AnalysisMatrix, AnalysisService
+from app.services.spot_service import SpotService
+
+logger = logging.getLogger(__name__)
+
+
+def spec_features(cores: np.ndarray, ram_gb: np.ndarray, emr: np.ndarray, emr_weight: float) -> np.ndarray:
+    """Feature vectors compared by the index: log2 cores and memory, so a size step costs the same in every family."""
+    return np.column_stack([
+        np.log2(np.maximum(cores, 0.25)),
+        np.log2(np.maximum(ram_gb, 0.25)),
+        emr.astype(float) * emr_weight,
+    ])
+
+
+def nearest(
+    query: np.ndarray, features: np.ndarray, k: int, self_ids: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The k nearest feature rows to each query row, nearest first, skipping the query's own row in self_ids."""
+    distances = np.sqrt(((query[:, None, :] - features[None, :, :]) ** 2).sum(axis=2))
+    if self_ids is not None:
+        distances[np.arange(len(query)), self_ids] = np.inf
+    k = min(k, features.shape[0] - (self_ids is not None))
+    if k <= 0:
+        return np.zeros((len(query), 0), dtype=int), np.zeros((len(query), 0))
+    # Stable so that equal specs are always listed in ID order
+    ids = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return ids, np.take_along_axis(distances, ids, axis=1)
+
+
+class RecommendationIndex:
+    """
+    Precomputed nearest neighbours of every described instance type by spec.
+
+    Lookups start with a type's neighbour list and only scan every instance
+    type when too few of its neighbours have spot data in the region. When the
+    spot data is refreshed the previous index is reused: only the neighbour
+    lists of types whose spec changed, or whose neighbours were removed or
+    changed, are recomputed, and the remaining lists are merged with the
+    changed types.
+    """
+
+    NEIGHBOURS = 32
+    EMR_WEIGHT = 0.5
+
+    def __init__(self, table: SpotTable, previous: Optional["RecommendationIndex"] = None):
+        n = table.n_described
+        self.instance_types: List[str] = table.instance_types[:n]
+        self.type_ids = {instance_type: i for i, instance_type in enumerate(self.instance_types)}
+        self.cores = table.cores
+        self.ram_gb = table.ram_gb
+        self.emr = table.emr
+        self.labels = {item.index: item.label for item in table.ranges}
+        self.features = spec_features(table.cores, table.ram_gb, table.emr, self.EMR_WEIGHT)
+        self.recomputed = 0
+
+        if previous is None:
+            self.neighbours, self.distances = self._compute(np.arange(n))
+        else:
+            self.neighbours, self.distances = self._update(previous)
+
+    def _compute(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        self.recomputed += len(ids)
+        return nearest(self.features[ids], self.features, self.NEIGHBOURS, ids)
+
+    def _update(self, previous: "RecommendationIndex") -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self.instance_types)
+        if n == 0:
+            return np.zeros((0, 0), dtype=int), np.zeros((0, 0))
+        k = min(self.NEIGHBOURS, n - 1)
+
+        # Map the previous index's type IDs to this one, -1 where a type is gone or its spec changed
+        old_to_new = np.full(len(previous.instance_types), -1, dtype=int)
+        unchanged = np.zeros(n, dtype=bool)
+        for old_id, instance_type in enumerate(previous.instance_types):
+            new_id = self.type_ids.get(instance_type)
+            if new_id is not None and np.array_equal(previous.features[old_id], self.features[new_id]):
+                old_to_new[old_id] = new_id
+                unchanged[new_id] = True
+        new_to_old = np.full(n, -1, dtype=int)
+        new_to_old[old_to_new[old_to_new >= 0]] = np.nonzero(old_to_new >= 0)[0]
+
+        neighbours = np.zeros((n, k), dtype=int)
+        distances = np.zeros((n, k))
+        kept = np.nonzero(unchanged)[0]
+        if previous.neighbours.shape[1] == k and len(kept):
+            carried = old_to_new[previous.neighbours[new_to_old[kept]]]
+            # A list that lost an entry may now be missing a neighbour beyond its old cut-off
+            intact = (carried >= 0).all(axis=1)
+            kept, carried = kept[intact], carried[intact]
+        else:
+            kept = kept[:0]
+
+        changed = np.nonzero(~unchanged)[0]
+        if len(kept):
+            carried_distances = previous.distances[new_to_old[kept]]
+            if len(changed):
+                # Merge the changed types into the carried lists
+                extra_ids, extra_distances = nearest(self.features[kept], self.features[changed], k)
+                extra_ids = changed[extra_ids]
+                merged_ids = np.concatenate([carried, extra_ids], axis=1)
+                merged_distances = np.concatenate([carried_distances, extra_distances], axis=1)
+                order = np.lexsort((merged_ids, merged_distances), axis=1)[:, :k]
+                carried = np.take_along_axis(merged_ids, order, axis=1)
+                carried_distances = np.take_along_axis(merged_distances, order, axis=1)
+            neighbours[kept] = carried
+            distances[kept] = carried_distances
+
+        stale = np.setdiff1d(np.arange(n), kept)
+        if len(stale):
+            neighbours[stale], distances[stale] = self._compute(stale)
+        return neighbours, distances
+
+    def alternative(self, matrix: AnalysisMatrix, type_id: int, region: str, os: str, distance: float) -> InstanceAlternative:
+        instance_type = self.instance_types[type_id]
+        alternative = InstanceAlternative(
+            instance_type=instance_type,
+            cores=int(self.cores[type_id]),
+            ram_gb=float(self.ram_gb[type_id]),
+            emr=bool(self.emr[type_id]),
+            distance=round(float(distance), 4),
+        )
+        row = matrix.row.get(region)
+        column = matrix.column.get(instance_type)
+        if row is None or column is None:
+            return alternative
+
+        price = matrix.price[os][row, column]
+        savings = matrix.savings[os][row, column]
+        risk = matrix.risk[os][row, column]
+        if not np.isnan(price):
+            alternative.on_demand = float(price)
+        if not np.isnan(savings):
+            alternative.savings = int(savings)
+            alternative.interruption_rating = int(risk)
+            alternative.interruption = self.labels.get(int(risk))
+            if alternative.on_demand is not None:
+                alternative.spot = alternative.on_demand * (1 - savings / 100)
+        return alternative
+
+    def candidates(self, type_id: int) -> Iterator[Tuple[int, float]]:
+        """Other instance types nearest first: the neighbour list, then the rest from a full scan."""
+        neighbours = self.neighbours[type_id].tolist()
+        yield from zip(neighbours, self.distances[type_id].tolist())
+        seen = set(neighbours)
+        ids, distances = nearest(self.features[[type_id]], self.features, len(self.instance_types), np.array([type_id]))
+        for neighbour, distance in zip(ids[0].tolist(), distances[0].tolist()):
+            if neighbour not in seen:
+                yield neighbour, distance
+
+    def recommend(
+        self,
+        matrix: AnalysisMatrix,
+        instance_type: str,
+        region: str,
+        os: str = "Linux",
+        k: int = 5,
+        lower_risk: bool = True,
+    ) -> RecommendationResponse:
+        """
+        The k nearest instance types with spot data in the region.
+
+        With lower_risk only alternatives with a lower interruption rating than
+        the requested type are returned (when it has one in the region).
+        """
+        type_id = self.type_ids.get(instance_type)
+        if type_id is None:
+            raise LookupError(f"Unknown instance type: {instance_type}")
+        if region not in matrix.row:
+            raise LookupError(f"No spot data for region: {region}")
+
+        requested = self.alternative(matrix, type_id, region, os, 0.0)
+        alternatives = []
+        if lower_risk and requested.interruption_rating == 0:
+            # Nothing has a lower rating, don't scan every instance type looking for it
+            return RecommendationResponse(region=region, os=os, requested=requested, alternatives=alternatives)
+        for neighbour, distance in self.candidates(type_id):
+            alternative = self.alternative(matrix, neighbour, region, os, distance)
+            if alternative.interruption_rating is None:
+                continue
+            if (
+                lower_risk
+                and requested.interruption_rating is not None
+                and alternative.interruption_rating >= requested.interruption_rating
+            ):
+                continue
+            alternatives.append(alternative)
+            if len(alternatives) == k:
+                break
+
+        return RecommendationResponse(region=region, os=os, requested=requested, alternatives=alternatives)
+
+
+class RecommendationService:
+    MAX_RESULTS = RecommendationIndex.NEIGHBOURS
+
+    _index: Optional[RecommendationIndex] = None
+    _index_key: Optional[int] = None
+
+    @classmethod
+    async def get_index(cls) -> RecommendationIndex:
+        """The index for the current spot data, updated from the previous one when it changes."""
+        snapshot = await SpotService.get_snapshot()
+        if cls._index is None or cls._index_key != id(snapshot):
+            cls._index = await asyncio.to_thread(RecommendationIndex, snapshot.data, cls._index)
+            cls._index_key = id(snapshot)
+            logger.info(
+                f"Built recommendation index for {len(cls._index.instance_types)} instance types "
+                f"({cls._index.recomputed} neighbour lists recomputed)"
+            )
+        return cls._index
+
+    @classmethod
+    async def recommend(
+        cls,
+        instance_type: str,
+        region: str,
+        os: str = "Linux",
+        k: int = 5,
+        lower_risk: bool = True,
+    ) -> RecommendationResponse:
+        # The analysis matrix carries the per-region savings, risk and prices and
+        # is rebuilt whenever the spot or pricing data is refreshed
+        index = await cls.get_index()
+        matrix = await AnalysisService.get_matrix()
+        return index.recommend(matrix, instance_type, region, os, min(k, cls.MAX_RESULTS), lower_risk)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefreshJob:
+    """A dataset that is refreshed in the background."""
+    name: str
+    refresh: Callable[[], Awaitable[Any]]
+    # Seconds since the data was last refreshed, None if missing. Run in a
+    # thread, as it may have to ask a cache tier such as Redis
+    age: Callable[[], Optional[float]]
+    max_age: float
+    last_attempt: Optional[datetime] = None
+    last_success: Optional[datetime] = None
+    last_outcome: Optional[str] = None
+    last_error: Optional[str] = None
+    last_duration: Optional[float] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    async def is_due(self) -> bool:
+        age = await asyncio.to_thread(self.age)
+        return age is None or age >= self.max_age
+
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def status(self) -> Dict[str, Any]:
+        age = await asyncio.to_thread(self.age)
+        return {
+            "age_seconds": round(age, 1) if age is not None else None,
+            "max_age_seconds": self.max_age,
+            "refreshing": self.is_running(),
+            "last_attempt": self.last_attempt.isoformat() if self.last_attempt else None,
+            "last_success": self.last_success.isoformat() if self.last_success else None,
+            "last_outcome": self.last_outcome,
+            "last_error": self.last_error,
+            "last_duration_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+        }
+
+
+class RefreshService:
+    """
+    Refreshes registered datasets on a schedule without blocking requests.
+
+    Readers keep serving the last good data while a refresh runs, and concurrent
+    refreshes of the same dataset share a single in-flight task.
+    """
+    CHECK_INTERVAL = float(os.getenv("DATA_REFRESH_CHECK_INTERVAL", "900"))
+
+    _jobs: Dict[str, RefreshJob] = {}
+    _scheduler: Optional[asyncio.Task] = None
+
+    @classmethod
+    def register(
+        cls,
+        name: str,
+        refresh: Callable[[], Awaitable[Any]],
+        age: Callable[[], Optional[float]],
+        max_age: float,
+    ) -> None:
+        cls._jobs[name] = RefreshJob(name=name, refresh=refresh, age=age, max_age=max_age)
+
+    @classmethod
+    def trigger(cls, name: str) -> asyncio.Task:
+        """Start a refresh unless one is already running and return its task."""
+        job = cls._jobs[name]
+        if not job.is_running():
+            job.task = asyncio.create_task(cls._run_job(job))
+            # Failures are recorded on the job, don't let them surface as unhandled
+            job.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return job.task
+
+    @classmethod
+    async def refresh(cls, name: str) -> Any:
+        """Refresh a dataset (joining an in-flight refresh) and wait for the result."""
+        return await asyncio.shield(cls.trigger(name))
+
+    @classmethod
+    async def _run_job(cls, job: RefreshJob) -> Any:
+        job.last_attempt = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        logger.info(f"Refreshing {job.name} data")
+        try:
+            result = await job.refresh()
+        except Exception as e:
+            job.last_outcome = "error"
+            job.last_error = str(e)
+            logger.error(f"Refresh of {job.name} data failed: {str(e)}")
+            raise
+        finally:
+            job.last_duration = time.perf_counter() - started
+        job.last_success = datetime.now(timezone.utc)
+        job.last_outcome = "ok"
+        job.last_error = None
+        logger.info(f"Refreshed {job.name} data in {job.last_duration:.2f}s")
+        return result
+
+    @classmethod
+    async def _schedule(cls) -> None:
+        while True:
+            for job in cls._jobs.values():
+                if not job.is_running() and await job.is_due():
+                    cls.trigger(job.name)
+            await asyncio.sleep(cls.CHECK_INTERVAL)
+
+    @classmethod
+    def start(cls) -> None:
+        """Start the background scheduler; due datasets are refreshed right away."""
+        if cls._scheduler is None or cls._scheduler.done():
+            cls._scheduler = asyncio.create_task(cls._schedule())
+            logger.info(f"Background data refresh started (check interval {cls.CHECK_INTERVAL}s)")
+
+    @classmethod
+    async def stop(cls) -> None:
+        tasks = [cls._scheduler] + [job.task for job in cls._jobs.values()]
+        for task in tasks:
+            if task is not None and not task.done():
+                task.cancel()
+        await asyncio.gather(*(task for task in tasks if task is not None), return_exceptions=True)
+        cls._scheduler = None
+
+    @classmethod
+    async def status(cls) -> Dict[str, Dict[str, Any]]:
+        statuses = await asyncio.gather(*(job.status() for job in cls._jobs.values()))
+        return dict(zip(cls._jobs, statuses))
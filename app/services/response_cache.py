@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into encoding -> q-value."""
+    encodings: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+class PrecompressedBody:
+    """
+    A response body compressed once up front, with a strong ETag.
+
+    Built whenever the underlying data changes so serving it is only header
+    negotiation: a 304 for a matching If-None-Match, otherwise the best
+    pre-encoded variant the client accepts.
+    """
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str = "application/json",
+        brotli_quality: int = 9,
+        gzip_level: int = 6,
+    ):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.encoded: Dict[str, bytes] = {"gzip": gzip.compress(body, compresslevel=gzip_level)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(body, quality=brotli_quality)
+
+    @classmethod
+    def from_encoded(cls, body: bytes, encoded: Dict[str, bytes], etag: str, media_type: str = "application/json") -> "PrecompressedBody":
+        """Rebuild a body from previously encoded variants, e.g. views into a shared file."""
+        instance = cls.__new__(cls)
+        instance.body = body
+        instance.media_type = media_type
+        instance.etag = etag
+        instance.encoded = encoded
+        return instance
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """The strong ETag of a variant; each content-coding needs its own (RFC 9110, 8.8.3)."""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """The best pre-encoded variant the client accepts, None for the identity body."""
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0)
+        for encoding in ("br", "gzip"):
+            if accepted.get(encoding, wildcard) > 0 and encoding in self.encoded:
+                return encoding
+        return None
+
+    @staticmethod
+    def _matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as required for If-None-Match
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+    def respond(self, request: Request) -> Response:
+        encoding = self.negotiate(request.headers.get("accept-encoding"))
+        headers = {"ETag": self.etag_for(encoding), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+        if self._matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            return Response(content=bytes(self.encoded[encoding]), media_type=self.media_type, headers=headers)
+        return Response(content=bytes(self.body), media_type=self.media_type, headers=headers)
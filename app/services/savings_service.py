@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.analysis import FleetSavingsItem, FleetSavingsJob, FleetSavingsResult, RegionFleetSavings
+from app.services.analysis_service import OPERATING_SYSTEMS, AnalysisMatrix, AnalysisService
+from app.services.aws_service import AWSCredentials, AWSService
+from app.services.cache_service import atomic_write, dumps, read_file
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+HOURS_PER_MONTH = 730
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+Fleet = Dict[str, Dict[Tuple[str, str], int]]  # region -> (OS, instance type) -> instance count
+
+
+def project_fleet_savings(matrix: AnalysisMatrix, fleet: Fleet, failed_regions: Iterable[str] = ()) -> FleetSavingsResult:
+    """
+    Monthly on-demand and projected spot cost, savings and interruption risk of
+    a fleet, per region and instance type, looked up in the analysis matrix.
+    """
+    regions = []
+    unpriced: Dict[str, None] = {}
+    for region, counts in fleet.items():
+        row = matrix.row.get(region)
+        items: List[FleetSavingsItem] = []
+        instances = 0
+        risk_sum = 0.0
+        covered = 0
+        for os_name in OPERATING_SYSTEMS:
+            group = [(instance_type, count) for (platform, instance_type), count in counts.items() if platform == os_name]
+            if not group:
+                continue
+            qty = np.array([count for _, count in group], dtype=float)
+            price = np.full(len(group), np.nan)
+            savings = np.full(len(group), np.nan)
+            risk = np.full(len(group), np.nan)
+            if row is not None:
+                columns = np.array([matrix.column.get(instance_type, -1) for instance_type, _ in group], dtype=int)
+                known = columns >= 0
+                price[known] = matrix.price[os_name][row, columns[known]]
+                savings[known] = matrix.savings[os_name][row, columns[known]]
+                risk[known] = matrix.risk[os_name][row, columns[known]]
+
+            on_demand = price * qty * HOURS_PER_MONTH
+            has_spot = ~np.isnan(savings)
+            spot = np.where(has_spot, on_demand * (1 - np.nan_to_num(savings) / 100), on_demand)
+            instances += int(qty.sum())
+            risk_sum += float((np.nan_to_num(risk) * qty)[has_spot].sum())
+            covered += int(qty[has_spot].sum())
+
+            # Plain floats from here, numpy scalars are slow to handle one by one
+            rows = zip(group, on_demand.tolist(), spot.tolist(), savings.tolist(), risk.tolist())
+            for (instance_type, count), item_on_demand, item_spot, percent, rating in rows:
+                if math.isnan(item_on_demand):
+                    unpriced[instance_type] = None
+                    item_on_demand = item_spot = None
+                rating = None if math.isnan(rating) else int(rating)
+                items.append(FleetSavingsItem(
+                    instance_type=instance_type,
+                    os=os_name,
+                    count=count,
+                    on_demand=item_on_demand,
+                    spot=item_spot,
+                    savings=0.0 if item_on_demand is None else item_on_demand - item_spot,
+                    savings_percent=None if math.isnan(percent) else int(percent),
+                    interruption_rating=rating,
+                    interruption_label=matrix.interruption_labels.get(rating) if rating is not None else None,
+                ))
+
+        items.sort(key=lambda item: (-item.savings, item.instance_type, item.os))
+        on_demand_total = sum(item.on_demand for item in items if item.on_demand is not None)
+        spot_total = sum(item.spot for item in items if item.spot is not None)
+        regions.append(RegionFleetSavings(
+            region=region,
+            instances=instances,
+            on_demand=on_demand_total,
+            spot=spot_total,
+            savings=on_demand_total - spot_total,
+            risk_score=risk_sum / covered if covered else None,
+            spot_coverage=covered / instances if instances else 0.0,
+            items=items,
+        ))
+
+    regions.sort(key=lambda region: (-region.savings, region.region))
+    on_demand_total = sum(region.on_demand for region in regions)
+    spot_total = sum(region.spot for region in regions)
+    return FleetSavingsResult(
+        regions=regions,
+        instances=sum(region.instances for region in regions),
+        on_demand=on_demand_total,
+        spot=spot_total,
+        savings=on_demand_total - spot_total,
+        failed_regions=list(failed_regions),
+        unpriced_instance_types=sorted(unpriced),
+        hours_per_month=HOURS_PER_MONTH,
+    )
+
+
+class FleetSavingsService:
+    """
+    Background jobs projecting the savings of moving an account's running
+    instances to spot.
+
+    A job fetches the fleet through the EC2 inventory cache and joins it with
+    the analysis matrix off the event loop; callers poll it by ID. Submitting
+    the same credentials and regions while a job runs returns that job. Job
+    states are also written to JOB_DIR so any worker can answer a poll, and
+    are kept for JOB_TTL seconds after they finish; expired jobs are dropped
+    in the background as jobs are submitted and polled, at most every
+    EXPIRE_INTERVAL seconds.
+    """
+    JOB_DIR = Path(os.getenv("FLEET_SAVINGS_JOB_DIR", str(DATA_DIR / "jobs")))
+    JOB_TTL = float(os.getenv("FLEET_SAVINGS_JOB_TTL", "3600"))
+    JOB_TIMEOUT = float(os.getenv("FLEET_SAVINGS_JOB_TIMEOUT", "300"))
+    EXPIRE_INTERVAL = 60
+
+    _jobs: Dict[str, FleetSavingsJob] = {}
+    _tasks: Dict[str, asyncio.Task] = {}
+    _running: Dict[Tuple[str, Tuple[str, ...]], str] = {}  # (credential scope, regions) -> job ID
+    _expired_at: Optional[float] = None  # time.monotonic() of the last expiry
+    _expiry: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def submit(cls, credentials: AWSCredentials) -> FleetSavingsJob:
+        """Start a projection for the credentials' regions, or join the one already running."""
+        key = (AWSService._scope(credentials), tuple(sorted(set(credentials.regions))))
+        job_id = cls._running.get(key)
+        if job_id is not None and job_id in cls._jobs:
+            return cls._jobs[job_id]
+
+        cls._schedule_expiry()
+        job = FleetSavingsJob(job_id=uuid.uuid4().hex, status="pending", created_at=datetime.now(timezone.utc))
+        cls._jobs[job.job_id] = job
+        cls._running[key] = job.job_id
+        await asyncio.to_thread(cls._save, job)
+        task = asyncio.create_task(cls._run(job, credentials, key))
+        cls._tasks[job.job_id] = task
+        task.add_done_callback(lambda t: cls._tasks.pop(job.job_id, None))
+        return job
+
+    @classmethod
+    async def get(cls, job_id: str) -> Optional[FleetSavingsJob]:
+        """A job started by this or another worker, None if it is unknown or expired."""
+        cls._schedule_expiry()
+        job = cls._jobs.get(job_id)
+        if job is not None:
+            return job
+        # IDs are hex UUIDs; anything else can't name a job file
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            return FleetSavingsJob.model_validate(await asyncio.to_thread(read_file, cls._path(job_id)))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Failed to read fleet savings job {job_id}: {str(e)}")
+            return None
+
+    @classmethod
+    async def _run(cls, job: FleetSavingsJob, credentials: AWSCredentials, key: Tuple[str, Tuple[str, ...]]) -> None:
+        started = time.perf_counter()
+        job.status = "running"
+        await asyncio.to_thread(cls._save, job)
+        try:
+            job.result = await asyncio.wait_for(cls.project(credentials), timeout=cls.JOB_TIMEOUT)
+            job.status = "done"
+            logger.info(
+                f"Projected fleet savings of {job.result.instances} instances in "
+                f"{len(job.result.regions)} regions in {time.perf_counter() - started:.2f}s"
+            )
+        except asyncio.TimeoutError:
+            job.status = "failed"
+            job.error = f"Timed out after {cls.JOB_TIMEOUT}s"
+            logger.error(f"Fleet savings job {job.job_id} timed out after {cls.JOB_TIMEOUT}s")
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.exception(f"Fleet savings job {job.job_id} failed: {str(e)}")
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            cls._running.pop(key, None)
+            await asyncio.to_thread(cls._save, job)
+
+    @classmethod
+    async def project(cls, credentials: AWSCredentials) -> FleetSavingsResult:
+        fleet, matrix = await asyncio.gather(AWSService.get_billed_fleet(credentials), AnalysisService.get_matrix())
+        failed = [region for region in dict.fromkeys(credentials.regions) if region not in fleet]
+        return await asyncio.to_thread(project_fleet_savings, matrix, fleet, failed)
+
+    @classmethod
+    def _path(cls, job_id: str) -> Path:
+        return cls.JOB_DIR / f"{job_id}.json"
+
+    @classmethod
+    def _save(cls, job: FleetSavingsJob) -> None:
+        try:
+            atomic_write(cls._path(job.job_id), dumps(job.model_dump(mode="json")))
+        except Exception as e:
+            logger.error(f"Failed to save fleet savings job {job.job_id}: {str(e)}")
+
+    @classmethod
+    def _schedule_expiry(cls) -> None:
+        """Expire old jobs unless that was done less than EXPIRE_INTERVAL seconds ago."""
+        now = time.monotonic()
+        if cls._expired_at is not None and now - cls._expired_at < cls.EXPIRE_INTERVAL:
+            return
+        cls._expired_at = now
+        finished = datetime.now(timezone.utc)
+        for job_id, job in list(cls._jobs.items()):
+            if job.finished_at is not None and (finished - job.finished_at).total_seconds() > cls.JOB_TTL:
+                del cls._jobs[job_id]
+        # Listing and deleting job files blocks, so it runs in the background
+        if cls._expiry is None or cls._expiry.done():
+            cls._expiry = asyncio.create_task(asyncio.to_thread(cls._expire_files))
+            cls._expiry.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    @classmethod
+    def _expire_files(cls) -> None:
+        """Delete the job files of every worker that are older than any job still kept."""
+        cutoff = time.time() - cls.JOB_TTL - cls.JOB_TIMEOUT
+        try:
+            paths = list(cls.JOB_DIR.glob("*.json"))
+        except OSError:
+            return
+        for path in paths:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    async def stop(cls) -> None:
+        tasks = list(cls._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if cls._expiry is not None:
+            # The file sweep runs in a thread, which can only be waited for
+            tasks.append(cls._expiry)
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,401 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.spot import Range, SpotTable
+from app.services.cache_service import CacheService
+from app.services.data_plane import DataPlane, SharedDataFile, write_shared_file
+from app.services.history_service import HistoryService
+from app.services.metrics import CACHE_LOOKUPS, DATA_LOAD_DURATION, track_fetch
+from app.services.refresh_service import RefreshService
+from app.services.response_cache import PrecompressedBody
+
+logger = logging.getLogger(__name__)
+
+SPOT_ADVISOR_URL = "https://spot-bid-advisor.s3.amazonaws.com/spot-advisor-data.json"
+
+
+class SpotDataUnavailable(Exception):
+    """The spot advisor feed couldn't be downloaded."""
+
+
+def instance_family(instance_type: str) -> str:
+    """The family of an instance type, e.g. m5 for m5.2xlarge."""
+    return instance_type.split(".", 1)[0]
+
+
+class SpotIndex:
+    """Lookup structures used to slice spot data without scanning it."""
+
+    def __init__(self, table: SpotTable):
+        families: Dict[str, List[int]] = {}
+        for type_id, instance_type in enumerate(table.instance_types):
+            families.setdefault(instance_family(instance_type), []).append(type_id)
+        self.families = {family: np.array(ids) for family, ids in families.items()}
+        self.n_types = len(table.instance_types)
+
+        # Described instance types sorted by size so minimum filters are a binary search
+        self.by_cores = np.argsort(table.cores, kind="stable")
+        self.cores = table.cores[self.by_cores]
+        self.by_ram = np.argsort(table.ram_gb, kind="stable")
+        self.ram_gb = table.ram_gb[self.by_ram]
+
+    def type_mask(
+        self,
+        families: Optional[List[str]] = None,
+        min_cores: Optional[int] = None,
+        min_ram_gb: Optional[float] = None,
+    ) -> Optional[np.ndarray]:
+        """Boolean mask over instance type IDs matching the filters, or None when nothing restricts them."""
+        mask: Optional[np.ndarray] = None
+
+        def restrict(type_ids: np.ndarray) -> None:
+            nonlocal mask
+            matching = np.zeros(self.n_types, dtype=bool)
+            matching[type_ids] = True
+            mask = matching if mask is None else mask & matching
+
+        if families is not None:
+            restrict(np.concatenate([self.families.get(family, np.array([], dtype=int)) for family in families] or [np.array([], dtype=int)]))
+        if min_cores is not None:
+            restrict(self.by_cores[np.searchsorted(self.cores, min_cores, side="left"):])
+        if min_ram_gb is not None:
+            restrict(self.by_ram[np.searchsorted(self.ram_gb, min_ram_gb, side="left"):])
+        return mask
+
+    @staticmethod
+    def threshold(values: np.ndarray, minimum: Optional[float]) -> Optional[float]:
+        """
+        The smallest value present that is at least minimum, which selects the
+        same instance types; inf if there is none.
+        """
+        if minimum is None:
+            return None
+        position = int(np.searchsorted(values, minimum, side="left"))
+        return float(values[position]) if position < len(values) else float("inf")
+
+
+@dataclass
+class SpotSnapshot:
+    """Spot advisor data in its array-backed form together with its precompressed response body."""
+    data: SpotTable
+    body: PrecompressedBody
+    index: SpotIndex
+    version: Optional[float]  # mtime of the cache file the snapshot was built from
+    checked_at: float  # time.monotonic() of the last check against the cache file
+    queries: "OrderedDict[tuple, PrecompressedBody]" = field(default_factory=OrderedDict)
+
+    MAX_CACHED_QUERIES = 128
+    # Slices are ad hoc, so they are compressed for speed rather than size
+    QUERY_BROTLI_QUALITY = 4
+    QUERY_GZIP_LEVEL = 4
+
+    def query_key(
+        self,
+        regions: Optional[List[str]] = None,
+        os: Optional[List[str]] = None,
+        families: Optional[List[str]] = None,
+        min_cores: Optional[int] = None,
+        min_ram_gb: Optional[float] = None,
+    ) -> tuple:
+        """
+        Filters normalized to what they select: unknown names are dropped and
+        minimums snap to the smallest value present, so equivalent queries
+        share one cache entry however they are spelled.
+        """
+        def known(values: Optional[List[str]], names) -> Optional[Tuple[str, ...]]:
+            # An empty tuple is a filter that matches nothing, None no filter at all
+            return tuple(sorted({value for value in values if value in names})) if values else None
+
+        return (
+            known(regions, self.data.region_ids),
+            known(os, self.data.OPERATING_SYSTEMS),
+            known(families, self.index.families),
+            self.index.threshold(self.index.cores, min_cores),
+            self.index.threshold(self.index.ram_gb, min_ram_gb),
+        )
+
+    async def query(
+        self,
+        regions: Optional[List[str]] = None,
+        os: Optional[List[str]] = None,
+        families: Optional[List[str]] = None,
+        min_cores: Optional[int] = None,
+        min_ram_gb: Optional[float] = None,
+    ) -> PrecompressedBody:
+        """The response body for a slice of the data, cached per distinct query."""
+        key = self.query_key(regions, os, families, min_cores, min_ram_gb)
+        body = self.queries.get(key)
+        if body is not None:
+            CACHE_LOOKUPS.inc(cache="spot_query", result="hit")
+            self.queries.move_to_end(key)
+            return body
+
+        CACHE_LOOKUPS.inc(cache="spot_query", result="miss")
+        # Slicing, encoding and compressing take long enough to stall other requests
+        body = await asyncio.to_thread(self._build_query, key)
+        self.queries[key] = body
+        if len(self.queries) > self.MAX_CACHED_QUERIES:
+            self.queries.popitem(last=False)
+        return body
+
+    def _build_query(self, key: tuple) -> PrecompressedBody:
+        return PrecompressedBody(
+            encode_json(self.slice(*key)),
+            brotli_quality=self.QUERY_BROTLI_QUALITY,
+            gzip_level=self.QUERY_GZIP_LEVEL,
+        )
+
+    def slice(
+        self,
+        regions: Optional[List[str]] = None,
+        os: Optional[List[str]] = None,
+        families: Optional[List[str]] = None,
+        min_cores: Optional[int] = None,
+        min_ram_gb: Optional[float] = None,
+    ) -> dict:
+        """The part of the data matching the filters, in the SpotData shape."""
+        return self.data.to_dict(regions, os, self.index.type_mask(families, min_cores, min_ram_gb))
+
+
+def encode_json(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def build_snapshot(data: dict, version: Optional[float]) -> SpotSnapshot:
+    with DATA_LOAD_DURATION.time(dataset="spot_advisor"):
+        table = SpotTable.from_dict(data)
+        return SpotSnapshot(
+            data=table,
+            body=PrecompressedBody(encode_json(table.to_dict())),
+            index=SpotIndex(table),
+            version=version,
+            checked_at=time.monotonic(),
+        )
+
+
+def snapshot_layout(snapshot: SpotSnapshot) -> Tuple[Dict[str, np.ndarray], Dict[str, bytes], dict]:
+    """The arrays, blobs and metadata a snapshot is stored as in a shared data file."""
+    table = snapshot.data
+    arrays = {
+        "s": table.s, "r": table.r, "present": table.present,
+        "cores": table.cores, "ram_gb": table.ram_gb, "emr": table.emr,
+    }
+    blobs = {"body": snapshot.body.body, **{f"body.{name}": data for name, data in snapshot.body.encoded.items()}}
+    meta = {
+        "instance_types": table.instance_types,
+        "n_described": table.n_described,
+        "regions": table.regions,
+        "ranges": [item.model_dump() for item in table.ranges],
+        "etag": snapshot.body.etag,
+        "encodings": list(snapshot.body.encoded),
+    }
+    return arrays, blobs, meta
+
+
+def publish_snapshot(snapshot: SpotSnapshot, path: Path) -> None:
+    """Write a snapshot's arrays and encoded bodies to a shared file for other workers."""
+    arrays, blobs, meta = snapshot_layout(snapshot)
+    write_shared_file(path, arrays, blobs, meta)
+
+
+def open_snapshot(path: Path, version: float) -> SpotSnapshot:
+    """Map a published snapshot; nothing is parsed or compressed again."""
+    return map_snapshot(SharedDataFile(path), version)
+
+
+def map_snapshot(shared: SharedDataFile, version: float) -> SpotSnapshot:
+    """A snapshot backed by the arrays and bodies of an open shared data file."""
+    meta = shared.meta
+    table = SpotTable(
+        instance_types=meta["instance_types"],
+        cores=shared.array("cores"),
+        ram_gb=shared.array("ram_gb"),
+        emr=shared.array("emr"),
+        n_described=meta["n_described"],
+        ranges=[Range(**item) for item in meta["ranges"]],
+        regions=meta["regions"],
+        present=shared.array("present"),
+        s=shared.array("s"),
+        r=shared.array("r"),
+    )
+    body = PrecompressedBody.from_encoded(
+        shared.blob("body"),
+        {name: shared.blob(f"body.{name}") for name in meta["encodings"]},
+        meta["etag"],
+    )
+    return SpotSnapshot(data=table, body=body, index=SpotIndex(table), version=version, checked_at=time.monotonic())
+
+
+def normalize_spot_data(data: dict) -> dict:
+    """Keep the parts of the raw advisor feed the app uses, in the SpotData shape."""
+    transformed_data = {
+        "instance_types": data.get("instance_types", {}),
+        "ranges": data.get("ranges", []),
+        "spot_advisor": {}
+    }
+    for region, region_data in data.get("spot_advisor", {}).items():
+        transformed_data["spot_advisor"][region] = {}
+        for os_type in ["Linux", "Windows"]:
+            if os_type in region_data:
+                transformed_data["spot_advisor"][region][os_type] = region_data[os_type]
+    return transformed_data
+
+
+async def fetch_spot_data() -> dict:
+    """Download the spot advisor feed from AWS and normalize it."""
+    # Only needed when fetching, which a replica serving a bundle never does
+    import httpx
+
+    # Fetch from AWS with proper timeout and chunk handling
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            logger.info("Fetching spot data from AWS...")
+            with track_fetch("spot_advisor"):
+                response = await client.get(SPOT_ADVISOR_URL, headers={"Accept-Encoding": "gzip"})
+                response.raise_for_status()
+                data = response.json()
+    except httpx.HTTPError as e:
+        raise SpotDataUnavailable(str(e)) from e
+    return normalize_spot_data(data)
+
+
+class SpotService:
+    CACHE_FILE = "spot_advisor_data.json"
+    REFRESH_JOB = "spot_advisor"
+    # How long a snapshot is served before the cache file is checked for changes
+    MEMORY_TTL = float(os.getenv("SPOT_DATA_MEMORY_TTL", "60"))
+
+    _snapshot: Optional[SpotSnapshot] = None
+    _load_task: Optional[asyncio.Task] = None
+    # Set when the data is served from a prebuilt bundle (see BundleService)
+    _bundle = None
+
+    @classmethod
+    def data_age(cls) -> Optional[float]:
+        age = CacheService.get_cache_age(cls.CACHE_FILE)
+        return age.total_seconds() if age is not None else None
+
+    @classmethod
+    async def refresh(cls) -> SpotSnapshot:
+        """Fetch the spot advisor data from AWS, cache it and swap in a new snapshot."""
+        if cls._bundle is not None:
+            # The data comes from the bundle and is only replaced along with it
+            return cls._snapshot
+        transformed_data = await fetch_spot_data()
+
+        # Validate before caching so a bad payload never replaces good data
+        snapshot = await asyncio.to_thread(build_snapshot, transformed_data, None)
+        # The cache tiers block on disk and, when configured, Redis
+        await asyncio.to_thread(CacheService.save_cached_data, cls.CACHE_FILE, transformed_data)
+        snapshot.version = await asyncio.to_thread(CacheService.get_cache_mtime, cls.CACHE_FILE)
+        cls._snapshot = snapshot
+        await cls._publish(snapshot)
+
+        # History is best effort, a failure to record it doesn't fail the refresh
+        try:
+            await asyncio.to_thread(HistoryService.record_spot, snapshot.data)
+        except Exception as e:
+            logger.error(f"Failed to record spot data history: {str(e)}")
+        return snapshot
+
+    @classmethod
+    async def get_snapshot(cls) -> SpotSnapshot:
+        """
+        Get the spot advisor data, serving stale data while it is refreshed.
+
+        Warm requests return the in-process snapshot; only a cold start without
+        any cached data waits for AWS.
+        """
+        snapshot = cls._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < cls.MEMORY_TTL:
+            return snapshot
+
+        # Concurrent callers share a single reload
+        if cls._load_task is None or cls._load_task.done():
+            cls._load_task = asyncio.create_task(cls._load())
+        return await asyncio.shield(cls._load_task)
+
+    @classmethod
+    def preload(cls) -> None:
+        """Load the cached data in the background instead of on the first request."""
+        task = asyncio.create_task(cls.get_snapshot())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    @classmethod
+    async def _publish(cls, snapshot: SpotSnapshot) -> None:
+        if not (DataPlane.ENABLED and DataPlane.is_leader()):
+            return
+        try:
+            await asyncio.to_thread(publish_snapshot, snapshot, DataPlane.SPOT_FILE)
+        except Exception as e:
+            logger.error(f"Failed to publish spot data to other workers: {str(e)}")
+
+    @classmethod
+    def use_bundle(cls, bundle) -> None:
+        """Serve the spot data of a loaded DataBundle until another one replaces it."""
+        cls._snapshot = bundle.spot_snapshot()
+        cls._bundle = bundle
+
+    @classmethod
+    async def _load(cls) -> SpotSnapshot:
+        if cls._bundle is not None:
+            cls._snapshot.checked_at = time.monotonic()
+            return cls._snapshot
+        if DataPlane.is_follower():
+            return await cls._load_shared()
+
+        snapshot = cls._snapshot
+        version = await asyncio.to_thread(CacheService.get_cache_mtime, cls.CACHE_FILE)
+
+        if snapshot is not None and version == snapshot.version:
+            snapshot.checked_at = time.monotonic()
+        elif version is not None:
+            # The cache file is new or was rewritten (possibly by another worker)
+            with DATA_LOAD_DURATION.time(dataset="spot_advisor_cache"):
+                cached_data = await asyncio.to_thread(CacheService.get_cached_data, cls.CACHE_FILE, True)
+            if cached_data:
+                snapshot = await asyncio.to_thread(build_snapshot, cached_data, version)
+                cls._snapshot = snapshot
+                await cls._publish(snapshot)
+
+        if snapshot is None:
+            return await RefreshService.refresh(cls.REFRESH_JOB)
+
+        if await asyncio.to_thread(CacheService.is_expired, cls.CACHE_FILE):
+            RefreshService.trigger(cls.REFRESH_JOB)
+        return snapshot
+
+    @classmethod
+    async def _load_shared(cls) -> SpotSnapshot:
+        """Follower path: map the snapshot the leader published, waiting for the first one."""
+        deadline = time.monotonic() + DataPlane.FOLLOWER_WAIT
+        while True:
+            snapshot = cls._snapshot
+            try:
+                version = DataPlane.SPOT_FILE.stat().st_mtime
+            except FileNotFoundError:
+                version = None
+
+            if snapshot is not None and version == snapshot.version:
+                snapshot.checked_at = time.monotonic()
+                return snapshot
+            if version is not None:
+                with DATA_LOAD_DURATION.time(dataset="spot_advisor_shared"):
+                    snapshot = await asyncio.to_thread(open_snapshot, DataPlane.SPOT_FILE, version)
+                cls._snapshot = snapshot
+                return snapshot
+            if snapshot is not None:
+                return snapshot
+            if time.monotonic() >= deadline:
+                logger.warning("No spot data published by the data plane leader, fetching it directly")
+                return await RefreshService.refresh(cls.REFRESH_JOB)
+            await asyncio.sleep(0.5)
@@ -5,7 +5,12 @@ set -e
 APP_ENV=${APP_ENV:-production}
 
 if [ "$APP_ENV" = "production" ]; then
-    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 1
+    WORKERS=${WEB_CONCURRENCY:-1}
+    # With several workers, only one refreshes the data and shares it with the others
+    if [ "$WORKERS" -gt 1 ]; then
+        export SHARED_DATA_PLANE=${SHARED_DATA_PLANE:-1}
+    fi
+    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WORKERS"
 elif [ "$APP_ENV" = "development" ]; then
     exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
 else
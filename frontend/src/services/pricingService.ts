@@ -1,4 +1,4 @@
-import { EC2PricingData, EC2PricingRate, PricingConfig } from '../types/spot';
+import { EC2PricingBatchData, EC2PricingData, EC2PricingRate, PricingConfig } from '../types/spot';
 
 export class PricingService {
   private static instance: PricingService;
@@ -117,6 +117,40 @@ export class PricingService {
     }
   }
 
+  /**
+   * Fetch pricing for every region/OS pair that isn't cached yet in a single
+   * request. Returns the regions with pricing data for all the requested OSes.
+   */
+  public async fetchPricingBatch(
+    regions: string[],
+    operatingSystems: PricingConfig['operatingSystem'][] = ['Linux', 'Windows']
+  ): Promise<Set<string>> {
+    const missing = regions.filter(region =>
+      operatingSystems.some(os => !this.pricingData[this.getCacheKey({ region, operatingSystem: os })])
+    );
+
+    if (missing.length > 0) {
+      const params = new URLSearchParams({
+        regions: missing.join(','),
+        os: operatingSystems.join(',')
+      });
+      const response = await fetch(`/api/pricing/batch?${params.toString()}`);
+      if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(`Failed to fetch pricing data: ${response.statusText} - ${errorText}`);
+      }
+      const data: EC2PricingBatchData = await response.json();
+      for (const [region, byOs] of Object.entries(data.regions)) {
+        for (const [os, rates] of Object.entries(byOs)) {
+          this.pricingData[`${region}-${os}`] = { regions: { [region]: rates } };
+        }
+      }
+    }
+
+    return new Set(regions.filter(region =>
+      operatingSystems.every(os => this.pricingData[this.getCacheKey({ region, operatingSystem: os })])
+    ));
+  }
 
   public getInstancePrice(instanceType: string, config: PricingConfig): EC2PricingRate | undefined {
     const cacheKey = this.getCacheKey(config);
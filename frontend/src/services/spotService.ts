@@ -207,28 +207,14 @@ export class SpotService {
       return config?.quantity || 1; // Default to 1 if not configured
     };
 
-    // Track regions with available pricing data
-    const availableRegions = new Set<string>();
-    const unavailableRegions = new Set<string>();
-
-    // Pre-fetch pricing data and track which regions have data
-    await Promise.all(
-      regions.map(async (region) => {
-        try {
-          await Promise.all([
-            this.pricingService.fetchPricing({ ...pricingConfig, region, operatingSystem: 'Linux' }),
-            this.pricingService.fetchPricing({ ...pricingConfig, region, operatingSystem: 'Windows' })
-          ]);
-          availableRegions.add(region);
-        } catch (error) {
-          // Only log if it's not an expected "no data" error
-          if (error instanceof Error && !error.message.startsWith('NO_PRICING_DATA:')) {
-            console.warn(`Error fetching pricing data for region ${region}:`, error);
-          }
-          unavailableRegions.add(region);
-        }
-      })
-    );
+    // Pre-fetch pricing data for every region in one request and track which regions have data
+    let availableRegions = new Set<string>();
+    try {
+      availableRegions = await this.pricingService.fetchPricingBatch(regions, ['Linux', 'Windows']);
+    } catch (error) {
+      console.warn('Error fetching pricing data:', error);
+    }
+    const unavailableRegions = new Set(regions.filter(region => !availableRegions.has(region)));
 
     if (availableRegions.size === 0) {
       throw new Error('No pricing data available for any selected region');
@@ -40,6 +40,13 @@ export interface EC2PricingData {
   }>;
 }
 
+export interface EC2PricingBatchData {
+  regions: Record<string, Record<string, {
+    [instanceType: string]: EC2PricingRate;
+  }>>;
+  unavailable: Record<string, string[]>;
+}
+
 export interface PricingConfig {
   region: string;
   operatingSystem: 'Linux' | 'Windows';
@@ -1,10 +1,13 @@
 import uvicorn
 import logging
+import os
 import sys
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=LOG_LEVEL,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
@@ -20,7 +23,7 @@ if __name__ == "__main__":
             host="0.0.0.0",
             port=8000,
             reload=True,
-            log_level="debug",
+            log_level=LOG_LEVEL.lower(),
             access_log=True
         )
     except Exception as e:
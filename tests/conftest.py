@@ -0,0 +1,27 @@
+from typing import Dict
+
+import pytest
+
+from app.services.analysis_service import AnalysisMatrix
+from app.services.pricing_service import PricingService, write_shard
+from app.services.spot_service import build_snapshot
+
+Prices = Dict[str, Dict[str, Dict[str, str]]]  # region -> OS -> instance type -> price
+
+
+@pytest.fixture
+def make_matrix(tmp_path, monkeypatch):
+    """Builds an AnalysisMatrix through its real constructor from spot data and on-demand prices."""
+    data_dir = tmp_path / "pricing"
+    monkeypatch.setattr(PricingService, "DATA_DIR", data_dir)
+    monkeypatch.setattr(PricingService, "_shards", {})
+    monkeypatch.setattr(PricingService, "_bundle", None)
+
+    def make(data: dict, prices: Prices) -> AnalysisMatrix:
+        for region, oses in prices.items():
+            for os_name, rates in oses.items():
+                write_shard(data_dir, region, os_name, rates)
+        PricingService._shards = {}
+        return AnalysisMatrix(build_snapshot(data, None))
+
+    return make
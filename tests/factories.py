@@ -0,0 +1,44 @@
+"""Small, deterministic spot advisor and pricing data for the tests."""
+from typing import Dict, Iterable, Tuple
+
+RANGES = [
+    {"index": 0, "label": "<5%", "dots": 0, "max": 5},
+    {"index": 1, "label": "5-10%", "dots": 1, "max": 11},
+    {"index": 2, "label": "10-15%", "dots": 2, "max": 16},
+    {"index": 3, "label": "15-20%", "dots": 3, "max": 22},
+    {"index": 4, "label": ">20%", "dots": 4, "max": 100},
+]
+FAMILIES = ("m5", "c5", "r5", "t3", "m6g", "c6g", "r6g", "x2")
+SIZES = (("large", 2, 8), ("xlarge", 4, 16), ("2xlarge", 8, 32), ("4xlarge", 16, 64), ("8xlarge", 32, 128))
+
+Advisor = Dict[str, Dict[str, Dict[str, Tuple[int, int]]]]  # region -> OS -> instance type -> (score, rating)
+
+
+def instance_types() -> Dict[str, dict]:
+    """Every size of every family (40 types), memory per core varying by family."""
+    return {
+        f"{family}.{size}": {"emr": i % 2 == 0, "cores": cores, "ram_gb": ram * (1 + i % 3) / 2}
+        for i, family in enumerate(FAMILIES)
+        for size, cores, ram in SIZES
+    }
+
+
+def advisor(regions: Iterable[str], types: Iterable[str], score: int = 50, rating: int = 1, oses=("Linux",)) -> Advisor:
+    """The same savings score and interruption rating for every type in every region."""
+    types = list(types)
+    return {region: {os: {name: (score, rating) for name in types} for os in oses} for region in regions}
+
+
+def spot_data(advice: Advisor, types: Dict[str, dict] = None) -> dict:
+    """Advisor data in the SpotData shape the app caches."""
+    return {
+        "instance_types": instance_types() if types is None else types,
+        "ranges": RANGES,
+        "spot_advisor": {
+            region: {
+                os: {name: {"s": score, "r": rating} for name, (score, rating) in entries.items()}
+                for os, entries in oses.items()
+            }
+            for region, oses in advice.items()
+        },
+    }
@@ -0,0 +1,42 @@
+from app.models.analysis import StackAnalysisRequest
+from app.services.analysis_service import analyze_stack
+from tests.factories import advisor, spot_data
+
+SMALL, LARGE = "m5.large", "m5.2xlarge"
+
+
+def request(**quantities):
+    return StackAnalysisRequest(items=[
+        {"instance_type": instance_type, "quantity": quantity} for instance_type, quantity in quantities.items()
+    ])
+
+
+def test_regions_missing_prices_are_not_ranked(make_matrix):
+    # ap-south-1 has no price for the large instances, so its total looks cheapest
+    matrix = make_matrix(
+        spot_data(advisor(["us-east-1", "eu-west-1", "ap-south-1"], [SMALL, LARGE])),
+        {
+            "us-east-1": {"Linux": {LARGE: "1.0", SMALL: "0.1"}},
+            "eu-west-1": {"Linux": {LARGE: "1.2", SMALL: "0.1"}},
+            "ap-south-1": {"Linux": {SMALL: "0.1"}},
+        },
+    )
+
+    analysis = analyze_stack(matrix, request(**{LARGE: 2, SMALL: 1}))
+
+    by_region = {region.region: region for region in analysis.regions}
+    assert by_region["ap-south-1"].missing_pricing == [LARGE]
+    assert by_region["ap-south-1"].rank is None and by_region["ap-south-1"].combined_score is None
+    # eu-west-1 saves the most in absolute terms
+    assert [region.region for region in analysis.regions] == ["eu-west-1", "us-east-1", "ap-south-1"]
+    assert [by_region[name].rank for name in ("eu-west-1", "us-east-1")] == [1, 2]
+
+
+def test_risk_is_weighted_by_quantity(make_matrix):
+    advice = advisor(["us-east-1"], [SMALL], rating=4)
+    advice["us-east-1"]["Linux"][LARGE] = (50, 0)
+    matrix = make_matrix(spot_data(advice), {"us-east-1": {"Linux": {LARGE: "1.0", SMALL: "1.0"}}})
+
+    analysis = analyze_stack(matrix, request(**{LARGE: 1, SMALL: 3}))
+
+    assert analysis.regions[0].risk_score == 3.0
@@ -0,0 +1,276 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services.aws_service import (
+    LIVE_INSTANCE_STATES,
+    TRANSITIONAL_STATES,
+    AWSCredentials,
+    AWSService,
+    RegionInventory,
+    launch_time_prefixes,
+)
+
+LAUNCHED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def instance(instance_id, instance_type="m5.large", state="running", launched=LAUNCHED):
+    return {"InstanceId": instance_id, "InstanceType": instance_type, "State": {"Name": state}, "LaunchTime": launched}
+
+
+def matches(instance, filters):
+    """Whether an instance matches DescribeInstances filters, with their wildcards."""
+    fields = {
+        "instance-state-name": instance["State"]["Name"],
+        "instance-id": instance["InstanceId"],
+        "launch-time": instance["LaunchTime"].strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    }
+    return all(any(fnmatch(fields[f["Name"]], value) for value in f["Values"]) for f in filters)
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Filters=(), **kwargs):
+        self.client.calls += 1
+        self.client.filters.append({f["Name"]: f["Values"] for f in Filters})
+        if self.client.behaviour is not None:
+            self.client.behaviour()
+        for page in self.client.pages:
+            self.client.pages_served += 1
+            yield {"Reservations": [{"Instances": [item for item in page if matches(item, Filters)]}]}
+
+
+class FakeEC2Client:
+    """Just enough of a boto3 EC2 client for describe_instances pagination, filters included."""
+
+    def __init__(self, pages, behaviour=None):
+        self.pages = pages
+        self.behaviour = behaviour
+        self.calls = 0
+        self.pages_served = 0
+        self.filters = []
+
+    def get_paginator(self, operation):
+        assert operation == "describe_instances"
+        return FakePaginator(self)
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    """Stubs client creation with a fake client per region; returns the region -> client map and creation log."""
+    clients = {}
+    created = []
+
+    def create_client(credentials, region):
+        created.append(region)
+        return clients[region]
+
+    monkeypatch.setattr(AWSService, "_create_client", staticmethod(create_client))
+    monkeypatch.setattr(AWSService, "_clients", OrderedDict())
+    monkeypatch.setattr(AWSService, "_inventories", OrderedDict())
+    monkeypatch.setattr(AWSService, "_refreshing", {})
+    monkeypatch.setattr(AWSService, "_executor", None)
+    monkeypatch.setattr(AWSService, "_stream_executor", None)
+    yield clients, created
+    for executor in (AWSService._executor, AWSService._stream_executor):
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def credentials(*regions):
+    return AWSCredentials(access_key="AKIA", secret_key="secret", regions=list(regions))
+
+
+def test_clients_are_pooled_per_credentials_and_region(fake_aws, monkeypatch):
+    clients, created = fake_aws
+    clients["us-east-1"] = FakeEC2Client([[instance("i-1"), instance("i-2", "c5.xlarge")]])
+    clients["eu-west-1"] = FakeEC2Client([[instance("i-3")]])
+    # Every call describes the regions again, through the same clients
+    monkeypatch.setattr(AWSService, "INVENTORY_TTL", 0)
+    monkeypatch.setattr(AWSService, "INVENTORY_FULL_REFRESH", 0)
+
+    for _ in range(3):
+        summary = asyncio.run(AWSService.get_ec2_summary(credentials("us-east-1", "eu-west-1")))
+
+    assert {item.region: item.instance_types for item in summary} == {
+        "us-east-1": {"m5.large": 1, "c5.xlarge": 1},
+        "eu-west-1": {"m5.large": 1},
+    }
+    assert sorted(created) == ["eu-west-1", "us-east-1"]
+    assert clients["us-east-1"].calls == 3
+
+    # Other credentials get their own client
+    asyncio.run(AWSService.get_ec2_summary(AWSCredentials(access_key="AKIB", secret_key="other", regions=["us-east-1"])))
+    assert created.count("us-east-1") == 2
+
+
+def test_client_pool_is_bounded(fake_aws, monkeypatch):
+    clients, created = fake_aws
+    for region in ("r-1", "r-2", "r-3"):
+        clients[region] = FakeEC2Client([])
+    monkeypatch.setattr(AWSService, "MAX_CLIENTS", 2)
+
+    for region in ("r-1", "r-2", "r-3", "r-1"):
+        AWSService._get_client(credentials(region), region)
+
+    assert created == ["r-1", "r-2", "r-3", "r-1"]
+    assert len(AWSService._clients) == 2
+
+
+def test_slow_region_times_out_without_failing_the_others(fake_aws, monkeypatch):
+    clients, _ = fake_aws
+    release = threading.Event()
+    clients["us-east-1"] = FakeEC2Client([[instance("i-1")]])
+    clients["ap-south-1"] = FakeEC2Client([[instance("i-2")]], behaviour=lambda: release.wait(5))
+    monkeypatch.setattr(AWSService, "REGION_TIMEOUT", 0.2)
+
+    try:
+        instances = asyncio.run(AWSService.get_ec2_instances(credentials("us-east-1", "ap-south-1")))
+    finally:
+        release.set()
+
+    assert list(instances) == ["us-east-1"]
+    assert [item.instance_id for item in instances["us-east-1"]] == ["i-1"]
+    # A timed out region isn't cached, so the next request tries it again
+    assert list(AWSService._inventories) == [(AWSService._scope(credentials()), "us-east-1")]
+
+
+def test_failing_region_is_left_out(fake_aws):
+    clients, _ = fake_aws
+
+    def denied():
+        raise ClientError({"Error": {"Code": "UnauthorizedOperation", "Message": "denied"}}, "DescribeInstances")
+
+    clients["us-east-1"] = FakeEC2Client([[instance("i-1", state="stopped"), instance("i-2")]])
+    clients["eu-west-1"] = FakeEC2Client([[instance("i-3")]], behaviour=denied)
+    clients["eu-north-1"] = FakeEC2Client([[instance("i-4")]], behaviour=lambda: 1 / 0)
+
+    fleet = asyncio.run(AWSService.get_billed_fleet(credentials("us-east-1", "eu-west-1", "eu-north-1")))
+
+    assert fleet == {"us-east-1": {("Linux", "m5.large"): 1}}
+
+
+def test_timed_out_region_stops_paginating(fake_aws, monkeypatch):
+    clients, _ = fake_aws
+    slow = threading.Event()
+
+    def page(number):
+        # Each page takes longer than the region timeout
+        slow.wait(0.15)
+        return [instance(f"i-{number}")]
+
+    class SlowPages:
+        def __iter__(self):
+            return (page(number) for number in range(20))
+
+    clients["us-east-1"] = FakeEC2Client(SlowPages())
+    monkeypatch.setattr(AWSService, "REGION_TIMEOUT", 0.2)
+
+    assert asyncio.run(AWSService.get_ec2_summary(credentials("us-east-1"))) == []
+    AWSService._executor.shutdown(wait=True)
+    assert clients["us-east-1"].pages_served < 5
+
+
+def test_stream_uses_its_own_pool_and_stops_when_the_client_goes_away(fake_aws, monkeypatch):
+    clients, _ = fake_aws
+    clients["us-east-1"] = FakeEC2Client([[instance(f"i-{page}")] for page in range(100)])
+    monkeypatch.setattr(AWSService, "STREAM_QUEUE_PAGES", 1)
+
+    async def read_one():
+        stream = AWSService.stream_ec2_instances(credentials("us-east-1"))
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert b'"instance_id": "i-0"' in asyncio.run(read_one())
+    assert AWSService._executor is None
+    AWSService._stream_executor.shutdown(wait=True)
+    assert clients["us-east-1"].pages_served < 10
+
+
+def inventory(instances, refreshed_ago=60):
+    """A recent inventory of raw instances, last refreshed refreshed_ago seconds ago."""
+    now, now_wall = time.monotonic(), time.time()
+    records = {item["InstanceId"]: AWSService._instance_record(item, "us-east-1") for item in instances}
+    return RegionInventory(records, now - refreshed_ago, now - refreshed_ago, now_wall - refreshed_ago)
+
+
+def test_incremental_refresh_describes_only_what_can_have_changed(fake_aws, monkeypatch):
+    clients, _ = fake_aws
+    monkeypatch.setattr(AWSService, "INVENTORY_FULL_REFRESH", 4 * 3600)
+    launched = datetime.now(timezone.utc) - timedelta(hours=2)
+    previous = inventory([
+        instance("i-running"),
+        instance("i-starting", state="pending"),
+        instance("i-booting", state="pending"),
+        instance("i-stopping", state="stopping"),
+        instance("i-terminating", state="shutting-down"),
+    ], refreshed_ago=3 * 3600)
+    clients["us-east-1"] = FakeEC2Client([[
+        instance("i-running"),
+        instance("i-starting"),
+        instance("i-booting", state="pending"),
+        instance("i-stopping", state="stopped"),
+        instance("i-terminating", state="terminated"),
+        instance("i-new", "c5.xlarge", launched=launched),
+        instance("i-old", "c5.xlarge"),
+    ]])
+
+    refreshed = AWSService._refresh_region(credentials("us-east-1"), "us-east-1", previous)
+
+    assert {instance_id: record["state"] for instance_id, record in refreshed.instances.items()} == {
+        "i-running": "running",
+        "i-starting": "running",
+        "i-booting": "pending",
+        "i-stopping": "stopped",
+        "i-new": "running",
+    }
+    # An instance that changed without being transitional waits for the next full describe
+    assert "i-old" not in refreshed.instances
+    assert refreshed.full_refresh_at == previous.full_refresh_at
+    assert refreshed.refreshed_wall > previous.refreshed_wall
+
+    transitional, launches, settled = clients["us-east-1"].filters
+    assert transitional == {"instance-state-name": TRANSITIONAL_STATES}
+    assert launches["instance-state-name"] == LIVE_INSTANCE_STATES
+    assert launches["launch-time"][-1] == datetime.fromtimestamp(refreshed.refreshed_wall, timezone.utc).strftime("%Y-%m-%dT%H*")
+    assert launched.strftime("%Y-%m-%dT%H*") in launches["launch-time"]
+    # Only settled instances are looked up by id; i-booting was found still pending
+    assert sorted(settled["instance-id"]) == ["i-starting", "i-stopping", "i-terminating"]
+
+
+def test_old_inventories_are_described_in_full(fake_aws, monkeypatch):
+    clients, _ = fake_aws
+    previous = inventory([instance("i-running")])
+    clients["us-east-1"] = FakeEC2Client([[instance("i-running", state="stopped"), instance("i-old", "c5.xlarge")]])
+    monkeypatch.setattr(AWSService, "INVENTORY_FULL_REFRESH", 30)
+
+    refreshed = AWSService._refresh_region(credentials("us-east-1"), "us-east-1", previous)
+
+    assert {instance_id: record["state"] for instance_id, record in refreshed.instances.items()} == {
+        "i-running": "stopped",
+        "i-old": "running",
+    }
+    assert clients["us-east-1"].filters == [{"instance-state-name": LIVE_INSTANCE_STATES}]
+    assert refreshed.full_refresh_at == refreshed.refreshed_at > previous.full_refresh_at
+
+
+def test_launch_time_prefixes_cover_every_hour_between_two_times():
+    def at(*args):
+        return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+    assert launch_time_prefixes(at(2024, 5, 1, 10, 58, 30), at(2024, 5, 1, 11, 0, 5)) == [
+        "2024-05-01T10*", "2024-05-01T11*",
+    ]
+    assert launch_time_prefixes(at(2024, 5, 1, 10, 5), at(2024, 5, 1, 10, 55)) == ["2024-05-01T10*"]
+    assert launch_time_prefixes(at(2024, 12, 31, 23, 59), at(2025, 1, 1, 1, 0)) == [
+        "2024-12-31T23*", "2025-01-01T00*", "2025-01-01T01*",
+    ]
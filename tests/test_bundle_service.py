@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from app.services.bundle_service import BUNDLE_FORMAT, BundleService, DataBundle, build_bundle
+from app.services.data_plane import write_shared_file
+from app.services.pricing_service import PricingService
+from app.services.spot_service import SpotService
+from tests.factories import advisor, instance_types, spot_data
+
+TYPES = sorted(instance_types())
+PRICING = {
+    ("us-east-1", "Linux"): {name: "0.1000" for name in TYPES},
+    ("eu-west-1", "Windows"): {name: "0.2000" for name in TYPES},
+}
+
+
+@pytest.fixture
+def bundle_path(tmp_path, monkeypatch):
+    """Where BundleService looks for a bundle, with no bundle, spot data or pricing loaded."""
+    path = tmp_path / "data.bundle"
+    monkeypatch.setattr(BundleService, "PATH", path)
+    monkeypatch.setattr(BundleService, "_bundle", None)
+    monkeypatch.setattr(BundleService, "_rejected", None)
+    monkeypatch.setattr(SpotService, "_snapshot", None)
+    monkeypatch.setattr(SpotService, "_bundle", None)
+    monkeypatch.setattr(PricingService, "DATA_DIR", tmp_path / "pricing")
+    monkeypatch.setattr(PricingService, "_shards", {})
+    monkeypatch.setattr(PricingService, "_bundle", None)
+    monkeypatch.setattr(PricingService, "_batches", PricingService._batches.copy())
+    monkeypatch.setattr(PricingService, "generation", PricingService.generation)
+    return path
+
+
+def write_bundle(path, version, regions=("us-east-1", "eu-west-1")):
+    build_bundle(path, spot_data(advisor(regions, TYPES, oses=("Linux", "Windows"))), PRICING, version=version)
+
+
+def replace(path, write):
+    """Replace the file at path, making sure the watcher sees a new mtime."""
+    mtime = path.stat().st_mtime
+    write(path)
+    os.utime(path, (mtime + 10, mtime + 10))
+
+
+def test_bundles_round_trip_into_the_services(bundle_path):
+    write_bundle(bundle_path, "v1")
+
+    bundle = DataBundle(bundle_path)
+    assert bundle.version == "v1"
+    assert sorted(bundle.pricing_keys) == [("eu-west-1", "Windows"), ("us-east-1", "Linux")]
+    assert bundle.pricing("us-east-1", "Linux") == PRICING[("us-east-1", "Linux")]
+    assert bundle.pricing("us-east-1", "Windows") is None
+
+    assert BundleService.load()
+    assert BundleService._bundle.version == "v1"
+    assert sorted(SpotService._snapshot.data.regions) == ["eu-west-1", "us-east-1"]
+    assert PricingService.get_region_pricing("eu-west-1", "Windows")["m5.large"].price == "0.2000"
+    assert PricingService.get_region_pricing("eu-west-1", "Linux") is None
+
+
+def test_bundles_with_a_wrong_checksum_or_format_are_rejected(bundle_path):
+    write_bundle(bundle_path, "v1")
+    data = bytearray(bundle_path.read_bytes())
+    data[-1] ^= 0xFF
+    bundle_path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        DataBundle(bundle_path)
+
+    write_shared_file(bundle_path, {}, {}, {"bundle": {"format": BUNDLE_FORMAT + 1}})
+    with pytest.raises(ValueError, match="bundle format"):
+        DataBundle(bundle_path)
+
+    write_shared_file(bundle_path, {}, {}, {})
+    with pytest.raises(ValueError, match="not a data bundle"):
+        DataBundle(bundle_path)
+
+    assert not BundleService.load()
+    assert BundleService._rejected == bundle_path.stat().st_mtime
+
+
+def test_a_broken_replacement_leaves_the_current_bundle_in_place(bundle_path):
+    write_bundle(bundle_path, "v1")
+    assert BundleService.load()
+    snapshot = SpotService._snapshot
+
+    replace(bundle_path, lambda path: write_shared_file(path, {}, {}, {"bundle": {"format": BUNDLE_FORMAT + 1}}))
+    assert BundleService.load()
+    assert BundleService._bundle.version == "v1"
+    assert SpotService._snapshot is snapshot
+    assert PricingService.get_region_pricing("us-east-1", "Linux")["m5.large"].price == "0.1000"
+
+    # A good bundle written after the broken one is picked up
+    replace(bundle_path, lambda path: write_bundle(path, "v2", regions=("us-east-1",)))
+    assert BundleService.load()
+    assert BundleService._bundle.version == "v2"
+    assert list(SpotService._snapshot.data.regions) == ["us-east-1"]
+
+
+def test_invalid_prices_fail_the_build_naming_the_shard(tmp_path):
+    pricing = {("us-east-1", "Windows"): {"m5.large": "-1"}}
+    with pytest.raises(ValueError, match=r"m5.large in us-east-1 \(Windows\)"):
+        build_bundle(tmp_path / "data.bundle", spot_data(advisor(["us-east-1"], TYPES)), pricing)
+    assert not (tmp_path / "data.bundle").exists()
@@ -0,0 +1,146 @@
+import os
+import time
+
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import CacheBackend, CacheService, DiskCache, MemoryCache, RedisCache
+
+
+class FakeRedis:
+    """An in-process stand-in for the redis-py client calls RedisCache makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.failing = False
+
+    def _check(self):
+        if self.failing:
+            raise ConnectionError("Redis is down")
+
+    def get(self, key):
+        self._check()
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and time.time() >= expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key, value, px=None):
+        self._check()
+        if isinstance(value, str):
+            value = value.encode()
+        self.data[key] = (value, time.time() + px / 1000 if px else None)
+
+    def delete(self, *keys):
+        self._check()
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def tiers(tmp_path, monkeypatch):
+    memory = MemoryCache(max_entries=8, max_bytes=1024)
+    disk = DiskCache(tmp_path)
+    redis = RedisCache(FakeRedis(), stale_grace=60)
+    monkeypatch.setattr(CacheService, "_tiers", [memory, disk, redis])
+    monkeypatch.setattr(CacheService, "CACHE_FORMAT", "json")
+    monkeypatch.setattr(CacheService, "TTLS", {})
+    return memory, disk, redis
+
+
+@pytest.fixture
+def encodings(monkeypatch):
+    """Counts the values CacheService serializes."""
+    calls = []
+    dumps = cache_service.dumps
+
+    def counting_dumps(data, format="json"):
+        calls.append(data)
+        return dumps(data, format)
+
+    monkeypatch.setattr(cache_service, "dumps", counting_dumps)
+    return calls
+
+
+def test_falls_back_through_the_tiers_and_backfills(tiers, encodings):
+    memory, disk, redis = tiers
+    CacheService.save_cached_data("small.json", {"a": 1})
+    stored_at = CacheService.get_cache_mtime("small.json")
+
+    assert CacheService.get_cached_data("small.json") == {"a": 1}
+    assert (memory.hits, disk.hits, redis.hits) == (1, 0, 0)
+
+    # Only Redis still has it, e.g. on a fresh replica
+    memory.delete("small.json")
+    disk.delete("small.json")
+    encodings.clear()
+    assert CacheService.get_cached_data("small.json") == {"a": 1}
+    assert (memory.misses, disk.misses, redis.hits) == (1, 1, 1)
+    # The bytes read from Redis are written back as they are
+    assert encodings == []
+    assert memory.get("small.json").value == {"a": 1}
+    assert disk.stored_at("small.json") == pytest.approx(stored_at)
+
+    # Served from memory again
+    assert CacheService.get_cached_data("small.json") == {"a": 1}
+    assert memory.hits == 2
+
+
+def test_redis_failures_fall_back_to_disk(tiers):
+    memory, disk, redis = tiers
+    CacheService.save_cached_data("small.json", {"a": 1})
+    memory.delete("small.json")
+    redis.client.failing = True
+
+    assert CacheService.get_cache_mtime("small.json") is not None
+    assert CacheService.get_cached_data("small.json") == {"a": 1}
+    assert disk.hits == 1
+    assert memory.get("small.json") is not None
+
+
+def test_newer_copy_from_another_replica_wins(tiers):
+    memory, disk, redis = tiers
+    CacheService.save_cached_data("small.json", {"version": 1})
+    # Another replica saved a newer copy to Redis only
+    redis.set("small.json", cache_service.CacheEntry(value=None, stored_at=time.time() + 10), b'{"version":2}', 3600)
+
+    assert CacheService.get_cached_data("small.json") == {"version": 2}
+    assert (memory.misses, disk.misses, redis.hits) == (1, 1, 1)
+    assert disk.get("small.json").value == {"version": 2}
+
+
+def test_large_entries_skip_the_memory_tier_without_encoding(tiers, encodings):
+    memory, disk, redis = tiers
+    large = {"values": list(range(1000))}
+    CacheService.save_cached_data("large.json", large)
+    assert memory.get("large.json") is None
+
+    encodings.clear()
+    assert CacheService.get_cached_data("large.json") == large
+    assert disk.hits == 1
+    assert encodings == []
+    assert memory.stats()["bytes"] == 0
+
+
+def test_expired_entries_are_not_served(tiers):
+    memory, disk, redis = tiers
+    CacheService.save_cached_data("small.json", {"a": 1})
+    old = time.time() - 7200
+    CacheService.set_ttl("small.json", cache_service.timedelta(hours=1))
+    memory.delete("small.json")
+    redis.delete("small.json")
+    os.utime(disk.path("small.json"), (old, old))
+
+    assert CacheService.is_expired("small.json")
+    assert CacheService.get_cached_data("small.json") is None
+    assert CacheService.get_cached_data("small.json", allow_stale=True) == {"a": 1}
+
+
+def test_backends_must_implement_every_operation():
+    class Incomplete(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
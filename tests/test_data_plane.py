@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.services.data_plane import DataPlane
+from app.services.pricing_service import PricingService, SharedPricing, write_shard
+
+
+@pytest.fixture
+def shared_pricing(tmp_path, monkeypatch):
+    """A leader's pricing directory and the file it publishes to, with no shards loaded."""
+    data_dir = tmp_path / "pricing"
+    write_shard(data_dir, "us-east-1", "Linux", {"m5.large": "0.0960"})
+    write_shard(data_dir, "eu-west-1", "Windows", {"m5.large": "0.1880"})
+    monkeypatch.setattr(DataPlane, "ENABLED", True)
+    monkeypatch.setattr(DataPlane, "PRICING_FILE", tmp_path / "pricing_table.bin")
+    monkeypatch.setattr(PricingService, "DATA_DIR", data_dir)
+    monkeypatch.setattr(PricingService, "_shards", {})
+    monkeypatch.setattr(PricingService, "_bundle", None)
+    return data_dir
+
+
+def test_followers_serve_the_pricing_the_leader_published(shared_pricing, monkeypatch, tmp_path):
+    monkeypatch.setattr(DataPlane, "_lock_fd", 1)
+    asyncio.run(PricingService.publish())
+
+    # A follower reading another (empty) pricing directory
+    monkeypatch.setattr(DataPlane, "_lock_fd", None)
+    monkeypatch.setattr(PricingService, "DATA_DIR", tmp_path / "elsewhere")
+    PricingService.follow()
+
+    assert isinstance(PricingService._bundle, SharedPricing)
+    assert sorted(PricingService._bundle.pricing_keys) == [("eu-west-1", "Windows"), ("us-east-1", "Linux")]
+    assert PricingService.has_data()
+    assert PricingService.get_region_pricing("us-east-1", "Linux")["m5.large"].price == "0.0960"
+    assert PricingService.get_region_pricing("eu-west-1", "Linux") is None
+
+
+def test_followers_only_publish_once_elected(shared_pricing, monkeypatch):
+    monkeypatch.setattr(DataPlane, "_lock_fd", None)
+    asyncio.run(PricingService.publish())
+    assert not DataPlane.PRICING_FILE.exists()
+
+    # Nothing published yet, so a follower reads the shards on disk
+    PricingService.follow()
+    assert PricingService._bundle is None
+    assert PricingService.get_region_pricing("eu-west-1", "Windows")["m5.large"].price == "0.1880"
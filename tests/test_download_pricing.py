@@ -0,0 +1,234 @@
+import asyncio
+import json
+import random
+
+import httpx
+
+from app.scripts import download_pricing
+from app.scripts.download_pricing import (
+    OPERATING_SYSTEMS,
+    REGIONS,
+    _backoff_delay,
+    download_all_pricing_data,
+    download_pricing_data,
+    load_manifest,
+)
+from app.services.cache_service import read_file
+from app.services.pricing_service import shard_path
+
+BASE_URL = "http://pricing.test"
+ETAG = '"v1"'
+
+
+def payload(location: str, os_name: str, price: str = "0.1000") -> bytes:
+    return json.dumps({
+        "manifest": {},
+        "regions": {
+            location: {
+                f"m5.large {os_name}": {"price": price, "Instance Type": "m5.large", "Location": location},
+                f"c5.large {os_name}": {"price": "0.0850", "Instance Type": "c5.large", "Location": location},
+            }
+        },
+    }).encode()
+
+
+def client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download_pricing, "RETRY_BACKOFF", 0)
+
+
+def test_download_parses_prices_and_validators():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert "If-None-Match" not in request.headers
+        return httpx.Response(200, content=payload("US East (N. Virginia)", "Linux"), headers={
+            "ETag": ETAG, "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+        })
+
+    async def run():
+        async with client(handler) as http:
+            return await download_pricing_data("us-east-1", "US East (N. Virginia)", "Linux", http, BASE_URL)
+
+    result = asyncio.run(run())
+    assert result.prices == {"m5.large": "0.1000", "c5.large": "0.0850"}
+    assert result.etag == ETAG
+    assert result.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert not result.not_modified
+
+
+def test_conditional_request_reports_not_modified():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == ETAG:
+            return httpx.Response(304)
+        return httpx.Response(200, content=payload("EU (Ireland)", "Linux"), headers={"ETag": '"v2"'})
+
+    async def run():
+        async with client(handler) as http:
+            return await download_pricing_data(
+                "eu-west-1", "EU (Ireland)", "Linux", http, BASE_URL,
+                validators={"etag": ETAG, "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+            )
+
+    result = asyncio.run(run())
+    assert result.not_modified and result.prices is None
+    # The previous validators are kept when a 304 doesn't repeat them
+    assert result.etag == ETAG
+    assert result.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert seen[0]["if-none-match"] == ETAG
+    assert seen[0]["if-modified-since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_transient_failures_are_retried(monkeypatch):
+    no_backoff(monkeypatch)
+    responses = iter([
+        httpx.Response(503),
+        httpx.Response(429),
+        httpx.Response(200, content=payload("EU (Ireland)", "Linux")),
+    ])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        return next(responses)
+
+    async def run():
+        async with client(handler) as http:
+            return await download_pricing_data("eu-west-1", "EU (Ireland)", "Linux", http, BASE_URL, retries=3)
+
+    result = asyncio.run(run())
+    assert len(calls) == 3
+    assert result.prices["m5.large"] == "0.1000"
+
+
+def test_connection_errors_are_retried_until_retries_run_out(monkeypatch):
+    no_backoff(monkeypatch)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        raise httpx.ConnectError("refused", request=request)
+
+    async def run():
+        async with client(handler) as http:
+            return await download_pricing_data("eu-west-1", "EU (Ireland)", "Linux", http, BASE_URL, retries=2)
+
+    assert asyncio.run(run()) is None
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    no_backoff(monkeypatch)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        return httpx.Response(404)
+
+    async def run():
+        async with client(handler) as http:
+            return await download_pricing_data("eu-west-1", "EU (Ireland)", "Linux", http, BASE_URL, retries=3)
+
+    assert asyncio.run(run()) is None
+    assert len(calls) == 1
+
+
+def test_backoff_is_jittered_and_doubles(monkeypatch):
+    monkeypatch.setattr(download_pricing, "random", random.Random(7))
+    for attempt in range(5):
+        delays = [_backoff_delay(attempt) for _ in range(200)]
+        ceiling = download_pricing.RETRY_BACKOFF * 2 ** attempt
+        assert all(0 <= delay <= ceiling for delay in delays)
+        # Full jitter spreads the delays over the whole window
+        assert max(delays) > ceiling * 0.8 and min(delays) < ceiling * 0.2
+
+
+def test_incremental_refresh_only_rewrites_changed_files(tmp_path):
+    version = {"eu-west-1": 1}
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        location = request.url.path.split("/")[-3]
+        region = next(code for code, name in REGIONS.items() if name == location)
+        etag = f'"{region}-{version.get(region, 0)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        price = f"{0.1 * (version.get(region, 0) + 1):.4f}"
+        return httpx.Response(200, content=payload(location, request.url.path.split("/")[-2], price), headers={"ETag": etag})
+
+    async def run():
+        async with client(handler) as http:
+            return await download_all_pricing_data(base_url=BASE_URL, data_dir=tmp_path, client=http)
+
+    statuses = asyncio.run(run())
+    assert all(status == "updated" for oses in statuses.values() for status in oses.values())
+    assert len(requests) == len(REGIONS) * len(OPERATING_SYSTEMS)
+    manifest = load_manifest(tmp_path)
+    assert manifest["checked_at"]
+    assert manifest["files"]["eu-west-1/Linux"]["etag"] == '"eu-west-1-1"'
+
+    # Only eu-west-1 changes upstream
+    version["eu-west-1"] = 2
+    requests.clear()
+    statuses = asyncio.run(run())
+    assert all(request.headers.get("If-None-Match") for request in requests)
+    assert statuses["eu-west-1"] == {"Linux": "updated", "Windows": "updated"}
+    assert statuses["us-east-1"] == {"Linux": "not modified", "Windows": "not modified"}
+    shard = read_file(shard_path(tmp_path / "pricing", "eu-west-1", "Linux"))
+    assert shard["prices"]["m5.large"] == "0.3000"
+    assert load_manifest(tmp_path)["files"]["eu-west-1/Linux"]["etag"] == '"eu-west-1-2"'
+
+
+def test_failed_refresh_does_not_advance_checked_at(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    status_code = 200
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if status_code != 200:
+            return httpx.Response(status_code)
+        location, os_name = request.url.path.split("/")[-3:-1]
+        return httpx.Response(200, content=payload(location, os_name, "0.1000"), headers={"ETag": '"1"'})
+
+    async def run():
+        async with client(handler) as http:
+            return await download_all_pricing_data(base_url=BASE_URL, data_dir=tmp_path, client=http)
+
+    asyncio.run(run())
+    checked_at = load_manifest(tmp_path)["checked_at"]
+
+    # AWS is unavailable for the next refresh
+    status_code = 503
+    statuses = asyncio.run(run())
+    assert all(status == "failed" for oses in statuses.values() for status in oses.values())
+    manifest = load_manifest(tmp_path)
+    assert manifest["checked_at"] == checked_at
+    assert manifest["files"]["eu-west-1/Linux"]["etag"] == '"1"'
+
+
+def test_missing_shard_is_downloaded_unconditionally(tmp_path):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("If-None-Match") == ETAG:
+            return httpx.Response(304)
+        location, os_name = request.url.path.split("/")[-3:-1]
+        return httpx.Response(200, content=payload(location, os_name), headers={"ETag": ETAG})
+
+    async def run():
+        async with client(handler) as http:
+            return await download_all_pricing_data(base_url=BASE_URL, data_dir=tmp_path, client=http)
+
+    asyncio.run(run())
+    shard_path(tmp_path / "pricing", "us-east-1", "Linux").unlink()
+    requests.clear()
+    statuses = asyncio.run(run())
+    assert statuses["us-east-1"]["Linux"] == "updated"
+    assert statuses["us-east-1"]["Windows"] == "not modified"
+    unconditional = [request for request in requests if "If-None-Match" not in request.headers]
+    assert len(unconditional) == 1
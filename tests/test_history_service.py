@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.history_service import HistoryService
+from app.services.pricing_service import write_shard
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(HistoryService, "DB_PATH", tmp_path / "history.sqlite3")
+    monkeypatch.setattr(HistoryService, "_initialized", None)
+    return HistoryService
+
+
+def rows(table):
+    conn = HistoryService.connect()
+    try:
+        return conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3, 4").fetchall()
+    finally:
+        conn.close()
+
+
+def when(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def test_only_changes_are_stored(history):
+    values = {
+        ("us-east-1", "Linux", "m5.large"): (70, 1),
+        ("us-east-1", "Linux", "c5.large"): (60, 2),
+    }
+    assert history.record("spot", values, recorded_at=100) == 2
+    assert history.record("spot", values, recorded_at=200) == 0
+
+    values[("us-east-1", "Linux", "c5.large")] = (65, 2)
+    assert history.record("spot", values, recorded_at=300) == 1
+
+    assert rows("spot_history") == [
+        ("us-east-1", "Linux", "c5.large", 100, 60, 2),
+        ("us-east-1", "Linux", "c5.large", 300, 65, 2),
+        ("us-east-1", "Linux", "m5.large", 100, 70, 1),
+    ]
+    assert [(snapshot.recorded_at, snapshot.changes) for snapshot in history.snapshots()] == [
+        (when(300), 1), (when(200), 0), (when(100), 2),
+    ]
+
+
+def test_dropped_types_are_recorded_as_null(history):
+    history.record("spot", {
+        ("us-east-1", "Linux", "m5.large"): (70, 1),
+        ("us-east-1", "Linux", "c5.large"): (60, 2),
+    }, recorded_at=100)
+    assert history.record("spot", {("us-east-1", "Linux", "m5.large"): (70, 1)}, recorded_at=200) == 1
+
+    assert ("us-east-1", "Linux", "c5.large", 200, None, None) in rows("spot_history")
+    assert rows("spot_current") == [("us-east-1", "Linux", "m5.large", 70, 1)]
+
+    # A type that comes back is recorded again
+    assert history.record("spot", {
+        ("us-east-1", "Linux", "m5.large"): (70, 1),
+        ("us-east-1", "Linux", "c5.large"): (60, 2),
+    }, recorded_at=300) == 1
+    assert ("us-east-1", "Linux", "c5.large", 300, 60, 2) in rows("spot_history")
+
+
+def test_pricing_drops_are_scoped_to_the_shards_on_disk(history, tmp_path):
+    data_dir = tmp_path / "pricing"
+    write_shard(data_dir, "us-east-1", "Linux", {"m5.large": "0.0960", "c5.large": "0.0850"})
+    write_shard(data_dir, "eu-west-1", "Windows", {"m5.large": "0.1880"})
+    assert history.record_pricing(data_dir) == 3
+
+    # eu-west-1 failed to download and c5.large was dropped from us-east-1
+    (data_dir / "eu-west-1" / "Windows.json").unlink()
+    write_shard(data_dir, "us-east-1", "Linux", {"m5.large": "0.0960"})
+    assert history.record_pricing(data_dir) == 1
+
+    assert [row[2:] for row in rows("price_current")] == [
+        ("m5.large", "0.1880"), ("m5.large", "0.0960"),
+    ]
+    dropped = [row[:3] for row in rows("price_history") if row[4] is None]
+    assert dropped == [("us-east-1", "Linux", "c5.large")]
+
+
+def test_trends_start_with_the_value_in_effect_at_the_start_of_the_window(history):
+    key = ("us-east-1", "Linux", "m5.large")
+    for recorded_at, value in [(100, (70, 1)), (200, (65, 2)), (300, (60, 3)), (400, (55, 4))]:
+        history.record("spot", {key: value}, recorded_at=recorded_at)
+    history.record("pricing", {key: ("0.0960",)}, recorded_at=100)
+
+    trend = history.get_trend(*key, start=when(250), end=when(350))
+    assert [(point.recorded_at, point.savings, point.interruption_rating) for point in trend.spot] == [
+        (when(200), 65, 2), (when(300), 60, 3),
+    ]
+    # The price hasn't changed since long before the window
+    assert [(point.recorded_at, point.price) for point in trend.pricing] == [(when(100), "0.0960")]
+
+    assert history.get_trend(*key, start=when(0), end=when(50)).spot == []
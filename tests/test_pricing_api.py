@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.pricing_service import PricingService, write_shard
+
+
+@pytest.fixture
+def pricing_dir(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data" / "pricing"
+    write_shard(data_dir, "us-east-1", "Linux", {"m5.large": "0.0960"})
+    monkeypatch.setattr(PricingService, "DATA_DIR", data_dir)
+    monkeypatch.setattr(PricingService, "_shards", {})
+    monkeypatch.setattr(PricingService, "_bundle", None)
+    PricingService._batches.clear()
+    return data_dir
+
+
+def get(url: str, **params) -> httpx.Response:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(url, params=params)
+    return asyncio.run(run())
+
+
+def test_pricing_for_a_known_region(pricing_dir):
+    response = get("/api/pricing", region="us-east-1", os="Linux")
+    assert response.status_code == 200
+    assert response.json()["regions"]["us-east-1"]["m5.large"]["price"] == "0.0960"
+
+
+def test_pricing_accepts_location_names(pricing_dir):
+    response = get("/api/pricing", region="US East (N. Virginia)", os="Linux")
+    assert response.status_code == 200
+
+
+def test_pricing_rejects_paths_outside_the_data_dir(pricing_dir, tmp_path):
+    evil = tmp_path / "evil"
+    evil.mkdir()
+    (evil / "leak.json").write_text(json.dumps({"prices": {"secret": "1"}}))
+    (pricing_dir / "us-east-1" / "leak.json").write_text(json.dumps({"prices": {"secret": "1"}}))
+
+    relative = "../" * (len(pricing_dir.parts) + 2) + str(evil).lstrip("/")
+    assert get("/api/pricing", region=relative, os="leak").status_code == 422
+    assert get("/api/pricing", region=relative, os="Linux").status_code == 404
+    assert get("/api/pricing", region="us-east-1", os="leak").status_code == 422
+    assert PricingService.get_shard(relative, "leak") is None
+    assert PricingService.get_shard("us-east-1", "../us-east-1/leak") is None
+
+
+def test_pricing_for_a_known_region_without_data(pricing_dir):
+    assert get("/api/pricing", region="eu-west-1", os="Linux").status_code == 404
+
+
+def test_batch_lists_unknown_regions_as_unavailable(pricing_dir):
+    # The frontend sends every selected region, including ones without pricing yet
+    response = get("/api/pricing/batch", regions="us-east-1,ap-southeast-6,../../etc", os="Linux")
+    assert response.status_code == 200
+    assert list(response.json()["regions"]) == ["us-east-1"]
+    assert response.json()["unavailable"] == {"../../etc": ["Linux"], "ap-southeast-6": ["Linux"]}
+
+    response = get("/api/pricing/batch", regions="us-east-1,eu-west-1", os="Linux")
+    assert response.status_code == 200
+    assert response.json()["unavailable"] == {"eu-west-1": ["Linux"]}
+
+
+def test_batch_queries_in_any_order_share_a_body(pricing_dir):
+    first = get("/api/pricing/batch", regions="us-east-1,eu-west-1,us-east-1", os="Windows,Linux")
+    second = get("/api/pricing/batch", regions="eu-west-1,us-east-1", os="Linux,Windows")
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers["etag"] == second.headers["etag"]
+    assert len(PricingService._batches) == 1
+    assert list(first.json()["regions"]) == ["us-east-1"]
+    assert first.json()["unavailable"] == {"eu-west-1": ["Linux", "Windows"], "us-east-1": ["Windows"]}
@@ -0,0 +1,72 @@
+import numpy as np
+
+from app.models.spot import SpotTable
+from app.services.recommendation_service import RecommendationIndex
+from tests.factories import advisor, instance_types, spot_data
+
+
+def index():
+    return RecommendationIndex(SpotTable.from_dict(spot_data(advisor(["us-east-1"], instance_types()))))
+
+
+def matrix(make_matrix, index, has_spot):
+    """A us-east-1 matrix over the index's instance types, with spot data where has_spot is set."""
+    types = [name for name, spot in zip(index.instance_types, has_spot) if spot]
+    return make_matrix(
+        spot_data(advisor(["us-east-1"], types, rating=0)),
+        {"us-east-1": {"Linux": {name: "1.0" for name in index.instance_types}}},
+    )
+
+
+def test_recommend_looks_past_the_neighbour_list(make_matrix):
+    spec = index()
+    type_id = 0
+    has_spot = np.ones(len(spec.instance_types), dtype=bool)
+    # None of the precomputed neighbours have spot data in the region
+    has_spot[spec.neighbours[type_id]] = False
+
+    response = spec.recommend(matrix(make_matrix, spec, has_spot), spec.instance_types[type_id], "us-east-1", k=5, lower_risk=False)
+
+    assert len(response.alternatives) == 5
+    distances = [alternative.distance for alternative in response.alternatives]
+    assert distances == sorted(distances)
+    assert distances[0] >= round(float(spec.distances[type_id].max()), 4)
+    assert not {alternative.instance_type for alternative in response.alternatives} & {
+        spec.instance_types[neighbour] for neighbour in spec.neighbours[type_id]
+    }
+
+
+def test_recommend_returns_what_there_is_when_candidates_run_out(make_matrix):
+    spec = index()
+    has_spot = np.zeros(len(spec.instance_types), dtype=bool)
+    has_spot[[5, 30]] = True
+
+    response = spec.recommend(matrix(make_matrix, spec, has_spot), spec.instance_types[0], "us-east-1", k=10, lower_risk=False)
+
+    assert sorted(alternative.instance_type for alternative in response.alternatives) == sorted(
+        spec.instance_types[i] for i in (5, 30)
+    )
+
+
+def test_nothing_is_lower_risk_than_the_lowest_rating(make_matrix, monkeypatch):
+    spec = index()
+    has_spot = np.ones(len(spec.instance_types), dtype=bool)
+    rated = matrix(make_matrix, spec, has_spot)
+
+    def candidates(type_id):
+        raise AssertionError("candidates scanned")
+
+    monkeypatch.setattr(spec, "candidates", candidates)
+    response = spec.recommend(rated, spec.instance_types[0], "us-east-1", k=5)
+
+    assert response.requested.interruption_rating == 0
+    assert response.alternatives == []
+
+
+def test_update_from_an_empty_index():
+    empty = RecommendationIndex(SpotTable.from_dict({}))
+    assert empty.neighbours.shape[0] == 0
+
+    assert RecommendationIndex(SpotTable.from_dict({}), empty).neighbours.shape[0] == 0
+    table = SpotTable.from_dict(spot_data(advisor(["us-east-1"], instance_types())))
+    assert (RecommendationIndex(table, empty).neighbours == RecommendationIndex(table).neighbours).all()
@@ -0,0 +1,102 @@
+import asyncio
+import gc
+
+import pytest
+
+from app.services.refresh_service import RefreshService
+
+
+@pytest.fixture
+def refresh_service(monkeypatch):
+    monkeypatch.setattr(RefreshService, "_jobs", {})
+    monkeypatch.setattr(RefreshService, "_scheduler", None)
+    return RefreshService
+
+
+class Dataset:
+    """A refresh function that counts its calls and can be held until released."""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def refresh(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.calls
+
+
+def test_concurrent_refreshes_share_one_task(refresh_service):
+    async def run():
+        dataset = Dataset()
+        dataset.release.clear()
+        refresh_service.register("spot", dataset.refresh, lambda: None, 60)
+
+        waiting = [asyncio.create_task(refresh_service.refresh("spot")) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert refresh_service.trigger("spot") is refresh_service._jobs["spot"].task
+        dataset.release.set()
+        results = await asyncio.gather(*waiting)
+
+        # A refresh after the last one finished runs again
+        return results, await refresh_service.refresh("spot"), dataset.calls
+
+    assert asyncio.run(run()) == ([1, 1, 1], 2, 2)
+
+
+def test_failures_are_recorded_without_escaping_trigger(refresh_service):
+    dataset = Dataset(error=RuntimeError("AWS is down"))
+    refresh_service.register("pricing", dataset.refresh, lambda: None, 60)
+    unhandled = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        refresh_service.trigger("pricing")
+        # Wait without retrieving the task's exception, as nothing does when the scheduler triggers it
+        while refresh_service._jobs["pricing"].is_running():
+            await asyncio.sleep(0)
+        refresh_service._jobs["pricing"].task = None
+        gc.collect()
+
+        # Callers waiting on the refresh see the error
+        with pytest.raises(RuntimeError):
+            await refresh_service.refresh("pricing")
+        return await refresh_service.status()
+
+    status = asyncio.run(run())["pricing"]
+    assert status["last_outcome"] == "error"
+    assert status["last_error"] == "AWS is down"
+    assert status["last_attempt"] and status["last_success"] is None
+    assert unhandled == []
+
+    dataset.error = None
+    asyncio.run(refresh_service.refresh("pricing"))
+    job = refresh_service._jobs["pricing"]
+    assert (job.last_outcome, job.last_error) == ("ok", None)
+
+
+def test_scheduler_only_triggers_due_jobs(refresh_service, monkeypatch):
+    monkeypatch.setattr(RefreshService, "CHECK_INTERVAL", 3600)
+    missing, stale, fresh, running = Dataset(), Dataset(), Dataset(), Dataset()
+    refresh_service.register("missing", missing.refresh, lambda: None, 60)
+    refresh_service.register("stale", stale.refresh, lambda: 120.0, 60)
+    refresh_service.register("fresh", fresh.refresh, lambda: 10.0, 60)
+    refresh_service.register("running", running.refresh, lambda: None, 60)
+
+    async def run():
+        running.release.clear()
+        refresh_service.trigger("running")
+        scheduler = asyncio.create_task(refresh_service._schedule())
+        # Let the first check and the refreshes it started finish
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        scheduler.cancel()
+        running.release.set()
+        await asyncio.gather(scheduler, refresh_service._jobs["running"].task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert (missing.calls, stale.calls, fresh.calls, running.calls) == (1, 1, 0, 1)
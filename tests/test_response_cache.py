@@ -0,0 +1,46 @@
+from starlette.requests import Request
+
+from app.services import response_cache
+from app.services.response_cache import PrecompressedBody
+
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+BODY = PrecompressedBody(b'{"data": "' + b"x" * 1000 + b'"}')
+
+
+def test_each_encoding_has_its_own_strong_etag():
+    identity = BODY.respond(request())
+    gzip = BODY.respond(request(accept_encoding="gzip"))
+    tags = {identity.headers["etag"], gzip.headers["etag"]}
+    if response_cache.brotli is not None:
+        tags.add(BODY.respond(request(accept_encoding="br, gzip")).headers["etag"])
+    assert len(tags) == (3 if response_cache.brotli is not None else 2)
+    assert all(tag.startswith('"') and tag.endswith('"') for tag in tags)
+    assert gzip.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in identity.headers
+
+
+def test_if_none_match_compares_the_selected_variant():
+    gzip_tag = BODY.respond(request(accept_encoding="gzip")).headers["etag"]
+    assert BODY.respond(request(accept_encoding="gzip", if_none_match=gzip_tag)).status_code == 304
+    assert BODY.respond(request(accept_encoding="gzip", if_none_match=f"W/{gzip_tag}")).status_code == 304
+    # The gzip validator doesn't validate the identity body
+    assert BODY.respond(request(if_none_match=gzip_tag)).status_code == 200
+    assert BODY.respond(request(if_none_match="*")).status_code == 304
+
+
+def test_wildcard_accept_encoding_gets_a_compressed_variant():
+    response = BODY.respond(request(accept_encoding="*"))
+    assert response.headers["content-encoding"] in ("br", "gzip")
+    response = BODY.respond(request(accept_encoding="*;q=0"))
+    assert "content-encoding" not in response.headers
+    response = BODY.respond(request(accept_encoding="br;q=0, *"))
+    assert response.headers["content-encoding"] == "gzip"
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models.analysis import FleetSavingsJob, FleetSavingsResult
+from app.services.aws_service import AWSCredentials
+from app.services.savings_service import FleetSavingsService
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(FleetSavingsService, "JOB_DIR", tmp_path)
+    monkeypatch.setattr(FleetSavingsService, "JOB_TTL", 60)
+    monkeypatch.setattr(FleetSavingsService, "JOB_TIMEOUT", 10)
+    monkeypatch.setattr(FleetSavingsService, "_jobs", {})
+    monkeypatch.setattr(FleetSavingsService, "_tasks", {})
+    monkeypatch.setattr(FleetSavingsService, "_running", {})
+    monkeypatch.setattr(FleetSavingsService, "_expired_at", None)
+    monkeypatch.setattr(FleetSavingsService, "_expiry", None)
+    return tmp_path
+
+
+def finished_job(age: float) -> FleetSavingsJob:
+    finished_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return FleetSavingsJob(job_id=uuid.uuid4().hex, status="done", created_at=finished_at, finished_at=finished_at)
+
+
+def test_polling_expires_old_jobs(jobs):
+    old, recent = finished_job(600), finished_job(5)
+    for job in (old, recent):
+        FleetSavingsService._jobs[job.job_id] = job
+        FleetSavingsService._save(job)
+    stale = time.time() - 600
+    os.utime(FleetSavingsService._path(old.job_id), (stale, stale))
+
+    async def poll():
+        job = await FleetSavingsService.get(recent.job_id)
+        await FleetSavingsService._expiry
+        return job
+
+    assert asyncio.run(poll()) is recent
+    assert list(FleetSavingsService._jobs) == [recent.job_id]
+    assert sorted(path.stem for path in jobs.iterdir()) == [recent.job_id]
+    assert asyncio.run(FleetSavingsService.get(old.job_id)) is None
+
+
+def test_other_workers_jobs_are_read_from_disk(jobs):
+    job = finished_job(5)
+    FleetSavingsService._save(job)
+
+    assert asyncio.run(FleetSavingsService.get(job.job_id)) == job
+    assert asyncio.run(FleetSavingsService.get("../../etc/passwd")) is None
+
+
+def test_finished_job_is_saved(jobs, monkeypatch):
+    result = FleetSavingsResult(
+        regions=[], instances=0, on_demand=0, spot=0, savings=0, failed_regions=[],
+        unpriced_instance_types=[], hours_per_month=730,
+    )
+
+    async def project(credentials):
+        return result
+
+    monkeypatch.setattr(FleetSavingsService, "project", staticmethod(project))
+
+    async def run():
+        job = await FleetSavingsService.submit(AWSCredentials(access_key="AKIA", secret_key="secret", regions=["us-east-1"]))
+        await FleetSavingsService._tasks[job.job_id]
+        return job
+
+    job = asyncio.run(run())
+    FleetSavingsService._jobs.clear()
+    saved = asyncio.run(FleetSavingsService.get(job.job_id))
+    assert saved.status == "done" and saved.result == result and saved.finished_at is not None
@@ -0,0 +1,41 @@
+import asyncio
+import json
+from app.services.spot_service import build_snapshot
+from tests.factories import advisor, instance_types, spot_data
+
+
+def snapshot():
+    types = list(instance_types())
+    # Windows data for only some types, so OS filters change the result
+    advice = advisor(["us-east-1", "eu-west-1", "ap-south-1"], types)
+    for oses in advice.values():
+        oses["Windows"] = {name: (30, 2) for name in types[::3]}
+    return build_snapshot(spot_data(advice), version=None)
+
+
+def test_equivalent_queries_share_a_cache_entry():
+    spot = snapshot()
+    ram = sorted({item["ram_gb"] for item in spot.slice()["instance_types"].values()})
+    region = spot.data.regions[0]
+
+    first = asyncio.run(spot.query(regions=[region, "nowhere-1"], min_ram_gb=ram[3] - 0.01))
+    second = asyncio.run(spot.query(regions=[region, region], min_ram_gb=ram[3]))
+
+    assert first is second
+    assert len(spot.queries) == 1
+
+
+def test_query_matches_the_unnormalized_slice():
+    spot = snapshot()
+    region = spot.data.regions[0]
+    filters = [
+        {"regions": [region, "nowhere-1"], "min_cores": 3, "min_ram_gb": 7.5},
+        {"os": ["Linux"], "families": ["m5", "nope"]},
+        {"families": ["nope"]},
+        {"regions": ["nowhere-1"]},
+        {"min_ram_gb": 1e9},
+        {"min_cores": 0},
+    ]
+    for query in filters:
+        body = asyncio.run(spot.query(**query))
+        assert json.loads(body.body) == spot.slice(**query), query